@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark_chat.py - benchmark of display of lines in chat areas
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Command-line program for benchmarking the display of lines in chat areas
+(needs Qt):
+
+- display: lines are added to a buffer which has already many lines, line
+  by line (display) or by batch (display_many), like lines received from
+  WeeChat/relay;
+- scroll: a buffer is filled with many lines, then scrolled to random
+  positions (with a repaint at each position).
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+
+import qt_compat
+import config
+from chat import ChatTextEdit
+from chatview import ChatListView
+from weechat.benchmark import NICKS, WORDS, max_rss_kb, run_forked
+from version import qweechat_version
+
+QtGui = qt_compat.import_module('QtGui')
+
+NAME = 'qweechat-benchmark-chat'
+
+VIEWS = {
+    'text': ChatTextEdit,
+    'list': ChatListView,
+}
+
+# number of lines by call to display_many to fill a buffer
+_FILL_BATCH = 10000
+
+
+def application():
+    """Return the Qt application (created on first call)."""
+    app = QtGui.QApplication.instance()
+    if app is None:
+        app = QtGui.QApplication(sys.argv[:1])
+        app.config = config.read()
+    return app
+
+
+def chat_lines(rnd, count):
+    """Return random lines: list of (date, prefix, message, color)."""
+    lines = []
+    for i in range(count):
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(3, 30))]
+        if rnd.random() < 0.2:
+            pos = rnd.randrange(len(words))
+            words[pos] = '\x19F%02d%s\x1c' % (rnd.randrange(16), words[pos])
+        lines.append((1500000000 + i,
+                      '\x19F%02d%s' % (rnd.randrange(16), rnd.choice(NICKS)),
+                      ' '.join(words), None))
+    return lines
+
+
+def new_chat(args, indent):
+    """Return a new chat area (shown)."""
+    chat = VIEWS[args.view](debug=False)
+    chat.indent = indent
+    chat.resize(800, 600)
+    chat.show()
+    return chat
+
+
+def display(app, chat, lines, batch):
+    """
+    Display lines in chat, by batch of lines (line by line if batch is 0),
+    with events processed after each batch (as in the event loop).
+    """
+    if not batch:
+        for line in lines:
+            chat.display(*line)
+            app.processEvents()
+        return
+    for i in range(0, len(lines), batch):
+        chat.display_many(lines[i:i + batch])
+        app.processEvents()
+
+
+def bench_display(args, indent, batch):
+    """Display lines in a buffer, return a dict with results."""
+    app = application()
+    rnd = random.Random(args.seed)
+    fill = chat_lines(rnd, args.lines)
+    lines = chat_lines(rnd, args.add)
+    best = None
+    for _ in range(args.repeat):
+        chat = new_chat(args, indent)
+        display(app, chat, fill, _FILL_BATCH)
+        gc.collect()
+        start = time.time()
+        display(app, chat, lines, batch)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        chat.close()
+        chat.deleteLater()
+        app.processEvents()
+    best = max(best, 1e-9)
+    return {
+        'mode': 'display_many' if batch else 'display',
+        'view': args.view,
+        'batch': batch,
+        'indent': indent,
+        'lines_before': args.lines,
+        'lines_added': args.add,
+        'seconds': best,
+        'lines_per_sec': args.add / best,
+    }
+
+
+def bench_scroll(args, indent):
+    """
+    Fill a buffer with lines, then scroll to random positions; return a
+    dict with results.  Memory is the increase of peak memory while the
+    buffer is filled and scrolled (lines are generated before).
+    """
+    app = application()
+    rnd = random.Random(args.seed)
+    lines = chat_lines(rnd, args.lines)
+    gc.collect()
+    rss_start = max_rss_kb()
+    chat = new_chat(args, indent)
+    start = time.time()
+    display(app, chat, lines, _FILL_BATCH)
+    fill_time = time.time() - start
+    bar = chat.verticalScrollBar()
+    start = time.time()
+    for _ in range(args.scroll):
+        bar.setValue(rnd.randint(bar.minimum(), bar.maximum()))
+        chat.viewport().repaint()
+    scroll_time = max(time.time() - start, 1e-9)
+    return {
+        'mode': 'scroll',
+        'view': args.view,
+        'indent': indent,
+        'lines': args.lines,
+        'fill_seconds': fill_time,
+        'scrolls': args.scroll,
+        'ms_per_scroll': scroll_time * 1000 / max(1, args.scroll),
+        'rss_kb': (max_rss_kb() - rss_start
+                   if rss_start is not None else None),
+    }
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Benchmark of display of lines in chat areas.',
+        epilog='''
+Lines are added to a chat area which has already LINES lines, line by
+line with display() ("before": one edit of document by line) and by batch
+with display_many(); the best time of the repeated runs is kept, and the
+speedup of display_many() is displayed.  With "-i both", this is done in
+text and indent modes.
+
+Then a chat area is filled with LINES lines and scrolled to SCROLL random
+positions; memory (rss_kb) is the increase of peak memory while the chat
+area is filled and scrolled.  Each benchmark runs in a child process (if
+fork is available).
+
+Example for a buffer with 10000 lines, without and with indent mode:
+  %(prog)s -n 10000 -b 100 -i both -s 0
+Example for long buffers: %(prog)s -w list -n 1000000
+''')
+    parser.add_argument('-w', '--view', choices=sorted(VIEWS),
+                        default='text',
+                        help='chat area (option look.chat_view)')
+    parser.add_argument('-n', '--lines', type=int, default=10000,
+                        help='number of lines already in the buffer')
+    parser.add_argument('-a', '--add', type=int, default=1000,
+                        help='number of lines added (timed)')
+    parser.add_argument('-b', '--batch', type=int, default=100,
+                        help='number of lines by call to display_many')
+    parser.add_argument('-s', '--scroll', type=int, default=1000,
+                        help='number of scrolls (0 = no scroll benchmark)')
+    parser.add_argument('-i', '--indent', nargs='?', const='on',
+                        choices=['off', 'on', 'both'], default='off',
+                        help='indent mode (prefix in a column), "-i" is '
+                        '"-i on"')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of runs')
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='display results in JSON')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for random data')
+    parser.add_argument('-v', '--version', action='version',
+                        version=qweechat_version())
+    args = parser.parse_args()
+
+    indents = {'off': [False], 'on': [True],
+               'both': [False, True]}[args.indent]
+    results = []
+    for indent in indents:
+        line_by_line = None
+        for batch in (0, max(1, args.batch)):
+            result = run_forked(bench_display, args, indent, batch)
+            if line_by_line is None:
+                line_by_line = result
+            else:
+                result['speedup'] = (line_by_line['seconds'] /
+                                     result['seconds'])
+            results.append(result)
+            if not args.json:
+                print('{view:<4} {mode:<13} batch: {batch:>5} '
+                      'indent: {indent!s:<5} '
+                      '{lines_before:>8} + {lines_added:>6} lines '
+                      '{seconds:8.3f}s {lines_per_sec:10.0f} lines/s'
+                      ''.format(**result))
+        if not args.json:
+            print('{view:<4} speedup of display_many: x{speedup:.1f}'
+                  ''.format(**result))
+        if args.scroll > 0:
+            result = run_forked(bench_scroll, args, indent)
+            results.append(result)
+            if not args.json:
+                print('{view:<4} {mode:<13} indent: {indent!s:<5} '
+                      '{lines:>8} lines fill: {fill_seconds:8.3f}s '
+                      '{scrolls:>6} scrolls {ms_per_scroll:8.3f} ms/scroll '
+                      'rss: +{rss_kb} kB'.format(**result))
+    if args.json:
+        print(json.dumps({'version': qweechat_version(),
+                          'python': sys.version.split()[0],
+                          'qt': 'PySide' if qt_compat.uses_pyside
+                          else 'PyQt4',
+                          'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,11 @@
 
 import qt_compat
 from chat import ChatTextEdit
+from chatview import ChatListView
 from input import InputLineEdit
 import weechat.color as color
 import config
+import hotlist
 import utils
 
 QtCore = qt_compat.import_module('QtCore')
@@ -64,88 +66,471 @@ class GenericListWidget(QtGui.QListWidget):
         self.auto_resize()
 
 
-class BufferSwitchWidgetItem(QtGui.QTreeWidgetItem):
-    """Buffer list/tree item"""
-    def __init__(self, buf, *args):
-        QtGui.QTreeWidgetItem.__init__(*(self,) + args)
-        config_color_options = config.config_color_options
-        try:
-            self.number = buf.data['number']
-        except:
-            self.number = int(buf)
-            buf = None
+class BufferSwitchItem(object):
+    """
+    Item of buffer list/tree: a buffer, or merged buffers (children).
+    Label and icon are cached (None when not yet computed).
+    """
+
+    def __init__(self, model, buf=None, parent=None):
+        self.model = model
         self.buf = buf
-        self._color = "default"
-        self._colormap = {  # Temporary work around.
-            "default": config_color_options[11],  # chat_buffer
-            "hotlist": config_color_options[44],    # chat_activity
-            "hotlist_highlight": config_color_options[29],  # chat_highlight
-        }
-        if self.parent():
-            self.setFlags(self.flags() & ~Qt.ItemIsDropEnabled)
+        self._parent = parent
+        self.children = []
+        self.row = 0
+        self.keys = []
+        self.color = 'default'
+        self.label = None
+        self.icon = None
+
+    def parent(self):
+        """Return parent item (merged buffers), None for a top level item."""
+        return self._parent
+
+    def childCount(self):
+        return len(self.children)
+
+    def child(self, index):
+        if 0 <= index < len(self.children):
+            return self.children[index]
+        return None
 
-    def __eq__(self, x):
-        """Test equality for "in" statements."""
-        if self.buf and x.buf:
-            return self.buf.pointer == x.buf.pointer
-        return x is self
+    @property
+    def number(self):
+        """Returns the buffer number."""
+        if self.buf:
+            return self.buf.data['number']
+        return self.children[0].number
 
     @property
     def pointer(self):
         """Returns a pointer for the item; a method rather than a property."""
         if self.buf:
             return self.buf.pointer
-        elif self.childCount() > 0:
-            return [c.buf.pointer for c in self.children]
+        return [c.buf.pointer for c in self.children]
 
     @property
     def full_name(self):
         """Returns the full name for an item."""
         if self.buf and "full_name" in self.buf.data:
             return self.buf.data["full_name"]
-        return self.text(0)
-
-    @property
-    def children(self):
-        return [self.child(i) for i in range(self.childCount())]
+        return self.label
 
     @property
     def active(self):
         """The active item; merged root items return a child item."""
-        if self.childCount() == 0:
+        if not self.children:
             return self
-        return self.treeWidget().active_item_for_merged_pointer(self.pointer)
+        return self.model.active_item_for_merged_pointer(self.pointer)
+
+
+class BufferSwitchModel(QtCore.QAbstractItemModel):
+    """
+    Model with tree or list of buffers, sorted by number.
+
+    Buffers opened, closed, moved or merged are applied as insert/remove of
+    rows, changes of buffers (number, name, hotlist) as changes of data
+    of their rows only.
+    """
+
+    def __init__(self, *args):
+        QtCore.QAbstractItemModel.__init__(*(self,) + args)
+        self.items = []
+        self._items = {}
+        self._merged_buffers_active = {}
+        self._look = {}
+        self._brushes = {}
+        self.tree_view_merged = True
 
     @property
-    def color(self):
-        return self._color
+    def config(self):
+        """Return config object."""
+        return QtGui.QApplication.instance().config
+
+    def item(self, index):
+        """Return item for a model index (None if index is invalid)."""
+        if index.isValid():
+            return index.internalPointer()
+        return None
+
+    def index_of(self, item):
+        """Return model index for an item."""
+        if not item:
+            return QtCore.QModelIndex()
+        return self.createIndex(item.row, 0, item)
+
+    def find(self, search):
+        """Find an item for a given buffer pointer or name."""
+        if isinstance(search, list):
+            search = "".join(search)
+        return self._items.get(search)
 
-    @color.setter
-    def color(self, color):
-        self._color = color
-        color_hex = self._colormap[color]
-        self.setForeground(0, QtGui.QBrush(QtGui.QColor(color_hex)))
+    def active_item_for_merged_pointer(self, pointer):
+        """Find the active item in a merged pointer."""
+        ptr_str = "".join(pointer)
+        if ptr_str in self._merged_buffers_active:
+            return self.find(self._merged_buffers_active[ptr_str])
+        item = self.find(pointer)
+        return item.children[0] if item and item.children else None
+
+    def set_active_item(self, item):
+        """Set the active item of merged buffers."""
+        self._merged_buffers_active["".join(item.parent().pointer)] = \
+            item.pointer
+
+    def has_merged(self):
+        """Return True if some buffers are displayed as merged."""
+        return any(item.children for item in self.items)
+
+    # Qt model
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        items = self.item(parent).children if parent.isValid() \
+            else self.items
+        if column == 0 and 0 <= row < len(items):
+            return self.createIndex(row, column, items[row])
+        return QtCore.QModelIndex()
+
+    def parent(self, index=None):
+        if index is None:
+            return QtCore.QAbstractItemModel.parent(self)
+        item = self.item(index)
+        if item and item.parent():
+            return self.index_of(item.parent())
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self.items)
+        if parent.column() > 0:
+            return 0
+        return len(self.item(parent).children)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        item = self.item(index)
+        if not item:
+            return None
+        if role == Qt.DisplayRole:
+            if item.label is None:
+                item.label = self._label(item)
+            return item.label
+        if role == Qt.DecorationRole:
+            if item.icon is None:
+                item.icon = self._icon(item) or False
+            return item.icon or None
+        if role == Qt.ForegroundRole:
+            return self._brushes.get(item.color)
+        return None
+
+    def flags(self, index):
+        item = self.item(index)
+        if not item:
+            return Qt.ItemIsDropEnabled
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if not item.parent():
+            flags |= Qt.ItemIsDropEnabled
+        return flags
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    # label, icon and color of items
+
+    def _update_look(self):
+        """Read options used for labels/colors of items."""
+        self._look = {
+            'short_names': self.config.getboolean("buffers",
+                                                  "look.short_names"),
+            'show_number': self.config.getboolean("buffers",
+                                                  "look.show_number"),
+            'number_char': self.config.get("buffers", "look.number_char"),
+            'crop_suffix': self.config.get("buffers",
+                                           "look.name_crop_suffix"),
+            'show_icons': self.config.getboolean("buffers", "show_icons"),
+            'name_size_max': int(self.config.get("buffers",
+                                                 "look.name_size_max")),
+        }
+        config_color_options = config.config_color_options
+        self._brushes = {}
+        for name, index in (("default", 11),  # chat_buffer
+                            ("hotlist", 44),  # chat_activity
+                            ("hotlist_highlight", 29)):  # chat_highlight
+            self._brushes[name] = QtGui.QBrush(
+                QtGui.QColor(config_color_options[index]))
+
+    def _short_name(self, buf):
+        """Return short name of a buffer (full name if not set)."""
+        if buf.data.get('short_name'):
+            return buf.data['short_name'].decode('utf-8')
+        return buf.data['full_name'].decode('utf-8')
+
+    def _label(self, item):
+        """Return label of an item (short name for merged buffers)."""
+        if item.parent():
+            return self._short_name(item.buf)
+        look = self._look
+        name = u''
+        if item.buf:
+            name = item.buf.data['full_name'].decode('utf-8')
+            if item.buf.data['short_name'] and look['short_names']:
+                name = item.buf.data['short_name'].decode('utf-8')
+        for child in item.children:
+            full_name = child.buf.data['full_name'].decode('utf-8')
+            name = full_name[:-len(self._short_name(child.buf))]
+        if look['name_size_max']:
+            name = name[:look['name_size_max']] + look['crop_suffix']
+        if look['show_number']:
+            label = u'%d%s %s' % (item.number, look['number_char'], name)
+        else:
+            label = name
+        if item.children:
+            label_count = '(%d)' % len(item.children)
+            if look['name_size_max']:
+                label = label[:-len(label_count)] + label_count
+            else:
+                label += " " + label_count + look['crop_suffix']
+        return label
+
+    def _icon(self, item):
+        """Return icon of an item (None if no icon)."""
+        if not item.buf or not (item.parent() or self._look['show_icons']):
+            return None
+        icons = {
+            'private': 'im-user',
+            'channel': 'view-conversation-balloon',
+            'server': 'network-server',
+        }
+        try:
+            local_type = item.buf.data['local_variables']['type']
+        except (KeyError, TypeError):
+            return None
+        if local_type in icons:
+            return utils.qicon_from_theme(icons[local_type])
+        return None
+
+    def _hot_color(self, item):
+        """Return color of an item, according to hotlist."""
+        if item.children:
+            if any(child.buf.hot for child in item.children):
+                return "hotlist"
+        elif item.buf.hot:
+            highlights = item.buf.hotlist[hotlist.PRIORITY_HIGHLIGHT]
+            if highlights and not item.parent():
+                return "hotlist_highlight"
+            return "hotlist"
+        return "default"
+
+    def _changed(self, item):
+        """Clear cache of an item and tell views its data has changed."""
+        item.label = None
+        item.icon = None
+        index = self.index_of(item)
+        self.dataChanged.emit(index, index)
+
+    # items
+
+    def _index_item(self, item):
+        """Index an item by pointer and full name (for find)."""
+        if item.buf:
+            item.keys = [item.buf.pointer, item.full_name]
+        else:
+            # merged buffers: pointers of children
+            item.keys = ["".join(item.pointer)]
+        for key in item.keys:
+            self._items[key] = item
+
+    def _unindex_item(self, item):
+        """Remove an item from index."""
+        for key in item.keys:
+            if self._items.get(key) is item:
+                del self._items[key]
+        item.keys = []
+
+    def _new_item(self, buf, parent=None):
+        """Return a new item for a buffer."""
+        item = BufferSwitchItem(self, buf, parent)
+        if parent:
+            item.row = len(parent.children)
+            parent.children.append(item)
+        self._index_item(item)
+        item.color = self._hot_color(item)
+        return item
+
+    def _new_merged_item(self, bufs):
+        """Return a new item for merged buffers."""
+        item = BufferSwitchItem(self)
+        for buf in bufs:
+            self._new_item(buf, item)
+        self._index_item(item)
+        item.color = self._hot_color(item)
+        return item
+
+    def _update_rows(self, items, start=0):
+        """Update row of items (after insert/remove)."""
+        for row in range(start, len(items)):
+            items[row].row = row
+
+    def _insert_top(self, row, item):
+        """Insert a top level item."""
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.items.insert(row, item)
+        self._update_rows(self.items, row)
+        self.endInsertRows()
+
+    def _remove_top(self, row):
+        """Remove a top level item."""
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        item = self.items.pop(row)
+        self._update_rows(self.items, row)
+        self.endRemoveRows()
+        self._unindex_item(item)
+        for child in item.children:
+            self._unindex_item(child)
+
+    def _search(self, number, upper=False):
+        """
+        Return row of first top level item with number >= (or > if upper
+        is True) the given number.
+        """
+        low, high = 0, len(self.items)
+        while low < high:
+            middle = (low + high) // 2
+            item_number = self.items[middle].number
+            if item_number < number or (upper and item_number == number):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def rebuild(self, buffers, tree_view_merged):
+        """Rebuild all items (after a new list of buffers/options)."""
+        self.beginResetModel()
+        self.tree_view_merged = tree_view_merged
+        self._update_look()
+        self.items = []
+        self._items = {}
+        by_number = {}
+        for buf in buffers:
+            by_number.setdefault(buf.data['number'], []).append(buf)
+        for number in sorted(by_number):
+            bufs = by_number[number]
+            if not tree_view_merged or len(bufs) == 1:
+                self.items.extend(self._new_item(buf) for buf in bufs)
+            else:
+                self.items.append(self._new_merged_item(bufs))
+        self._update_rows(self.items)
+        self.endResetModel()
+
+    def clear(self):
+        """Remove all items."""
+        self.rebuild([], self.tree_view_merged)
+
+    def insert_buffer(self, buf):
+        """Insert an item for a buffer, at the position of its number."""
+        number = buf.data['number']
+        row = self._search(number)
+        if self.tree_view_merged and row < len(self.items) and \
+           self.items[row].number == number:
+            item = self.items[row]
+            if item.buf:
+                # buffer merged with a single buffer: replace its item
+                self._remove_top(row)
+                self._insert_top(row, self._new_merged_item([item.buf, buf]))
+            else:
+                self._unindex_item(item)
+                self.beginInsertRows(self.index_of(item),
+                                     len(item.children), len(item.children))
+                self._new_item(buf, item)
+                self.endInsertRows()
+                self._index_item(item)
+                item.color = self._hot_color(item)
+                self._changed(item)
+        else:
+            self._insert_top(self._search(number, upper=True),
+                             self._new_item(buf))
 
+    def remove_buffer(self, buf):
+        """Remove the item of a buffer."""
+        item = self._items.get(buf.pointer)
+        if not item:
+            return
+        parent = item.parent()
+        if not parent:
+            self._remove_top(item.row)
+        elif len(parent.children) > 2:
+            self._unindex_item(parent)
+            self.beginRemoveRows(self.index_of(parent), item.row, item.row)
+            parent.children.pop(item.row)
+            self._update_rows(parent.children, item.row)
+            self.endRemoveRows()
+            self._unindex_item(item)
+            self._index_item(parent)
+            parent.color = self._hot_color(parent)
+            self._changed(parent)
+        else:
+            # only one buffer left: replace merged item by a single item
+            other = [child for child in parent.children if child is not item]
+            row = parent.row
+            self._remove_top(row)
+            self._insert_top(row, self._new_item(other[0].buf))
+
+    def update_buffer(self, buf):
+        """Update item of a buffer (number, name or local variables)."""
+        item = self._items.get(buf.pointer)
+        if not item:
+            return
+        self._unindex_item(item)
+        self._index_item(item)
+        self._changed(item)
+        if item.parent():
+            self._changed(item.parent())
 
-class BufferSwitchWidget(QtGui.QTreeWidget):
+    def update_hot_buffers(self, bufs=None):
+        """Update colors of items for buffers (all buffers if None)."""
+        if bufs is None:
+            items = self.items + [child for item in self.items
+                                  for child in item.children]
+        else:
+            items = set()
+            for buf in bufs:
+                item = self._items.get(buf.pointer)
+                if item:
+                    items.add(item)
+                    if item.parent():
+                        items.add(item.parent())
+        for item in items:
+            color = self._hot_color(item)
+            if color != item.color:
+                item.color = color
+                index = self.index_of(item)
+                self.dataChanged.emit(index, index)
+
+
+class BufferSwitchWidget(QtGui.QTreeView):
     """Widget with tree or list of buffers."""
 
+    currentItemChanged = qt_compat.Signal(object, object)
+
     def __init__(self, *args):
-        QtGui.QTreeWidget.__init__(*(self,) + args)
+        QtGui.QTreeView.__init__(*(self,) + args)
         self.setMaximumWidth(100)
         self.setTextElideMode(Qt.ElideNone)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setFocusPolicy(Qt.NoFocus)
         self.setRootIsDecorated(False)
-        self.header().close()
+        self.setHeaderHidden(True)
+        self.buffer_model = BufferSwitchModel(self)
+        self.setModel(self.buffer_model)
         self.buffers = []
-        self.by_number = {}
-        self._merged_buffers_active = {}
         self._current_pointer = None
+        self._updating = False
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.setDragDropMode(QtGui.QAbstractItemView.InternalMove)
         self.customContextMenuRequested.connect(self._buffer_context)
-        self.currentItemChanged.connect(self._currentItemChanged)
+        self.selectionModel().currentChanged.connect(self._currentChanged)
 
         self.ready = False
 
@@ -170,12 +555,30 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
                                                 '/buffer unmerge')],
         }
 
-    def _currentItemChanged(self, item, prior):
+    def _currentChanged(self, current, previous):
+        if self._updating:
+            return
+        item = self.buffer_model.item(current)
         if item and item.parent():
-            ptr_str = "".join(item.parent().pointer)
-            self._merged_buffers_active[ptr_str] = item.pointer
+            self.buffer_model.set_active_item(item)
         if item:
             self._current_pointer = item.pointer
+        self.currentItemChanged.emit(item,
+                                     self.buffer_model.item(previous))
+
+    def currentItem(self):
+        """Return the current item."""
+        return self.buffer_model.item(self.currentIndex())
+
+    def setCurrentItem(self, item):
+        """Set the current item."""
+        self.setCurrentIndex(self.buffer_model.index_of(item))
+
+    def topLevelItem(self, index):
+        """Return a top level item (None if not found)."""
+        if 0 <= index < len(self.buffer_model.items):
+            return self.buffer_model.items[index]
+        return None
 
     def _not_yet_implemented(self):
         print("Not yet implemented.")
@@ -210,100 +613,61 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
                              actions['blink tray icon'],
                              actions['blink task bar']])
         menu.addActions([utils.separator(self), actions['close']])
-        if item.buf and len(self.by_number[item.buf.data["number"]]) > 1:
+        if item.buf and len([buf for buf in self.buffers
+                             if buf.data['number'] == item.number]) > 1:
             menu.addActions([utils.separator(self), actions['unmerge']])
         menu.exec_(self.mapToGlobal(event))
 
     def renumber(self, ready=False):
-        """Renumber buffers. Needed after a buffer move, close, merge etc."""
+        """Rebuild the list of buffers (after a new list or new options)."""
         if not self.ready and not ready or not self.buffers:
             return
         elif ready:
             self.ready = ready
-        by_number = {}
         ptr = self.currentItem().pointer if self.currentItem() else None
-        QtGui.QTreeWidget.clear(self)
-        for buf in self.buffers:
-            n = buf.data['number']
-            by_number[n] = by_number[n] if n in by_number else []
-            by_number[n].append(buf)
-        self.setRootIsDecorated(False)
-        tree_view_merged = True
-        if not self.config.getboolean('buffers', 'tree_view_merged'):
-            tree_view_merged = False
-        for n, bufs in by_number.items():
-            if not tree_view_merged or len(bufs) == 1:
-                top_items = [BufferSwitchWidgetItem(b, self) for b in bufs]
-                [item.setText(0, self._label(item)) for item in top_items]
-                QtGui.QTreeWidget.addTopLevelItems(self, top_items)
-            else:
-                self.setRootIsDecorated(True)
-                top_item = BufferSwitchWidgetItem(n, self)
-                [BufferSwitchWidgetItem(b, top_item) for b in bufs]
-                top_item.setText(0, self._label(top_item))
-                QtGui.QTreeWidget.addTopLevelItem(self, top_item)
-        self.by_number = by_number
+        self.buffer_model.rebuild(
+            self.buffers,
+            self.config.getboolean('buffers', 'tree_view_merged'))
         # Restore our active view before the renumber; which pointer object to
         # use depends on which client requested a merge/move, if any
         if ptr:
             self.setCurrentItem(self._find(ptr))
         elif self._current_pointer:
             self.setCurrentItem(self._find(self._current_pointer))
+        self._update_view()
+
+    def _update_view(self):
+        """Update decoration and size after a change of items."""
+        self.setRootIsDecorated(self.buffer_model.has_merged())
         self.auto_resize()
 
-    def _icon(self, item):
+    def _update_items(self, func, *args):
+        """
+        Update items of model, keeping the current buffer (its item can be
+        replaced, for example when buffers are merged).
+        """
+        current = self.currentItem()
+        active = current.active if current else None
+        self._updating = True
         try:
-            local = item.buf.data['local_variables']
-            if local['type'] == "private":
-                qicon = utils.qicon_from_theme('im-user')
-            elif local['type'] == "channel":
-                qicon = utils.qicon_from_theme('view-conversation-balloon')
-            elif local['type'] == "server":
-                qicon = utils.qicon_from_theme('network-server')
-            item.setIcon(0, qicon)
-            return qicon
-        except:
-            pass
-        return None
-
-    def _label(self, item):
-        short_names = self.config.getboolean("buffers", "look.short_names")
-        show_number = self.config.getboolean("buffers", "look.show_number")
-        number_char = self.config.get("buffers", "look.number_char")
-        crop_suffix = self.config.get("buffers", "look.name_crop_suffix")
-        show_icons = self.config.getboolean("buffers", "show_icons")
-        name_size_max = int(self.config.get("buffers", "look.name_size_max"))
-        name = ""
-        if show_icons and item.buf:
-            self._icon(item)
-        if item.buf:
-            number = item.buf.data['number']
-            name = item.buf.data['full_name']
-            if item.buf.data['short_name'] and short_names:
-                name = item.buf.data['short_name']
-        for child in item.children:
-            full_name = child.buf.data['full_name'].decode('utf-8')
-            if 'short_name' in child.buf.data and child.buf.data['short_name']:
-                short_name = child.buf.data['short_name'].decode('utf-8')
-            else:
-                short_name = full_name
-            name = full_name[:-len(short_name)]
-            number = child.buf.data['number']
-            child.setText(0, short_name)
-            self._icon(child)
-        if name_size_max:
-            name = name[:name_size_max] + crop_suffix
-        if show_number:
-            label = '%d%s %s' % (number, number_char, name.decode('utf-8'))
-        else:
-            label = '%s' % (name.decode('utf-8'))
-        if item.childCount():
-            label_count = '(%d)' % (item.childCount())
-            if name_size_max:
-                label = label[:-len(label_count)] + label_count
-            else:
-                label += " " + label_count + crop_suffix
-        return label
+            func(*args)
+            if active:
+                item = self._find(active.buf.pointer)
+                if item:
+                    if item.parent() and not current.parent():
+                        self.buffer_model.set_active_item(item)
+                        item = item.parent()
+                    self.setCurrentItem(item)
+                    self._current_pointer = item.pointer
+        finally:
+            self._updating = False
+        current = self.currentItem()
+        if active and current and (not current.active or
+                                   current.active.buf is not active.buf):
+            # current buffer has been closed
+            self._current_pointer = current.pointer
+            self.currentItemChanged.emit(current, None)
+        self._update_view()
 
     def auto_resize(self):
         size = self.sizeHintForColumn(0)
@@ -312,23 +676,21 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
             self.setMaximumWidth(size)
 
     def clear(self, *args):
-        """Re-implement clear to set dynamic size after clear."""
-        QtGui.QTreeWidget.clear(*(self,) + args)
+        """Remove all buffers."""
+        self.buffer_model.clear()
         self.auto_resize()
         self.buffers = []
-        self.by_number = {}
-        self._active_index_merged_buffers = {}
         self.setRootIsDecorated(False)
 
     def insert(self, index, buf):
-        """Insert a BufferSwitchWidgetItem with the given buffer."""
+        """Insert an item with the given buffer."""
         if buf not in self.buffers:
             self.buffers.insert(index, buf)
-        self.renumber()
-        self.auto_resize()
+        if self.ready:
+            self._update_items(self.buffer_model.insert_buffer, buf)
 
     def add(self, buf):
-        """Add a BufferSwitchWidgetItem for a buffer to the end."""
+        """Add an item for a buffer to the end."""
         if buf not in self.buffers:
             self.insert(len(self.buffers), buf)
 
@@ -336,19 +698,27 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
         """Remove and return the item matching."""
         if buf in self.buffers:
             self.buffers.remove(buf)
-        self.renumber()
+        if self.ready:
+            self._update_items(self.buffer_model.remove_buffer, buf)
         return buf
 
+    def move(self, buf):
+        """Move the item of a buffer after a change of its number."""
+        if self.ready:
+            self._update_items(self._move_item, buf)
+
+    def _move_item(self, buf):
+        self.buffer_model.remove_buffer(buf)
+        self.buffer_model.insert_buffer(buf)
+
+    def update_buffer(self, buf):
+        """Update the item of a buffer (number, name or local variables)."""
+        if self.ready:
+            self.buffer_model.update_buffer(buf)
+
     def _find(self, search):
-        """Find a BufferWidgetItem for a given buffer pointer or name."""
-        root = self.invisibleRootItem()
-        for item in [root.child(i) for i in range(root.childCount())]:
-            if item.pointer == search or item.full_name == search:
-                return item
-            for child in item.children:
-                if child.pointer == search or child.full_name == search:
-                    return child
-        return None
+        """Find an item for a given buffer pointer or name."""
+        return self.buffer_model.find(search)
 
     def set_current_buffer(self, bufptr):
         """Sets the current item to the provided buffer or pointer."""
@@ -362,34 +732,36 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
 
     def active_item_for_merged_pointer(self, pointer):
         """Find the active item in a merged pointer."""
-        ptr_str = "".join(pointer)
-        if ptr_str in self._merged_buffers_active:
-            return self._find(self._merged_buffers_active[ptr_str])
-        item = self._find(pointer)
-        return item.children[0] if item and item.childCount() > 0 else None
+        return self.buffer_model.active_item_for_merged_pointer(pointer)
 
     def selected_item(self):
-        items = self.selectedItems()
-        return items[0] if len(items) > 0 else self.topLevelItem(0)
+        indexes = self.selectionModel().selectedIndexes()
+        if indexes:
+            return self.buffer_model.item(indexes[0])
+        return self.topLevelItem(0)
 
     def switch_prev_buffer(self):
-        item = self.itemAbove(self.selected_item())
-        if item:
-            self.setCurrentItem(item)
+        index = self.indexAbove(
+            self.buffer_model.index_of(self.selected_item()))
+        if index.isValid():
+            self.setCurrentIndex(index)
         else:
-            idx = self.topLevelItemCount() - 1
-            self.setCurrentItem(self.topLevelItem(idx))
+            self.setCurrentItem(
+                self.topLevelItem(len(self.buffer_model.items) - 1))
 
     def switch_next_buffer(self):
-        item = self.itemBelow(self.selected_item())
-        if item:
-            self.setCurrentItem(item)
+        index = self.indexBelow(
+            self.buffer_model.index_of(self.selected_item()))
+        if index.isValid():
+            self.setCurrentIndex(index)
         else:
             self.setCurrentItem(self.topLevelItem(0))
 
     def switch_active_buffer(self, step=1):
         """Switch current buffer if buffers are attached with same number."""
         item = self.selected_item()
+        if not item:
+            return
         active = None
         parent = None
         if item.parent():
@@ -399,44 +771,28 @@ class BufferSwitchWidget(QtGui.QTreeWidget):
             active = item.active
             parent = item
         if parent and active:
-            ptr_str = "".join(parent.pointer)
-            index = parent.indexOfChild(active)
-            sibling = parent.child(index + step)
+            sibling = parent.child(active.row + step)
             if not sibling:
                 sibling = parent.child(0) if step > 0 else parent.children[-1]
-            self._merged_buffers_active[ptr_str] = sibling.pointer
+            self.buffer_model.set_active_item(sibling)
             self.currentItemChanged.emit(parent, item)
 
     def switch_active_buffer_previous(self):
         """Switch current buffer if buffers are attached with same number."""
         self.switch_active_buffer(-1)
 
-    def update_hot_buffers(self):
-        root = self.invisibleRootItem()
-        for item in [root.child(i) for i in range(root.childCount())]:
-            if not isinstance(item, BufferSwitchWidgetItem):
-                continue
-            if item.buf and item.buf.hot:
-                item.color = "hotlist"
-                if item.buf.highlight:
-                    item.color = "hotlist_highlight"
-            else:
-                item.color = "default"
-            for itemc in item.children:
-                if itemc.buf.hot:
-                    itemc.color = "hotlist"
-                    item.color = "hotlist"
-                else:
-                    itemc.color = "default"
-        self.update()
+    def update_hot_buffers(self, bufs=None):
+        """Update colors of buffers in hotlist (all buffers if None)."""
+        self.buffer_model.update_hot_buffers(bufs)
 
     def dropEvent(self, drop_event):
         """Handle drag and drop buffer merging, unmerging, and moving."""
-        item = self.selectedItems()[0]
+        item = self.selected_item()
         buf = item.buf if item.buf else item.children[0].buf
-        dest_item = self.itemAt(drop_event.pos())
+        dest_item = self.buffer_model.item(self.indexAt(drop_event.pos()))
         drop_pos = self.dropIndicatorPosition()
-        n = dest_item.number if dest_item else len(self.by_number)
+        items = self.buffer_model.items
+        n = dest_item.number if dest_item else items[-1].number
         positions = QtGui.QAbstractItemView.DropIndicatorPosition
         if item.parent():
             n = n + 1 if n >= item.number else n
@@ -471,7 +827,8 @@ class BufferWidget(QtGui.QWidget):
     title, chat + nicklist (optional) + prompt/input.
     """
 
-    def __init__(self, display_nicklist=False, time_format='%H:%M'):
+    def __init__(self, display_nicklist=False, time_format='%H:%M',
+                 chat_view='text'):
         QtGui.QWidget.__init__(self)
 
         # title
@@ -482,7 +839,10 @@ class BufferWidget(QtGui.QWidget):
         self.chat_nicklist = QtGui.QSplitter()
         self.chat_nicklist.setSizePolicy(QtGui.QSizePolicy.Expanding,
                                          QtGui.QSizePolicy.Expanding)
-        self.chat = ChatTextEdit(debug=False)
+        if chat_view == 'list':
+            self.chat = ChatListView(debug=False)
+        else:
+            self.chat = ChatTextEdit(debug=False)
         self.chat.time_format = time_format
         self.chat_nicklist.addWidget(self.chat)
 
@@ -578,13 +938,15 @@ class Buffer(QtCore.QObject):
         self.data = data
         self.nicklist = {}
         display_nicklist = self.data.get('nicklist', 0)
-        self.widget = BufferWidget(display_nicklist=display_nicklist)
+        self.widget = BufferWidget(
+            display_nicklist=display_nicklist,
+            chat_view=self.config.get('look', 'chat_view'))
         self.update_title()
         self.update_prompt()
         self.update_config()
         self.widget.input.textSent.connect(self.input_text_sent)
         self.widget.input.specialKey.connect(self.input_special_key)
-        self._hot = 0
+        self.hotlist = hotlist.EMPTY
         self._highlight = False
         if 'short_name' not in data and 'full_name' in data:
             self.data['short_name'] = data['full_name'].rsplit(".", 1)[-1]
@@ -618,6 +980,10 @@ class Buffer(QtCore.QObject):
         except:
             self.widget.set_prompt(None)
 
+    def display_lines(self, lines):
+        """Display lines: list of (date, prefix, message, color)."""
+        self.widget.chat.display_many(lines)
+
     def input_text_sent(self, text):
         """Called when text has to be sent to buffer."""
         if self.data:
@@ -626,8 +992,7 @@ class Buffer(QtCore.QObject):
     def input_special_key(self, key):
         """Handle special hotkeys that act on the buffer, e.g. copy."""
         if key[:1] == "c":
-            cur = self.widget.chat.textCursor()
-            if cur.hasSelection():
+            if self.widget.chat.has_selection():
                 self.widget.chat.copy()
 
     def update_config(self):
@@ -637,7 +1002,7 @@ class Buffer(QtCore.QObject):
             nicklist_visible = self.config.get("look", "nicklist") != "off"
             title_visible = self.config.get("look", "title") != "off"
             time_format = self.config.get("look", "buffer_time_format")
-            indent = self.config.get("look", "indent")
+            indent = self.config.getboolean("look", "indent")
             self.widget.nicklist.setVisible(nicklist_visible)
             self.widget.title.setVisible(title_visible)
             if self.config.getboolean("input", "spellcheck"):
@@ -660,6 +1025,10 @@ class Buffer(QtCore.QObject):
             if self.widget.nicklist.confighash != confighash:
                 self.nicklist_refresh()
 
+            if isinstance(self.widget.chat, ChatListView):
+                self.widget.chat.set_max_lines(
+                    config.chat_view_max_lines(self.config))
+
             # Requires buffer redraw currently.
             if (self.widget.chat.time_format != time_format or
                     self.widget.chat.indent != indent):
@@ -762,11 +1131,8 @@ class Buffer(QtCore.QObject):
 
     @property
     def hot(self):
-        return self._hot
-
-    @hot.setter
-    def hot(self, value):
-        self._hot = value
+        """Return number of lines in hotlist (all priorities)."""
+        return sum(self.hotlist)
 
     @property
     def highlight(self):
@@ -775,3 +1141,112 @@ class Buffer(QtCore.QObject):
     @highlight.setter
     def highlight(self, value):
         self._highlight = value
+
+
+class BufferList(object):
+    """
+    Ordered list of buffers, with indexes by pointer, full name and number.
+
+    The number and full name of a buffer must be changed with set_number
+    and rename, so that indexes are kept up to date.
+    """
+
+    def __init__(self, buffers=None):
+        self.clear()
+        for buf in buffers or []:
+            self.insert(len(self._buffers), buf)
+
+    def __iter__(self):
+        return iter(self._buffers)
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def __getitem__(self, index):
+        return self._buffers[index]
+
+    def __contains__(self, buf):
+        return self._by_pointer.get(buf.pointer) is buf
+
+    def index(self, buf):
+        """Return position of a buffer in list."""
+        return self._buffers.index(buf)
+
+    def get(self, pointer):
+        """Return buffer with a pointer (None if not found)."""
+        return self._by_pointer.get(pointer)
+
+    def get_by_full_name(self, full_name):
+        """Return buffer with a full name (None if not found)."""
+        return self._by_full_name.get(full_name)
+
+    def get_by_number(self, number):
+        """Return list of buffers with a number (merged buffers)."""
+        return self._by_number.get(number, [])
+
+    def _index_add(self, buf):
+        """Add a buffer in indexes."""
+        self._by_pointer[buf.pointer] = buf
+        if 'full_name' in buf.data:
+            self._by_full_name[buf.data['full_name']] = buf
+        if 'number' in buf.data:
+            self._by_number.setdefault(buf.data['number'], []).append(buf)
+
+    def _index_remove(self, buf):
+        """Remove a buffer from indexes."""
+        if self._by_pointer.get(buf.pointer) is buf:
+            del self._by_pointer[buf.pointer]
+        full_name = buf.data.get('full_name')
+        if self._by_full_name.get(full_name) is buf:
+            del self._by_full_name[full_name]
+        bufs = self._by_number.get(buf.data.get('number'))
+        if bufs and buf in bufs:
+            bufs.remove(buf)
+            if not bufs:
+                del self._by_number[buf.data['number']]
+
+    def insert(self, index, buf):
+        """Insert a buffer in list."""
+        self._buffers.insert(index, buf)
+        self._index_add(buf)
+
+    def remove(self, buf):
+        """Remove a buffer from list."""
+        self._buffers.remove(buf)
+        self._index_remove(buf)
+
+    def clear(self):
+        """Remove all buffers."""
+        self._buffers = []
+        self._by_pointer = {}
+        self._by_full_name = {}
+        self._by_number = {}
+
+    def set_number(self, buf, number):
+        """Set number of a buffer."""
+        indexed = buf in self
+        if indexed:
+            self._index_remove(buf)
+        buf.data['number'] = number
+        if indexed:
+            self._index_add(buf)
+
+    def rename(self, buf, full_name, short_name):
+        """Set full name and short name of a buffer."""
+        indexed = buf in self
+        if indexed:
+            self._index_remove(buf)
+        buf.data['full_name'] = full_name
+        buf.data['short_name'] = short_name
+        if indexed:
+            self._index_add(buf)
+
+    def index_for_insert(self, next_buffer):
+        """Return position to insert a buffer before next_buffer."""
+        if next_buffer != '0x0':
+            buf = self.get(next_buffer)
+            if buf:
+                return self.index(buf)
+            print('Warning: unable to find position for buffer, using end of '
+                  'list by default')
+        return len(self._buffers)
@@ -31,40 +31,71 @@ import utils
 QtCore = qt_compat.import_module('QtCore')
 QtGui = qt_compat.import_module('QtGui')
 
+# max width of prefix column in indent mode (in chars)
+_PREFIX_MAX_CHARS = 20
 
-class ChatTextEdit(QtGui.QTextBrowser):
-    """Chat area."""
+# number of lines aligned at once on new columns of indent mode (when the
+# application is idle)
+_REALIGN_LINES = 200
 
-    def __init__(self, debug, *args):
-        QtGui.QTextBrowser.__init__(*(self,) + args)
-        self.debug = debug
+URL_REGEX = re.compile(
+    r"((https?):((//)|(\\\\))+[\w\d:#@%/;$()~_?\+-=\\\.&]*)",
+    re.MULTILINE | re.UNICODE)
+EMAIL_REGEX = re.compile(
+    r"([\w\-\.]+@(\w[\w\-]+\.)+[\w\-]+)", re.MULTILINE | re.UNICODE)
 
-        # Special config options:
-        self._color = color.Color(config.color_options(), self.debug)
-        self.time_format = '%H:%M'
-        self.indent = False
+
+def copied_columns(columns, first_col=0):
+    """Return text copied for columns of a line: "time <prefix> message"."""
+    coltext = []
+    for col, text in enumerate(columns, first_col):
+        text = text.strip().replace(u'\u2028', '\n')
+        if col == 1 and text != "*" and text:
+            coltext.append("<" + text + ">")
+        else:
+            coltext.append(text)
+    return " ".join(coltext)
+
+
+def show_context_menu(widget, pos):
+    """Show the context menu of a chat area (copy, select all, clear)."""
+    menu = QtGui.QMenu()
+    widget.actions_def = {
+        'copy':       ['edit-copy', False, False,
+                       lambda: widget.copy()],
+        'select all': ['edit-select-all', False, False,
+                       lambda: widget.selectAll()],
+        'clear':      ['edit-clear', False, False,
+                       lambda: widget.clear()],
+    }
+    actions = utils.build_actions(widget.actions_def, widget)
+    menu.addActions([
+        actions['copy'], actions['select all'], utils.separator(widget),
+        actions['clear'], utils.separator(widget)])
+    menu.exec_(widget.mapToGlobal(pos))
+
+
+class ChatFormatter(object):
+    """
+    Formatter of chat lines: WeeChat colors converted to text formats,
+    colors of prefixes (used in nicklist) and columns of indent mode.
+    """
+
+    def __init__(self, debug, textcolor):
+        self._color = color.Color(config.color_options(), debug)
         self._prefix_set = set()
         self.prefix_colors = dict()
-
-        self.readOnly = True
-        self.setTextInteractionFlags(QtCore.Qt.LinksAccessibleByMouse |
-                                     QtCore.Qt.TextSelectableByMouse |
-                                     QtCore.Qt.TextSelectableByKeyboard)
-        self.setOpenExternalLinks(True)
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.customContextMenuRequested.connect(self._context)
-        # Avoid setting the font family here so it can be changed elsewhere.
-        self._textcolor = self.textColor()
+        self._textcolor = textcolor
         self._bgcolor = QtGui.QColor('#FFFFFF')
+        self._char_format = QtGui.QTextCharFormat()
         self._setcolorcode = {
-            'F': (self.setTextColor, self._textcolor),
-            'B': (self.setTextBackgroundColor, self._bgcolor)
+            'F': (self._set_foreground, self._textcolor),
+            'B': (self._set_background, self._bgcolor)
         }
         self._setfont = {
-            '*': self.setFontWeight,
-            '_': self.setFontUnderline,
-            '/': self.setFontItalic
+            '*': self._char_format.setFontWeight,
+            '_': self._char_format.setFontUnderline,
+            '/': self._char_format.setFontItalic
         }
         self._fontvalues = {
             False: {
@@ -78,86 +109,32 @@ class ChatTextEdit(QtGui.QTextBrowser):
                 '/': True
             }
         }
-        self._timestamp_color = QtGui.QColor('#999999')
-        # Table format for indent mode:
-        self._table_format = QtGui.QTextTableFormat()
-        self._table_format.setBorderStyle(
-            QtGui.QTextFrameFormat.BorderStyle_None)
-        self._table_format.setBorder(0)
-        self._table_format.setCellPadding(0)
-        self._table_format.setCellSpacing(0)
-        self._table_format.setCellSpacing(0)
-        self._align_right = QtGui.QTextBlockFormat()
-        self._align_right.setAlignment(QtCore.Qt.AlignRight)
-
-        self.clear()
+        self.timestamp_format = QtGui.QTextCharFormat()
+        self.timestamp_format.setForeground(
+            QtGui.QBrush(QtGui.QColor('#999999')))
+        self.clear_columns()
 
-    def clear(self, *args):
-        QtGui.QTextBrowser.clear(*(self,) + args)
-        self._table = None
-
-    def display(self, time, prefix, text, forcecolor=None):
-        """Display a timestamped line."""
-        bar = self.verticalScrollBar()
-        bar_scroll = bar.maximum() - bar.value()
-        move_anchor = QtGui.QTextCursor.MoveAnchor
-        if not self.indent:  # Non-indented text; wraps under name/timestamp
-            self._table = None  # Clear in case config changed
-            cur = self.textCursor()
-            cur.movePosition(QtGui.QTextCursor.End, move_anchor)
-        else:  # Indented text; timestamp and names go in different columns.
-            if not self._table:
-                self._table = self.textCursor().insertTable(1, 3)
-                self._table.setFormat(self._table_format)
-            else:
-                self._table.appendRows(1)
-            cur = self._table.cellAt(self._table.rows() - 1,
-                                     0).firstCursorPosition()
-        if prefix[-3:] in ('<--', '-->'):
-            # join/part
-            pass
-        if prefix[-2:] == '--' and text.find('is now known as') >= 0:
-            # nick change
-            pass
-        self.setTextCursor(cur)
-        if time == 0:
-            d = datetime.datetime.now()
-        else:
-            d = datetime.datetime.fromtimestamp(float(time))
-        self.setTextColor(self._timestamp_color)
-        self.insertPlainText(d.strftime(self.time_format) + ' ')
-        if self.indent:  # Move to the next cell if using indentation
-            cur.movePosition(QtGui.QTextCursor.NextCell, move_anchor)
-            cur.setBlockFormat(self._align_right)
-            self.setTextCursor(cur)
+    def convert(self, prefix, text, forcecolor=None):
+        """
+        Convert WeeChat colors in prefix and text, return them as unicode
+        strings with colors for segments().
+        """
         prefix = self._color.convert(prefix)
         text = self._color.convert(text)
         if forcecolor:
             if prefix:
                 prefix = '\x01(F%s)%s' % (forcecolor, prefix)
             text = '\x01(F%s)%s' % (forcecolor, text)
-        if prefix:
-            if prefix not in self._prefix_set:
-                self._prefix_set.add(prefix)
-                pre_str = prefix.rsplit('\x01', 1)[-1]
-                self.prefix_colors[pre_str[10:]] = QtGui.QColor(pre_str[2:9])
-            self._display_with_colors(str(prefix).decode('utf-8') + ' ')
-        if self.indent:  # Move to the next cell if using indentation
-            cur.movePosition(QtGui.QTextCursor.NextCell, move_anchor)
-            self.setTextCursor(cur)
-        if text:
-            self._display_with_colors(str(text).decode('utf-8'))
-            if text[-1:] != '\n' and not self.indent:
-                self.insertPlainText('\n')
-        else:
-            self.insertPlainText('\n')
-        if bar_scroll < 10 and self.verticalScrollBar().maximum() > 0:
-            self.scroll_bottom()
+        if prefix and prefix not in self._prefix_set:
+            self._prefix_set.add(prefix)
+            pre_str = prefix.rsplit('\x01', 1)[-1]
+            self.prefix_colors[pre_str[10:]] = QtGui.QColor(pre_str[2:9])
+        return str(prefix).decode('utf-8'), str(text).decode('utf-8')
 
-    def _display_with_colors(self, string):
-        self.setTextColor(self._textcolor)
-        self.setTextBackgroundColor(self._bgcolor)
-        self._reset_attributes()
+    def segments(self, string):
+        """Return list of (text, format) for a string with colors."""
+        self._reset_format()
+        segments = []
         items = string.split('\x01')
         for i, item in enumerate(items):
             if i > 0 and item.startswith('('):
@@ -193,28 +170,53 @@ class ChatTextEdit(QtGui.QTextBrowser):
                                     QtGui.QColor(code))
                     item = item[pos+1:]
             if len(item) > 0:
-                self.insertPlainText(item)
+                segments.append((item,
+                                 QtGui.QTextCharFormat(self._char_format)))
+        return segments
 
-    def insertPlainText(self, item):
-        if "http://" in item or "https://" in item:
-            link_item = self.replace_url_to_link(cgi.escape(item)) + " "
-            # The extra space prevents the link from wrapping to the next line.
-            QtGui.QTextEdit.insertHtml(self, link_item)
-        else:
-            QtGui.QTextEdit.insertPlainText(self, item)
+    def clear_columns(self):
+        """Reset columns of indent mode."""
+        self.time_width = 0
+        self.prefix_width = 0
+        self.prefix_end = 0
+        self.message_start = 0
 
-    @staticmethod
-    def replace_url_to_link(value):
-        # Replace url to link
-        urls = re.compile(
-            r"((https?):((//)|(\\\\))+[\w\d:#@%/;$()~_?\+-=\\\.&]*)",
-            re.MULTILINE | re.UNICODE)
-        value = urls.sub(r'<a href="\1" target="_blank">\1</a>', value)
-        # Replace email to mailto
-        urls = re.compile(
-            r"([\w\-\.]+@(\w[\w\-]+\.)+[\w\-]+)", re.MULTILINE | re.UNICODE)
-        value = urls.sub(r'<a href="mailto:\1">\1</a>', value)
-        return value
+    def update_columns(self, font, timestamp, prefix):
+        """
+        Enlarge columns of indent mode for a timestamp and prefix (without
+        colors), return True if columns have changed.
+        """
+        metrics = QtGui.QFontMetrics(font)
+        time_width = metrics.width(timestamp)
+        prefix_width = min(metrics.width(prefix),
+                           metrics.averageCharWidth() * _PREFIX_MAX_CHARS)
+        if time_width <= self.time_width and prefix_width <= self.prefix_width:
+            return False
+        self.time_width = max(self.time_width, time_width)
+        self.prefix_width = max(self.prefix_width, prefix_width)
+        space = metrics.width(' ')
+        self.prefix_end = self.time_width + space + self.prefix_width
+        self.message_start = self.prefix_end + space
+        return True
+
+    def tab_positions(self):
+        """Return tab positions of indent mode (prefix, message)."""
+        return [
+            QtGui.QTextOption.Tab(self.prefix_end,
+                                  QtGui.QTextOption.RightTab),
+            QtGui.QTextOption.Tab(self.message_start,
+                                  QtGui.QTextOption.LeftTab)]
+
+    def _set_foreground(self, color):
+        self._char_format.setForeground(QtGui.QBrush(color))
+
+    def _set_background(self, color):
+        self._char_format.setBackground(QtGui.QBrush(color))
+
+    def _reset_format(self):
+        self._set_foreground(self._textcolor)
+        self._set_background(self._bgcolor)
+        self._reset_attributes()
 
     def _reset_attributes(self):
         self._font = {}
@@ -225,30 +227,218 @@ class ChatTextEdit(QtGui.QTextBrowser):
         self._font[attr] = value
         self._setfont[attr](self._fontvalues[self._font[attr]][attr])
 
+
+class ChatTextEdit(QtGui.QTextBrowser):
+    """Chat area."""
+
+    def __init__(self, debug, *args):
+        QtGui.QTextBrowser.__init__(*(self,) + args)
+        self.debug = debug
+
+        # Special config options:
+        self.time_format = '%H:%M'
+        self.indent = False
+
+        self.readOnly = True
+        self.setTextInteractionFlags(QtCore.Qt.LinksAccessibleByMouse |
+                                     QtCore.Qt.TextSelectableByMouse |
+                                     QtCore.Qt.TextSelectableByKeyboard)
+        self.setOpenExternalLinks(True)
+        self.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._context)
+        # Avoid setting the font family here so it can be changed elsewhere.
+        # Lines are inserted with a cursor and formats of the formatter, not
+        # with the current format of widget.
+        self._formatter = ChatFormatter(self.debug, self.textColor())
+        self.prefix_colors = self._formatter.prefix_colors
+        self._realign_timer = QtCore.QTimer(self)
+        self._realign_timer.setSingleShot(True)
+        self._realign_timer.timeout.connect(self._realign_lines)
+
+        self.clear()
+
+    def clear(self, *args):
+        QtGui.QTextBrowser.clear(*(self,) + args)
+        # Indent mode: each line is a block "time<tab>prefix<tab>message",
+        # with tab stops (prefix is right aligned) and a hanging indent;
+        # columns are enlarged when a wider time/prefix is displayed.
+        self._formatter.clear_columns()
+        self._indent_format = QtGui.QTextBlockFormat()
+        self._indent_changed = False
+        self._realign_timer.stop()
+        self._realign_next = -1
+
+    def display(self, time, prefix, text, forcecolor=None):
+        """Display a timestamped line."""
+        self.display_many([(time, prefix, text, forcecolor)])
+
+    def display_many(self, lines):
+        """
+        Display timestamped lines: list of (time, prefix, text, forcecolor).
+
+        Lines are inserted in a single edit block, with updates of widget
+        suspended, and the view is scrolled once (if it was at bottom).
+        """
+        if not lines:
+            return
+        bar = self.verticalScrollBar()
+        bar_scroll = bar.maximum() - bar.value()
+        updates_enabled = self.updatesEnabled()
+        self.setUpdatesEnabled(False)
+        cur = QtGui.QTextCursor(self.document())
+        cur.movePosition(QtGui.QTextCursor.End)
+        start = cur.position()
+        cur.beginEditBlock()
+        try:
+            for line in lines:
+                self._insert_line(cur, *line)
+        finally:
+            if self._indent_changed:
+                self._apply_indent_format(start)
+            cur.endEditBlock()
+            self.setUpdatesEnabled(updates_enabled)
+        if bar_scroll < 10 and bar.maximum() > 0:
+            self.scroll_bottom()
+
+    def _insert_line(self, cur, time, prefix, text, forcecolor=None):
+        """Insert a timestamped line with the cursor."""
+        cur.movePosition(QtGui.QTextCursor.End)
+        if prefix[-3:] in ('<--', '-->'):
+            # join/part
+            pass
+        if prefix[-2:] == '--' and text.find('is now known as') >= 0:
+            # nick change
+            pass
+        if time == 0:
+            d = datetime.datetime.now()
+        else:
+            d = datetime.datetime.fromtimestamp(float(time))
+        # Non-indented text wraps under name/timestamp; indented text has
+        # timestamp and names in different columns (separated by tabs).
+        separator = '\t' if self.indent else ' '
+        timestamp = d.strftime(self.time_format)
+        self._insert_text(cur, timestamp + separator,
+                          self._formatter.timestamp_format)
+        prefix, text = self._formatter.convert(prefix, text, forcecolor)
+        if prefix:
+            prefix = self._display_with_colors(cur, prefix + separator)
+        elif self.indent:
+            self._insert_text(cur, separator,
+                              self._formatter.timestamp_format)
+        if self.indent:
+            # keep message in one block (for the hanging indent)
+            text = text.rstrip('\n').replace('\n', u'\u2028')
+            self._update_indent(timestamp, prefix.strip())
+            cur.setBlockFormat(self._indent_format)
+        elif self._formatter.time_width:
+            # indent mode disabled: no more columns
+            cur.setBlockFormat(QtGui.QTextBlockFormat())
+        if text:
+            self._display_with_colors(cur, text)
+        if text[-1:] != '\n':
+            self._insert_text(cur, '\n', self._formatter.timestamp_format)
+
+    def _update_indent(self, timestamp, prefix):
+        """Enlarge columns of indent mode for a timestamp and prefix."""
+        if not self._formatter.update_columns(self.document().defaultFont(),
+                                              timestamp, prefix):
+            return
+        message_start = self._formatter.message_start
+        self._indent_format = QtGui.QTextBlockFormat()
+        self._indent_format.setTabPositions(self._formatter.tab_positions())
+        self._indent_format.setLeftMargin(message_start)
+        self._indent_format.setTextIndent(-message_start)
+        self._indent_changed = True
+
+    def _apply_indent_format(self, start):
+        """
+        Apply new columns of indent mode to lines inserted from a position.
+
+        Lines displayed before are aligned later, by chunks of lines, when
+        the application is idle (see _realign_lines): they are not all laid
+        out again in this display.
+        """
+        cur = QtGui.QTextCursor(self.document())
+        cur.setPosition(start)
+        cur.movePosition(QtGui.QTextCursor.End, QtGui.QTextCursor.KeepAnchor)
+        cur.mergeBlockFormat(self._indent_format)
+        self._indent_changed = False
+        self._realign_next = self.document().findBlock(start).blockNumber() - 1
+        if self._realign_next >= 0:
+            self._realign_timer.start(0)
+
+    def _realign_lines(self):
+        """
+        Slot: apply columns of indent mode to a chunk of lines displayed
+        before the columns were enlarged, from the last one (lines at bottom
+        are visible first); the next chunk is aligned in the next call.
+        """
+        doc = self.document()
+        bar = self.verticalScrollBar()
+        bar_scroll = bar.maximum() - bar.value()
+        first = max(self._realign_next - _REALIGN_LINES + 1, 0)
+        block = doc.findBlockByNumber(first)
+        cur = QtGui.QTextCursor(doc)
+        cur.beginEditBlock()
+        while block.isValid() and block.blockNumber() <= self._realign_next:
+            # only lines of indent mode have tab positions
+            if block.blockFormat().tabPositions():
+                cur.setPosition(block.position())
+                cur.mergeBlockFormat(self._indent_format)
+            block = block.next()
+        cur.endEditBlock()
+        self._realign_next = first - 1
+        if self._realign_next >= 0:
+            self._realign_timer.start(0)
+        if bar_scroll < 10 and bar.maximum() > 0:
+            self.scroll_bottom()
+
+    def _display_with_colors(self, cur, string):
+        """Insert a string with colors, return the string without colors."""
+        displayed = []
+        for item, char_format in self._formatter.segments(string):
+            self._insert_text(cur, item, char_format)
+            displayed.append(item)
+        return ''.join(displayed)
+
+    def _insert_text(self, cur, item, char_format):
+        """Insert text with the cursor (URLs are converted to links)."""
+        if "http://" in item or "https://" in item:
+            link_item = self.replace_url_to_link(cgi.escape(item)) + " "
+            # The extra space prevents the link from wrapping to the next line.
+            cur.insertHtml(link_item)
+        else:
+            cur.insertText(item, char_format)
+
+    def insertPlainText(self, item):
+        self._insert_text(self.textCursor(), item, self.currentCharFormat())
+
+    @staticmethod
+    def replace_url_to_link(value):
+        # Replace url to link
+        value = URL_REGEX.sub(r'<a href="\1" target="_blank">\1</a>', value)
+        # Replace email to mailto
+        value = EMAIL_REGEX.sub(r'<a href="mailto:\1">\1</a>', value)
+        return value
+
     def scroll_bottom(self):
         bar = self.verticalScrollBar()
         bar.setValue(bar.maximum())
 
+    def has_selection(self):
+        """Return True if some text is selected."""
+        return self.textCursor().hasSelection()
+
     def copy(self):
         """Override the copy method to improve the formatting."""
         cur = self.textCursor()
         text = None
-        if cur.hasComplexSelection():
-            first_row, num_rows, first_col, num_cols = cur.selectedTableCells()
-            rowtext = []
-            for row in range(num_rows):
-                coltext = []
-                for col in range(num_cols):
-                    cell = self._table.cellAt(first_row + row, first_col + col)
-                    text = cell.firstCursorPosition().block().text().strip()
-                    if first_col + col == 1 and text != "*" and text:
-                        coltext.append("<" + text + ">")
-                    else:
-                        coltext.append(text)
-                rowtext.append(" ".join(coltext))
-            text = "\n".join(rowtext)
-        elif cur.hasSelection():
+        if cur.hasSelection():
             text = cur.selectedText()
+            if '\t' in text:
+                # selection on columns of indent mode
+                text = self._selected_columns(cur)
         if text:
             html = cur.selection().toHtml()
             clipboard = QtGui.QApplication.clipboard()
@@ -257,19 +447,28 @@ class ChatTextEdit(QtGui.QTextBrowser):
             mime_data.setText(text)
             clipboard.setMimeData(mime_data)
 
+    def _selected_columns(self, cur):
+        """
+        Return text of lines selected in indent mode: whole columns
+        selected, as "time <prefix> message".
+        """
+        start, end = cur.selectionStart(), cur.selectionEnd()
+        block = self.document().findBlock(start)
+        rowtext = []
+        while block.isValid() and (block.position() < end or not rowtext):
+            text = block.text()
+            first = max(start - block.position(), 0)
+            last = min(end - block.position(), len(text))
+            if '\t' not in text:
+                rowtext.append(text[first:last])
+            else:
+                first_col = min(text.count('\t', 0, first), 2)
+                last_col = min(text.count('\t', 0, last), 2)
+                columns = text.split('\t', 2)[first_col:last_col + 1]
+                rowtext.append(copied_columns(columns, first_col))
+            block = block.next()
+        return "\n".join(rowtext)
+
     def _context(self, event):
         """Show a context menu when the chat is right clicked."""
-        menu = QtGui.QMenu()
-        self.actions_def = {
-            'copy':       ['edit-copy', False, False,
-                           lambda: self.copy()],
-            'select all': ['edit-select-all', False, False,
-                           lambda: self.selectAll()],
-            'clear':      ['edit-clear', False, False,
-                           lambda: self.clear()],
-        }
-        actions = utils.build_actions(self.actions_def, self)
-        menu.addActions([
-            actions['copy'], actions['select all'], utils.separator(self),
-            actions['clear'], utils.separator(self)])
-        menu.exec_(self.mapToGlobal(event))
+        show_context_menu(self, event)
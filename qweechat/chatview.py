@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#
+# chatview.py - chat area displaying only visible lines (long buffers)
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import cgi
+import collections
+import datetime
+import qt_compat
+from chat import (ChatFormatter, URL_REGEX, EMAIL_REGEX, copied_columns,
+                  show_context_menu)
+
+QtCore = qt_compat.import_module('QtCore')
+QtGui = qt_compat.import_module('QtGui')
+
+# number of lines laid out kept in cache (lines visible + some margin)
+_LAYOUT_CACHE_SIZE = 512
+
+
+class ChatLineModel(QtCore.QAbstractListModel):
+    """
+    Lines of a chat area: (time, prefix, text, forcecolor).  If max_lines
+    is set, oldest lines are removed when lines are appended above this
+    number.
+    """
+
+    def __init__(self, *args):
+        QtCore.QAbstractListModel.__init__(*(self,) + args)
+        self._lines = []
+        self.max_lines = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._lines)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        # lines are laid out and painted by the view
+        return None
+
+    def line(self, row):
+        """Return a line: (time, prefix, text, forcecolor)."""
+        return self._lines[row]
+
+    def append_lines(self, lines):
+        """Append lines (oldest lines are removed above max_lines)."""
+        if not lines:
+            return
+        first = len(self._lines)
+        self.beginInsertRows(QtCore.QModelIndex(), first,
+                             first + len(lines) - 1)
+        self._lines.extend(lines)
+        self.endInsertRows()
+        if self.max_lines and len(self._lines) > self.max_lines:
+            self.remove_first(len(self._lines) - self.max_lines)
+
+    def remove_first(self, count):
+        """Remove the first (oldest) lines."""
+        count = min(count, len(self._lines))
+        if count <= 0:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), 0, count - 1)
+        del self._lines[:count]
+        self.endRemoveRows()
+
+    def clear(self):
+        """Remove all lines."""
+        self.beginResetModel()
+        self._lines = []
+        self.endResetModel()
+
+
+class ChatLine(object):
+    """A line laid out: text (without colors), layout and links."""
+
+    __slots__ = ('text', 'layout', 'links')
+
+    def __init__(self, text, layout, links):
+        self.text = text
+        self.layout = layout
+        self.links = links
+
+
+class ChatLineDelegate(QtGui.QStyledItemDelegate):
+    """Paints lines of ChatListView (laid out by the view)."""
+
+    def paint(self, painter, option, index):
+        view = self.parent()
+        if option.state & QtGui.QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        painter.save()
+        painter.setClipRect(option.rect)
+        view.line(index.row()).layout.draw(
+            painter, QtCore.QPointF(option.rect.topLeft()))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(1, self.parent().line_height())
+
+
+class ChatListView(QtGui.QListView):
+    """
+    Chat area for long buffers: lines are kept in a model and only visible
+    lines are laid out and painted.  All lines have the same height (one
+    line of text, not wrapped: full text is in tooltip), so that scrolling
+    does not depend on number of lines.
+    """
+
+    def __init__(self, debug, *args):
+        QtGui.QListView.__init__(*(self,) + args)
+        self.debug = debug
+
+        # Special config options:
+        self.time_format = '%H:%M'
+        self.indent = False
+
+        self._model = ChatLineModel(self)
+        self._model.rowsRemoved.connect(self._lines_removed)
+        self.setModel(self._model)
+        self.setItemDelegate(ChatLineDelegate(self))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.setMouseTracking(True)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._context)
+        self._formatter = ChatFormatter(
+            self.debug, self.palette().color(QtGui.QPalette.Text))
+        self.prefix_colors = self._formatter.prefix_colors
+        self._link_format = QtGui.QTextCharFormat()
+        self._link_format.setForeground(self.palette().link())
+        self._link_format.setFontUnderline(True)
+        self._layouts = collections.OrderedDict()
+        self._layouts_key = None
+        self._pressed_url = None
+
+    def clear(self):
+        """Remove all lines."""
+        self._model.clear()
+        self._formatter.clear_columns()
+        self._layouts.clear()
+
+    def set_max_lines(self, max_lines):
+        """
+        Set max number of lines kept (0 = no limit): oldest lines are
+        removed.
+        """
+        self._model.max_lines = max_lines
+        count = self._model.rowCount()
+        if max_lines and count > max_lines:
+            self._model.remove_first(count - max_lines)
+
+    def _lines_removed(self, *args):
+        """Slot: lines removed from model (rows of lines have changed)."""
+        self._layouts.clear()
+
+    def display(self, time, prefix, text, forcecolor=None):
+        """Display a timestamped line."""
+        self.display_many([(time, prefix, text, forcecolor)])
+
+    def display_many(self, lines):
+        """
+        Display timestamped lines: list of (time, prefix, text, forcecolor).
+        Lines are laid out only when they are visible.
+        """
+        if not lines:
+            return
+        bar = self.verticalScrollBar()
+        bar_scroll = bar.maximum() - bar.value()
+        for time, prefix, text, forcecolor in lines:
+            # colors of prefixes are used in nicklist
+            self._formatter.convert(prefix, '', forcecolor)
+        self._model.append_lines(lines)
+        if bar_scroll < 10:
+            self.scroll_bottom()
+
+    def scroll_bottom(self):
+        self.scrollToBottom()
+
+    def line_height(self):
+        """Return height of a line."""
+        return QtGui.QFontMetrics(self.font()).lineSpacing()
+
+    def line(self, row):
+        """Return line laid out (ChatLine)."""
+        key = (self.time_format, self.indent, self.font().key())
+        if key != self._layouts_key:
+            # config or font changed: all lines must be laid out again
+            self._layouts.clear()
+            self._formatter.clear_columns()
+            self._layouts_key = key
+        line = self._layouts.pop(row, None)
+        if line is None:
+            line = self._layout_line(row)
+            if len(self._layouts) >= _LAYOUT_CACHE_SIZE:
+                self._layouts.popitem(last=False)
+        self._layouts[row] = line
+        return line
+
+    def _line_segments(self, row):
+        """
+        Return timestamp, prefix (without colors) and segments of a line:
+        list of (text, format).
+        """
+        time, prefix, text, forcecolor = self._model.line(row)
+        if time == 0:
+            d = datetime.datetime.now()
+        else:
+            d = datetime.datetime.fromtimestamp(float(time))
+        # Non-indented text wraps under name/timestamp; indented text has
+        # timestamp and names in different columns (separated by tabs).
+        separator = '\t' if self.indent else ' '
+        timestamp = d.strftime(self.time_format)
+        prefix, text = self._formatter.convert(prefix, text, forcecolor)
+        segments = [(timestamp + separator, self._formatter.timestamp_format)]
+        if prefix:
+            prefix_segments = self._formatter.segments(prefix + separator)
+            segments.extend(prefix_segments)
+            prefix = ''.join(item for item, _ in prefix_segments)
+        elif self.indent:
+            segments.append((separator, self._formatter.timestamp_format))
+        text = text.rstrip('\n').replace('\n', ' ')
+        if text:
+            segments.extend(self._formatter.segments(text))
+        return timestamp, prefix.strip(), segments
+
+    def _layout_line(self, row):
+        """Lay out a line."""
+        timestamp, prefix, segments = self._line_segments(row)
+        if self.indent and self._formatter.update_columns(self.font(),
+                                                          timestamp, prefix):
+            # columns enlarged: lines must be laid out again
+            self._layouts.clear()
+            self.viewport().update()
+        text = ''.join(item for item, _ in segments)
+        formats = []
+        pos = 0
+        for item, char_format in segments:
+            formats.append(self._format_range(pos, len(item), char_format))
+            pos += len(item)
+        links = []
+        for regex, url in ((URL_REGEX, '%s'), (EMAIL_REGEX, 'mailto:%s')):
+            for match in regex.finditer(text):
+                start, end = match.span()
+                if any(start < link[1] and link[0] < end for link in links):
+                    continue
+                links.append((start, end, url % match.group(1)))
+                formats.append(self._format_range(start, end - start,
+                                                  self._link_format))
+        layout = QtGui.QTextLayout(text, self.font())
+        layout.setAdditionalFormats(formats)
+        option = QtGui.QTextOption()
+        option.setWrapMode(QtGui.QTextOption.NoWrap)
+        if self.indent:
+            option.setTabs(self._formatter.tab_positions())
+        layout.setTextOption(option)
+        layout.beginLayout()
+        layout.createLine().setLineWidth(self.viewport().width())
+        layout.endLayout()
+        return ChatLine(text, layout, links)
+
+    @staticmethod
+    def _format_range(start, length, char_format):
+        format_range = QtGui.QTextLayout.FormatRange()
+        format_range.start = start
+        format_range.length = length
+        format_range.format = char_format
+        return format_range
+
+    def _url_at(self, pos):
+        """Return URL of link at a position in viewport (None if no link)."""
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None
+        line = self.line(index.row())
+        text_line = line.layout.lineAt(0)
+        x = pos.x() - self.visualRect(index).x()
+        if not line.links or x > text_line.naturalTextWidth():
+            return None
+        cursor = text_line.xToCursor(x, QtGui.QTextLine.CursorOnCharacter)
+        for start, end, url in line.links:
+            if start <= cursor < end:
+                return url
+        return None
+
+    def has_selection(self):
+        """Return True if some lines are selected."""
+        return self.selectionModel().hasSelection()
+
+    def copy(self):
+        """Copy selected lines, as "time <prefix> message"."""
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if not rows:
+            return
+        rowtext = []
+        for row in rows:
+            text = ''.join(item for item, _ in self._line_segments(row)[2])
+            if self.indent:
+                text = copied_columns(text.split('\t', 2))
+            rowtext.append(text)
+        clipboard = QtGui.QApplication.clipboard()
+        mime_data = QtCore.QMimeData()
+        mime_data.setText('\n'.join(rowtext))
+        clipboard.setMimeData(mime_data)
+
+    def toHtml(self):
+        """Return HTML with text of all lines (for chat source dialog)."""
+        return '<pre>%s</pre>' % '\n'.join(
+            cgi.escape(''.join(item for item, _ in
+                               self._line_segments(row)[2]))
+            for row in range(self._model.rowCount()))
+
+    def mouseMoveEvent(self, event):
+        if self._url_at(event.pos()):
+            self.viewport().setCursor(QtCore.Qt.PointingHandCursor)
+        else:
+            self.viewport().unsetCursor()
+        QtGui.QListView.mouseMoveEvent(self, event)
+
+    def mousePressEvent(self, event):
+        self._pressed_url = self._url_at(event.pos())
+        QtGui.QListView.mousePressEvent(self, event)
+
+    def mouseReleaseEvent(self, event):
+        QtGui.QListView.mouseReleaseEvent(self, event)
+        url = self._url_at(event.pos())
+        if (event.button() == QtCore.Qt.LeftButton and url and
+                url == self._pressed_url):
+            QtGui.QDesktopServices.openUrl(QtCore.QUrl(url))
+        self._pressed_url = None
+
+    def viewportEvent(self, event):
+        if event.type() == QtCore.QEvent.ToolTip:
+            # full text of lines truncated
+            index = self.indexAt(event.pos())
+            if index.isValid():
+                line = self.line(index.row())
+                if (line.layout.lineAt(0).naturalTextWidth() >
+                        self.visualRect(index).width()):
+                    QtGui.QToolTip.showText(event.globalPos(),
+                                            line.text.replace('\t', ' '),
+                                            self.viewport())
+                    return True
+            QtGui.QToolTip.hideText()
+            return True
+        return QtGui.QListView.viewportEvent(self, event)
+
+    def changeEvent(self, event):
+        QtGui.QListView.changeEvent(self, event)
+        if event.type() == QtCore.QEvent.FontChange:
+            # height of lines has changed
+            self.doItemsLayout()
+
+    def _context(self, event):
+        """Show a context menu when the chat is right clicked."""
+        show_context_menu(self, event)
@@ -29,6 +29,8 @@ CONFIG_FILENAME = '%s/qweechat.conf' % CONFIG_DIR
 
 CONFIG_DEFAULT_RELAY_LINES = 50
 CONFIG_DEFAULT_RELAY_PING = 15
+CONFIG_DEFAULT_RELAY_HOTLIST_INTERVAL = 600
+CONFIG_DEFAULT_CHAT_VIEW_MAX_LINES = 10000
 
 CONFIG_DEFAULT_SECTIONS = ('look', 'input', 'nicks', 'buffers', 'buffer_flags',
                            'notifications', 'color', 'relay')
@@ -41,10 +43,18 @@ CONFIG_DEFAULT_OPTIONS = (
     ('relay.autoconnect', 'off'),
     ('relay.lines', str(CONFIG_DEFAULT_RELAY_LINES)),
     ('relay.ping', str(CONFIG_DEFAULT_RELAY_PING)),
+    ('relay.hotlist_interval', str(CONFIG_DEFAULT_RELAY_HOTLIST_INTERVAL)),
+    ('relay.capture_file', ''),
+    ('relay.max_message_size', '256'),
     ('look.style', ''),
     ('look.custom_stylesheet', ''),
     ('look.custom_font', ''),
     ('look.indent', 'on'),
+    # chat area: "text" (lines wrapped) or "list" (for long buffers: one
+    # row by line, long lines are cut, full text is in tooltip)
+    ('look.chat_view', 'text'),
+    # max lines kept in chat area "list" (0 = no limit)
+    ('look.chat_view_max_lines', str(CONFIG_DEFAULT_CHAT_VIEW_MAX_LINES)),
     ('look.hide_join_and_part', 'off'),
     ('look.hide_nick_changes', 'off'),
     ('look.opacity', '100%'),
@@ -73,6 +83,9 @@ CONFIG_DEFAULT_OPTIONS = (
     ('buffers.tree_view_merged', 'on'),
     ('buffers.position', 'left'),
     ('buffers.custom_font', ''),
+    # max lines kept for a buffer not visible (0 = no limit); older lines
+    # are dropped (not displayed when the buffer is shown)
+    ('buffers.hidden_max_lines', '0'),
     # Copies of buffer settings in weechat;
     # perhaps use the server settings instead?
     # buffers.look.* follow server names exactly. The rest are custom.
@@ -191,6 +204,15 @@ def read():
     return config
 
 
+def chat_view_max_lines(config):
+    """Return max lines kept in chat area "list" (0 = no limit)."""
+    try:
+        max_lines = int(config.get('look', 'chat_view_max_lines'))
+    except ValueError:
+        max_lines = CONFIG_DEFAULT_CHAT_VIEW_MAX_LINES
+    return max(max_lines, 0)
+
+
 def write(config):
     """Write config file."""
     if not os.path.exists(CONFIG_DIR):
@@ -20,9 +20,12 @@
 # along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
+import time
 import qt_compat
 from chat import ChatTextEdit
 from input import InputLineEdit
+import weechat.protocol as protocol
 
 QtGui = qt_compat.import_module('QtGui')
 
@@ -45,6 +48,62 @@ class DebugDialog(QtGui.QDialog):
         self.setLayout(vbox)
         self.show()
 
-    def display_lines(self, lines):
-        for line in lines:
-            self.chat.display(*line[0], **line[1])
+    def display_entries(self, entries):
+        """Display entries of a debug capture."""
+        self.chat.display_many(
+            [(entry[0], prefix, text, forcecolor)
+             for entry in entries
+             for prefix, text, forcecolor in DebugCapture.format_entry(entry)])
+
+
+class DebugCapture(object):
+    """
+    Ring buffer with the last debug entries.
+
+    An entry keeps a reference to its data (for example a message received
+    from WeeChat) and a function to format it: the entry is formatted only
+    when it is displayed.  When the capture is disabled, nothing is stored.
+    """
+
+    def __init__(self, size):
+        self.enabled = False
+        self.entries = collections.deque(maxlen=size)
+
+    def add(self, formatter, *args):
+        """
+        Add an entry, formatted later by formatter(*args).
+        Return the entry, None if the capture is disabled.
+        """
+        if not self.enabled:
+            return None
+        entry = (time.time(), formatter, args)
+        self.entries.append(entry)
+        return entry
+
+    @staticmethod
+    def format_entry(entry):
+        """Return list of lines (prefix, text, forcecolor) for an entry."""
+        return entry[1](*entry[2])
+
+    @staticmethod
+    def format_text(prefix, text, forcecolor=None):
+        """Format a text."""
+        return [(prefix, text, forcecolor)]
+
+    @staticmethod
+    def format_message(message):
+        """Format a message received from WeeChat."""
+        lines = []
+        if message.compression:
+            lines.append(('==>', 'message (%d bytes)' % message.size,
+                          '#008800'))
+        if message.uncompressed:
+            lines.append(('==>',
+                          'message%s (%d bytes):\n%s'
+                          % (' uncompressed' if message.compression else '',
+                             message.size_uncompressed,
+                             protocol.hex_and_ascii(message.uncompressed,
+                                                    20)),
+                          '#008800'))
+        lines.append(('', 'Message: %s' % message, None))
+        return lines
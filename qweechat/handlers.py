@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# handlers.py - handlers of messages received from WeeChat/relay
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import traceback
+import qt_compat
+
+QtCore = qt_compat.import_module('QtCore')
+QtGui = qt_compat.import_module('QtGui')
+
+
+class MessageHandler(object):
+    """A handler of messages, with its stats."""
+
+    __slots__ = ('name', 'callback', 'threaded', 'done', 'calls', 'time')
+
+    def __init__(self, name, callback, threaded=False, done=None):
+        self.name = name
+        self.callback = callback
+        self.threaded = threaded
+        self.done = done
+        self.calls = 0
+        self.time = 0.0
+
+
+class HandlerWorker(QtCore.QObject):
+    """Runs threaded handlers, in a worker thread."""
+
+    handled = qt_compat.Signal(object, object, float)
+
+    def run(self, handler, message):
+        """Slot: run a handler."""
+        start = time.time()
+        result = None
+        try:
+            result = handler.callback(message)
+        except Exception:
+            print('Error in handler "%s" of message "%s":\n%s'
+                  % (handler.name, message.msgid, traceback.format_exc()))
+        self.handled.emit(handler, result, time.time() - start)
+
+
+class HandlerRegistry(QtCore.QObject):
+    """
+    Registry of handlers of messages received from WeeChat/relay.
+
+    Handlers are registered for a message id, or for a prefix of message
+    ids (used if no handler is registered for the message id itself).
+    A threaded handler runs in a worker thread (so it must not use
+    widgets); its result is given to its "done" callback, in the GUI
+    thread.  For each handler, the number of calls and the time spent are
+    recorded.
+    """
+
+    runThreaded = qt_compat.Signal(object, object)
+
+    def __init__(self, *args):
+        QtCore.QObject.__init__(*(self,) + args)
+        self._handlers = {}
+        self._prefixes = []
+        self._resolved = {}
+        self._thread = None
+        self._worker = None
+
+    def register(self, msgid, callback, prefix=False, threaded=False,
+                 done=None, name=None):
+        """Register a handler for a message id (or a prefix)."""
+        handler = MessageHandler(name or getattr(callback, '__name__',
+                                                 str(callback)),
+                                 callback, threaded=threaded, done=done)
+        if prefix:
+            self._prefixes.append((msgid, handler))
+            # longest prefixes first
+            self._prefixes.sort(key=lambda item: -len(item[0]))
+        else:
+            self._handlers.setdefault(msgid, []).append(handler)
+        self._resolved.clear()
+        if threaded:
+            self._start_worker()
+        return handler
+
+    def unregister(self, handler):
+        """Unregister a handler."""
+        for handlers in self._handlers.values():
+            if handler in handlers:
+                handlers.remove(handler)
+        self._prefixes = [item for item in self._prefixes
+                          if item[1] is not handler]
+        self._resolved.clear()
+
+    def handlers(self, msgid):
+        """
+        Return handlers for a message id (a tuple: handlers registered or
+        unregistered while a message is dispatched do not change it).
+        """
+        handlers = self._resolved.get(msgid)
+        if handlers is None:
+            handlers = tuple(self._handlers.get(msgid, ()))
+            if not handlers:
+                handlers = tuple([handler
+                                  for prefix, handler in self._prefixes
+                                  if msgid.startswith(prefix)][:1])
+            self._resolved[msgid] = handlers
+        return handlers
+
+    def dispatch(self, message):
+        """Call handlers of a message."""
+        for handler in self.handlers(message.msgid):
+            if handler.threaded:
+                self.runThreaded.emit(handler, message)
+                continue
+            start = time.time()
+            try:
+                handler.callback(message)
+            finally:
+                handler.calls += 1
+                handler.time += time.time() - start
+
+    def _start_worker(self):
+        """Start the worker thread for threaded handlers."""
+        if self._thread:
+            return
+        self._thread = QtCore.QThread()
+        self._worker = HandlerWorker()
+        self._worker.moveToThread(self._thread)
+        self.runThreaded.connect(self._worker.run)
+        self._worker.handled.connect(self._handled)
+        self._thread.start()
+        QtGui.QApplication.instance().aboutToQuit.connect(self._stop_worker)
+
+    def _stop_worker(self):
+        """Stop the worker thread (when the application quits)."""
+        self._thread.quit()
+        self._thread.wait()
+
+    def _handled(self, handler, result, elapsed):
+        """Slot: threaded handler has run."""
+        handler.calls += 1
+        handler.time += elapsed
+        if handler.done:
+            handler.done(result)
+
+    def stats(self):
+        """Return stats of handlers: list of (name, calls, time)."""
+        handlers = [handler for handlers in self._handlers.values()
+                    for handler in handlers]
+        handlers.extend(handler for _, handler in self._prefixes)
+        return sorted(((handler.name, handler.calls, handler.time)
+                       for handler in handlers if handler.calls),
+                      key=lambda stat: -stat[2])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# hotlist.py - hotlist: buffers with unread lines, by priority
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import qt_compat
+
+QtCore = qt_compat.import_module('QtCore')
+
+# priorities of hotlist (same as WeeChat: index in counters)
+PRIORITY_LOW = 0
+PRIORITY_MESSAGE = 1
+PRIORITY_PRIVATE = 2
+PRIORITY_HIGHLIGHT = 3
+PRIORITIES = ('low', 'message', 'private', 'highlight')
+
+# counters of a buffer which is not in hotlist
+EMPTY = (0, 0, 0, 0)
+
+
+def line_priority(item):
+    """
+    Return hotlist priority for a line (hdata item of "line_data"), None
+    if the line is not added to hotlist.
+    """
+    tags = item.get('tags_array') or []
+    if 'no_notify' in tags:
+        return None
+    notify_level = item.get('notify_level')
+    if notify_level is not None:
+        if PRIORITY_LOW <= notify_level <= PRIORITY_HIGHLIGHT:
+            return notify_level
+        return None
+    # WeeChat < 1.0: no notify level in lines
+    if item.get('highlight'):
+        return PRIORITY_HIGHLIGHT
+    if 'notify_private' in tags:
+        return PRIORITY_PRIVATE
+    if 'irc_privmsg' in tags or 'notify_message' in tags:
+        return PRIORITY_MESSAGE
+    return None
+
+
+class Hotlist(QtCore.QObject):
+    """
+    Hotlist: for each buffer with unread lines, counters of lines by
+    priority (tuple with 4 counters: low, message, private, highlight).
+
+    The signal hotlistChanged is emitted with the pointers of buffers whose
+    counters have changed (only them).
+
+    The buffer read by the user (see set_read) is never in hotlist.
+    """
+
+    hotlistChanged = qt_compat.Signal(object)
+
+    def __init__(self, *args):
+        QtCore.QObject.__init__(*(self,) + args)
+        self._counts = {}
+        self._read = None
+
+    def __contains__(self, pointer):
+        return pointer in self._counts
+
+    def __len__(self):
+        return len(self._counts)
+
+    def pointers(self):
+        """Return pointers of buffers in hotlist."""
+        return list(self._counts)
+
+    def counts(self, pointer):
+        """Return counters of a buffer (EMPTY if not in hotlist)."""
+        return self._counts.get(pointer, EMPTY)
+
+    def set_read(self, pointer):
+        """
+        Set the buffer read by the user (displayed in the active window),
+        None if no buffer is read.
+        """
+        self._read = pointer
+
+    def apply_snapshot(self, counts):
+        """
+        Apply a hotlist received from WeeChat: dict with counters for each
+        buffer pointer.
+        """
+        changed = [pointer for pointer in self._counts
+                   if pointer not in counts]
+        new_counts = {}
+        for pointer, buf_counts in counts.items():
+            buf_counts = tuple(buf_counts)
+            if not any(buf_counts) or pointer == self._read:
+                continue
+            new_counts[pointer] = buf_counts
+            if self._counts.get(pointer) != buf_counts:
+                changed.append(pointer)
+        self._counts = new_counts
+        if changed:
+            self.hotlistChanged.emit(changed)
+
+    def add(self, pointer, priority, count=1):
+        """Add lines with a priority for a buffer (if it is not read)."""
+        if pointer == self._read:
+            return
+        buf_counts = list(self._counts.get(pointer, EMPTY))
+        buf_counts[priority] += count
+        self._counts[pointer] = tuple(buf_counts)
+        self.hotlistChanged.emit([pointer])
+
+    def remove(self, pointer):
+        """Remove a buffer from hotlist (buffer read)."""
+        if pointer in self._counts:
+            del self._counts[pointer]
+            self.hotlistChanged.emit([pointer])
+
+    def clear(self):
+        """Remove all buffers from hotlist."""
+        changed = list(self._counts)
+        self._counts = {}
+        if changed:
+            self.hotlistChanged.emit(changed)
@@ -20,15 +20,22 @@
 # along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import struct
+import collections
+import time
+import traceback
 import qt_compat
 import config
+import weechat.protocol as protocol
+import weechat.capture as capture
+import weechat.handshake as handshake
 
 QtCore = qt_compat.import_module('QtCore')
 QtNetwork = qt_compat.import_module('QtNetwork')
 QtGui = qt_compat.import_module('QtGui')
 
-_PROTO_INIT_CMD = ['init password=%(password)s']
+# without answer to handshake after this delay (in milliseconds), the
+# legacy init is used (WeeChat < 2.9)
+_HANDSHAKE_TIMEOUT = 5000
 
 _PROTO_SYNC_CMDS = [
     '(id) info version',
@@ -47,26 +54,120 @@ _PROTO_SYNC_CMDS = [
     ''
 ]
 
+# hdata decoding: compact items, bulk responses in columns
+_PROTO_HDATA_MODES = {
+    None: protocol.HDATA_COMPACT,
+    'listlines': protocol.HDATA_COLUMNS,
+    'nicklist': protocol.HDATA_COLUMNS,
+    '_nicklist': protocol.HDATA_COLUMNS,
+}
+
+# replay of capture as fast as possible: max data waiting for decoder, and
+# max time (in milliseconds) spent to replay before returning to event loop
+_REPLAY_MAX_PENDING = 16
+_REPLAY_TIME_BUDGET = 50
+
 _PROTO_PING_CMDS = [
+    '(ping) ping',
+
+    ''
+]
+
+# full hotlist, to reconcile the hotlist built from lines received; the
+# pong with argument "hotlist" tells the hotlist has been sent (it is not
+# sent when empty with WeeChat < 1.6)
+_PROTO_HOTLIST_CMDS = [
     '(hotlist) hdata hotlist:gui_hotlist(*) buffer, count',
 
-    '(ping) ping',
+    '(ping) ping hotlist',
 
     ''
 ]
 
 
+class DecoderWorker(QtCore.QObject):
+    """
+    Decoder of data received from WeeChat/relay, living in a worker thread:
+    framing, decompression and decoding are done out of the GUI thread.
+
+    Data and messages are tagged with the connection number: data from a
+    new connection resets the decoder.  Messages decoded from the same
+    data (one read on socket) are emitted together, in a list.
+    """
+
+    messagesDecoded = qt_compat.Signal(object, int)
+    decodeError = qt_compat.Signal(str, int)
+    dataDecoded = qt_compat.Signal(int)
+
+    def __init__(self, *args):
+        QtCore.QObject.__init__(*(self,) + args)
+        self._decoder = protocol.MessageDecoder(
+            hdata_mode=_PROTO_HDATA_MODES)
+        self._connection = None
+
+    def set_keep_data(self, keep):
+        """Keep (or not) raw data of uncompressed messages."""
+        self._decoder.keep_uncompressed = keep
+
+    def set_max_uncompressed(self, size):
+        """Set max size of an uncompressed message (in bytes)."""
+        self._decoder.max_uncompressed = size
+
+    def feed(self, data, connection):
+        """Slot: data received on a connection."""
+        if connection != self._connection:
+            self._decoder.reset()
+            self._connection = connection
+        messages = []
+        error = None
+        try:
+            for message in self._decoder.feed(data):
+                messages.append(message)
+        except protocol.MessageDecodeError as exc:
+            error = exc.details
+        except Exception:
+            error = traceback.format_exc()
+        if error:
+            # the decoder is reset out of the "except" block: the buffer
+            # can not be resized while the traceback has views on it
+            self._decoder.reset()
+        if messages:
+            self.messagesDecoded.emit(messages, connection)
+        if error:
+            self.decodeError.emit(error, connection)
+        self.dataDecoded.emit(connection)
+
+
+class InitWorker(QtCore.QObject):
+    """
+    Builder of the command "init" in a worker thread: the password hash
+    (PBKDF2 with many iterations) would block the GUI for a while.
+    """
+
+    initReady = qt_compat.Signal(object, int, int)
+
+    def build(self, options, password, connection):
+        """Slot: build command init for the options of handshake."""
+        start = time.time()
+        init_cmd = handshake.init_command(options, password)
+        self.initReady.emit(init_cmd, connection,
+                            int((time.time() - start) * 1000))
+
+
 class Network(QtCore.QObject):
     """I/O with WeeChat/relay."""
 
     statusChanged = qt_compat.Signal(str, str)
-    messageFromWeechat = qt_compat.Signal(QtCore.QByteArray)
+    messagesFromWeechat = qt_compat.Signal(object)
+    dataReceived = qt_compat.Signal(object, int)
+    initRequested = qt_compat.Signal(object, object, int)
 
     def __init__(self, *args):
         QtCore.QObject.__init__(*(self,) + args)
         self.status_disconnected = 'disconnected'
         self.status_connecting = 'connecting...'
         self.status_connected = 'connected'
+        self.status_replaying = 'replaying'
         self.server_version = 0
         self._server = None
         self._port = None
@@ -74,15 +175,59 @@ class Network(QtCore.QObject):
         self._password = None
         self._lines = config.CONFIG_DEFAULT_RELAY_LINES
         self._ping = config.CONFIG_DEFAULT_RELAY_PING
+        self._hotlist_interval = config.CONFIG_DEFAULT_RELAY_HOTLIST_INTERVAL
         self._response_qtime = QtCore.QTime()
-        self._buffer = QtCore.QByteArray()
+        # messages are decoded in a worker thread, and received here in
+        # the same order (queued signals)
+        self._connection = 0
+        self._decoder_thread = QtCore.QThread()
+        self._decoder = DecoderWorker()
+        self._decoder.moveToThread(self._decoder_thread)
+        self.dataReceived.connect(self._decoder.feed)
+        self._decoder.messagesDecoded.connect(self._messages_decoded)
+        self._decoder.decodeError.connect(self._decode_error)
+        self._decoder.dataDecoded.connect(self._data_decoded)
+        # the command init is built in the same thread (messages are
+        # received only after init)
+        self._init_worker = InitWorker()
+        self._init_worker.moveToThread(self._decoder_thread)
+        self.initRequested.connect(self._init_worker.build)
+        self._init_worker.initReady.connect(self._init_ready)
+        self._decoder_thread.start()
+        QtGui.QApplication.instance().aboutToQuit.connect(
+            self._stop_decoder)
         self._socket = QtNetwork.QSslSocket()
         self._socket.connected.connect(self._socket_connected)
         self._socket.error.connect(self._socket_error)
         self._socket.readyRead.connect(self._socket_read)
         self._socket.disconnected.connect(self._socket_disconnected)
+        # ping is sent only if nothing was received during the ping delay
+        self._ping_timer = QtCore.QTimer()
+        self._ping_timer.setSingleShot(True)
+        self._ping_timer.timeout.connect(self.ping_weechat)
         self._hotlist_timer = QtCore.QTimer()
-        self._hotlist_timer.timeout.connect(self.ping_weechat)
+        self._hotlist_timer.timeout.connect(self.hotlist_weechat)
+        self._handshake_timer = QtCore.QTimer()
+        self._handshake_timer.setSingleShot(True)
+        self._handshake_timer.timeout.connect(self._handshake_timeout)
+        # time to first message, compression and size of messages, by
+        # connection
+        self._connect_time = QtCore.QElapsedTimer()
+        self._hash_time = 0
+        self._first_message = False
+        self.stats = None
+        self.stats_history = collections.deque(maxlen=10)
+        # capture of data received, replay of a capture file
+        self._capture = None
+        self._capture_time = QtCore.QElapsedTimer()
+        self._replay = None
+        self._replay_records = None
+        self._replay_record = None
+        self._replay_fast = False
+        self._replay_pending = 0
+        self._replay_timer = QtCore.QTimer()
+        self._replay_timer.setSingleShot(True)
+        self._replay_timer.timeout.connect(self._replay_data)
 
     def _reconnect_weechat(self):
         server = self._server
@@ -97,14 +242,48 @@ class Network(QtCore.QObject):
     def _socket_connected(self):
         """Slot: socket connected."""
         self.statusChanged.emit(self.status_connected, None)
+        self._start_capture()
         if self._password:
-            self.send_to_weechat('\n'.join(_PROTO_INIT_CMD + _PROTO_SYNC_CMDS)
-                                 % {'password': str(self._password),
-                                    'lines': self._lines})
-        self._hotlist_timer.start(self._ping * 1000)
+            self._handshake_timer.start(_HANDSHAKE_TIMEOUT)
+            self.send_to_weechat(handshake.handshake_command() + '\n')
+        self._response_qtime.start()
+        self._ping_timer.start(self._ping * 1000)
+
+    def _handshake_received(self, message):
+        """Answer to handshake received: authenticate and sync."""
+        options = {}
+        for obj in message.objects:
+            if obj.objtype == 'htb':
+                options = obj.value
+        self._handshake_timer.stop()
+        self.stats['compression'] = options.get('compression') or 'off'
+        self.initRequested.emit(dict(options), self._password,
+                                self._connection)
+
+    def _init_ready(self, init_cmd, connection, hash_time):
+        """Slot: command init built by the worker thread."""
+        if connection == self._connection and self.is_connected():
+            self._hash_time = hash_time
+            self._init_weechat(init_cmd)
+
+    def _handshake_timeout(self):
+        """Slot: no answer to handshake (WeeChat < 2.9): legacy init."""
+        self.stats['compression'] = 'zlib'
+        self._hash_time = 0
+        self._init_weechat(handshake.legacy_init_command(self._password))
+
+    def _init_weechat(self, init_cmd):
+        """Send init command, then sync with WeeChat."""
+        self._handshake_timer.stop()
+        self._first_message = True
+        self.send_to_weechat('%s\n%s' % (init_cmd,
+                                         '\n'.join(_PROTO_SYNC_CMDS)
+                                         % {'lines': self._lines}))
+        self._start_hotlist_timer()
 
     def _socket_error(self, error):
         """Slot: socket error."""
+        self._ping_timer.stop()
         self._hotlist_timer.stop()
         self.statusChanged.emit(
             self.status_disconnected,
@@ -115,35 +294,165 @@ class Network(QtCore.QObject):
 
     def _socket_read(self):
         """Slot: data available on socket."""
-        data = self._socket.readAll()
-        self._buffer.append(data)
-        while len(self._buffer) >= 4:
-            remainder = None
-            length = struct.unpack('>i', self._buffer[0:4])[0]
-            if len(self._buffer) < length:
-                # partial message, just wait for end of message
-                break
-            # more than one message?
-            if length < len(self._buffer):
-                # save beginning of another message
-                remainder = self._buffer[length:]
-                self._buffer = self._buffer[0:length]
-            self.messageFromWeechat.emit(self._buffer)
-            if not self.is_connected():
-                return
-            self._buffer.clear()
-            if remainder:
-                self._buffer.append(remainder)
+        data = self._socket.readAll().data()
+        if self._capture:
+            self._capture.write(self._capture_time.elapsed() / 1000.0, data)
+        self.dataReceived.emit(data, self._connection)
         self._response_qtime.start()
 
+    def _messages_decoded(self, messages, connection):
+        """Slot: messages decoded by the worker thread (list)."""
+        if connection != self._connection or not (self.is_connected() or
+                                                  self._replay):
+            return
+        for message in messages:
+            if self.stats:
+                self.stats['messages'] += 1
+                self.stats['bytes'] += message.size
+                self.stats['bytes_uncompressed'] += message.size_uncompressed
+            if message.msgid == 'handshake' and \
+               self._handshake_timer.isActive():
+                self._handshake_received(message)
+            elif self._first_message:
+                self._first_message = False
+                self.statusChanged.emit(
+                    self.status_connected,
+                    'First message received %d ms after connection '
+                    '(password hash: %d ms)' % (self._connect_time.elapsed(),
+                                                self._hash_time))
+        self.messagesFromWeechat.emit(messages)
+
+    def _decode_error(self, error, connection):
+        """Slot: error in the worker thread while decoding a message."""
+        if connection == self._connection:
+            print('Error while decoding message from WeeChat:\n%s' % error)
+            self.disconnect_weechat()
+
+    def _data_decoded(self, connection):
+        """Slot: data decoded by the worker thread."""
+        if connection != self._connection or not self._replay:
+            return
+        self._replay_pending -= 1
+        if not self._replay_record:
+            if self._replay_pending <= 0:
+                self.stop_replay()
+        elif self._replay_fast and not self._replay_timer.isActive():
+            self._replay_timer.start(0)
+
+    def _stop_decoder(self):
+        """Stop the worker thread (when the application quits)."""
+        self._decoder_thread.quit()
+        self._decoder_thread.wait()
+
     def _socket_disconnected(self):
         """Slot: socket disconnected."""
         self._server = None
         self._port = None
         self._ssl = None
         self._password = None
+        self._ping_timer.stop()
         self._hotlist_timer.stop()
-        self.statusChanged.emit(self.status_disconnected, None)
+        self._handshake_timer.stop()
+        self._stop_capture()
+        self.statusChanged.emit(self.status_disconnected, self.stats_str())
+
+    def _start_stats(self, compression=None):
+        """Start stats for a new connection."""
+        self.stats = {
+            'compression': compression,
+            'messages': 0,
+            'bytes': 0,
+            'bytes_uncompressed': 0,
+        }
+        self.stats_history.append(self.stats)
+
+    def stats_str(self):
+        """Return stats of current (or last) connection as string."""
+        if not self.stats or not self.stats['messages']:
+            return None
+        saved = 100 - ((self.stats['bytes'] * 100) //
+                       max(1, self.stats['bytes_uncompressed']))
+        return ('Compression: %s, %d messages, %d bytes received '
+                '(%d bytes uncompressed, %d%% saved)'
+                % (self.stats['compression'], self.stats['messages'],
+                   self.stats['bytes'], self.stats['bytes_uncompressed'],
+                   saved))
+
+    def _start_capture(self):
+        """Start capture of data received (if a capture file is set)."""
+        filename = QtGui.QApplication.instance().config.get('relay',
+                                                            'capture_file')
+        if not filename:
+            return
+        try:
+            self._capture = capture.CaptureWriter(filename)
+            self._capture_time.start()
+        except IOError as error:
+            print('Unable to write capture file: %s' % error)
+
+    def _stop_capture(self):
+        """Stop capture of data received."""
+        if self._capture:
+            self._capture.close()
+            self._capture = None
+
+    def replay(self, filename, fast=False):
+        """
+        Replay a capture file: data is decoded and messages are emitted
+        with signal messagesFromWeechat, as if they were received from
+        WeeChat, at recorded speed (or as fast as possible if fast is True).
+        Return True if OK, False if error.
+        """
+        self.disconnect_weechat()
+        try:
+            self._replay = capture.CaptureReader(filename)
+        except (IOError, ValueError) as error:
+            print('Unable to replay capture file: %s' % error)
+            return False
+        self._replay_records = iter(self._replay)
+        self._replay_record = next(self._replay_records, None)
+        self._replay_fast = fast
+        self._replay_pending = 0
+        self._set_max_message_size()
+        self._connection += 1
+        self._start_stats('replay')
+        self.statusChanged.emit(self.status_replaying, None)
+        self._replay_timer.start(0)
+        return True
+
+    def stop_replay(self):
+        """Stop replay of a capture file."""
+        if not self._replay:
+            return
+        self._replay_timer.stop()
+        self._replay_records = None
+        self._replay_record = None
+        self._replay.close()
+        self._replay = None
+        self.statusChanged.emit(self.status_disconnected, self.stats_str())
+
+    def _replay_data(self):
+        """Slot: replay next data of the capture file."""
+        elapsed = QtCore.QElapsedTimer()
+        elapsed.start()
+        while self._replay_record:
+            delay, data = self._replay_record
+            if self._replay_fast:
+                if self._replay_pending >= _REPLAY_MAX_PENDING:
+                    # resumed when data is decoded
+                    return
+                if elapsed.elapsed() >= _REPLAY_TIME_BUDGET:
+                    self._replay_timer.start(0)
+                    return
+            elif delay >= 0.001:
+                self._replay_record = (0, data)
+                self._replay_timer.start(int(delay * 1000))
+                return
+            self._replay_pending += 1
+            self.dataReceived.emit(data, self._connection)
+            self._replay_record = next(self._replay_records, None)
+        if self._replay_pending <= 0:
+            self.stop_replay()
 
     def is_connected(self):
         """Return True if the socket is connected, False otherwise."""
@@ -155,6 +464,7 @@ class Network(QtCore.QObject):
 
     def connect_weechat(self, server, port, ssl, password, lines, ping):
         """Connect to WeeChat."""
+        self.stop_replay()
         self._server = server
         try:
             self._port = int(port)
@@ -174,6 +484,11 @@ class Network(QtCore.QObject):
             return
         if self._socket.state() != QtNetwork.QAbstractSocket.UnconnectedState:
             self._socket.abort()
+        self._set_max_message_size()
+        self._connection += 1
+        self._start_stats()
+        self._first_message = False
+        self._connect_time.start()
         self._socket.connectToHost(self._server, self._port)
         if self._ssl:
             self._socket.ignoreSslErrors()
@@ -182,6 +497,7 @@ class Network(QtCore.QObject):
 
     def disconnect_weechat(self):
         """Disconnect from WeeChat."""
+        self.stop_replay()
         if self._socket.state() == QtNetwork.QAbstractSocket.UnconnectedState:
             return
         if self._socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
@@ -189,6 +505,7 @@ class Network(QtCore.QObject):
             self._socket.waitForBytesWritten(1000)
         else:
             self.statusChanged.emit(self.status_disconnected, None)
+        self._ping_timer.stop()
         self._hotlist_timer.stop()
         self._socket.abort()
 
@@ -205,12 +522,32 @@ class Network(QtCore.QObject):
         self.send_to_weechat('\n'.join(_PROTO_SYNC_CMDS))
 
     def ping_weechat(self):
-        """Ping WeeChat and recieve the hotlist if present."""
-        if (self._response_qtime.elapsed() > (self._ping * 2000) and
+        """
+        Ping WeeChat, if nothing has been received during the ping delay
+        (data received is enough to know the connection is alive).
+        """
+        elapsed = self._response_qtime.elapsed()
+        if elapsed < self._ping * 1000:
+            self._ping_timer.start(self._ping * 1000 - elapsed)
+            return
+        if (elapsed > (self._ping * 2000) and
                 QtGui.QApplication.instance().config.getboolean(
                     'relay', 'autoconnect')):
             self._reconnect_weechat()
+            return
         self.send_to_weechat('\n'.join(_PROTO_PING_CMDS))
+        self._ping_timer.start(self._ping * 1000)
+
+    def hotlist_weechat(self):
+        """Receive the full hotlist (reconciliation)."""
+        self.send_to_weechat('\n'.join(_PROTO_HOTLIST_CMDS))
+
+    def _start_hotlist_timer(self):
+        """Start timer for hotlist reconciliation (if interval is set)."""
+        if self._hotlist_interval > 0:
+            self._hotlist_timer.start(self._hotlist_interval * 1000)
+        else:
+            self._hotlist_timer.stop()
 
     def set_ping(self, ping):
         try:
@@ -218,8 +555,37 @@ class Network(QtCore.QObject):
         except ValueError:
             self._ping = config.CONFIG_DEFAULT_RELAY_PING
         self._response_qtime.start()
-        if self._hotlist_timer.isActive():
-            self._hotlist_timer.start(self._ping * 1000)
+        if self._ping_timer.isActive():
+            self._ping_timer.start(self._ping * 1000)
+
+    def set_hotlist_interval(self, interval):
+        """Set interval (in seconds) between two full hotlists."""
+        try:
+            self._hotlist_interval = int(interval)
+        except ValueError:
+            self._hotlist_interval = \
+                config.CONFIG_DEFAULT_RELAY_HOTLIST_INTERVAL
+        if self.is_connected():
+            self._start_hotlist_timer()
+
+    def set_keep_data(self, keep):
+        """
+        Keep (or not) raw data in messages received (for debug).
+        The flag is read by the decoder thread when the next message is
+        decoded.
+        """
+        self._decoder.set_keep_data(keep)
+
+    def _set_max_message_size(self):
+        """Set max size of uncompressed messages (option in MB)."""
+        try:
+            size = int(QtGui.QApplication.instance().config.get(
+                'relay', 'max_message_size'))
+        except ValueError:
+            size = 0
+        if size <= 0:
+            size = protocol.UNCOMPRESSED_MAX // (1024 * 1024)
+        self._decoder.set_max_uncompressed(size * 1024 * 1024)
 
     def set_info(self, message):
         """Set server info (version)."""
@@ -472,10 +472,15 @@ class PreferencesPaneWidget(QtGui.QWidget):
                             InputLineSpell.list_languages()]
         spellcheck_langs.insert(0, ('', ''))
         focus_opts = ["requested", "always", "never"]
+        chat_views = [
+            ('text', 'Text'),
+            ('list', 'List (long buffers, long lines cut)'),
+        ]
         self.comboboxes = {"style": QtGui.QStyleFactory.keys(),
                            "position": list_positions,
                            "toolbar_icons": toolbar_icons,
                            "focus_new_tabs": focus_opts,
+                           "chat_view": chat_views,
                            "tray_icon": tray_options,
                            "sort": sort_options,
                            "spellcheck_dictionary": spellcheck_langs}
@@ -498,6 +503,11 @@ class PreferencesPaneWidget(QtGui.QWidget):
             edit = PreferencesFileEdit(caption='Select QStyleSheet File',
                                        filter='*.qss')
             edit.insert(value)
+        elif key == "capture_file":
+            edit = PreferencesFileEdit(
+                caption='Select a capture file',
+                filter='Capture Files (*.qwcap)', mode="save")
+            edit.insert(value)
         elif name.lower()[-5:] == "sound":
             edit = PreferencesFileEdit(
                 caption='Select a sound file',
@@ -42,8 +42,11 @@ import weechat.protocol as protocol
 from network import Network
 from notify import NotificationManager
 from connection import ConnectionDialog
-from buffer import BufferSwitchWidget, Buffer
-from debug import DebugDialog
+from buffer import BufferSwitchWidget, Buffer, BufferList
+from debug import DebugDialog, DebugCapture
+from handlers import HandlerRegistry
+from render import RenderScheduler, max_hidden_lines
+import hotlist
 from about import AboutDialog
 from preferences import PreferencesDialog
 from version import qweechat_version
@@ -76,7 +79,7 @@ class MainWindow(QtGui.QMainWindow):
         self.setWindowTitle(NAME)
 
         self.debug_dialog = None
-        self.debug_lines = []
+        self.debug_capture = DebugCapture(DEBUG_NUM_LINES)
 
         self.about_dialog = None
         self.connection_dialog = None
@@ -85,16 +88,27 @@ class MainWindow(QtGui.QMainWindow):
         # network
         self.network = Network()
         self.network.statusChanged.connect(self._network_status_changed)
-        self.network.messageFromWeechat.connect(self._network_weechat_msg)
+        self.network.messagesFromWeechat.connect(self._network_weechat_msgs)
         self._last_msgid = None
+        # lines received in a batch of messages, by buffer
+        self._pending_lines = {}
+        # lines are displayed at most once by display frame
+        self.render_scheduler = RenderScheduler(self)
+
+        # handlers of messages received from WeeChat
+        self.handlers = HandlerRegistry(self)
+        self._register_handlers()
 
         # list of buffers
         self.switch_buffers = BufferSwitchWidget()
         self.switch_buffers.currentItemChanged.connect(self._buffer_switch)
-        self._hotlist = []
+
+        # hotlist
+        self.hotlist = hotlist.Hotlist(self)
+        self.hotlist.hotlistChanged.connect(self._hotlist_changed)
 
         # default buffer
-        self.buffers = [Buffer()]
+        self.buffers = BufferList([Buffer()])
         self.stacked_buffers = QtGui.QStackedWidget()
         self.stacked_buffers.addWidget(self.buffers[0].widget)
 
@@ -122,6 +136,16 @@ class MainWindow(QtGui.QMainWindow):
             'view source': [
                 None, 'View buffer chat source',
                 'Ctrl+Shift+U', self.open_chat_source],
+            'replay capture': [
+                'media-playback-start', 'Replay a capture file',
+                None, lambda: self.open_replay_dialog(fast=False)],
+            'replay capture (fast)': [
+                'media-seek-forward',
+                'Replay a capture file as fast as possible',
+                None, lambda: self.open_replay_dialog(fast=True)],
+            'handlers stats': [
+                None, 'Display stats of message handlers in debug console',
+                None, self.debug_handlers_stats],
             '_reconnect': [
                 None, 'Test Reconnect',
                 None, self.network._reconnect_weechat],
@@ -187,7 +211,10 @@ class MainWindow(QtGui.QMainWindow):
         menu_window = self.menu.addMenu('&Window')
         menu_window.addAction(self.actions['debug'])
         menu_window.addAction(self.actions['view source'])
+        menu_window.addAction(self.actions['handlers stats'])
         menu_window.addAction(self.actions['_reconnect'])
+        menu_window.addAction(self.actions['replay capture'])
+        menu_window.addAction(self.actions['replay capture (fast)'])
         menu_help = self.menu.addMenu('&Help')
         menu_help.addAction(self.actions['about'])
 
@@ -276,6 +303,8 @@ class MainWindow(QtGui.QMainWindow):
         # Update visibility of all nicklists/topics:
         for buffer in self.buffers:
             buffer.update_config()
+        # Debug capture (only if debug is on or debug dialog is open):
+        self.debug_capture_update()
         # Update toggle state for menubar:
         for name, action in list(self.toggles_def.items()):
             if len(action) == 5:
@@ -315,6 +344,8 @@ class MainWindow(QtGui.QMainWindow):
         self.notifier.tint_icons(menu_palette.windowText().color().name())
         if self.network:
             self.network.set_ping(self.config.get('relay', 'ping'))
+            self.network.set_hotlist_interval(
+                self.config.get('relay', 'hotlist_interval'))
 
     def _menu_context(self, event):
         """Show a slightly nicer context menu for the menu/toolbar."""
@@ -350,19 +381,28 @@ class MainWindow(QtGui.QMainWindow):
         if buf_item:
             buf = buf_item.active.buf
             self.stacked_buffers.setCurrentWidget(buf.widget)
+            # display now lines received while the buffer was hidden
+            self.render_scheduler.schedule(0)
             if buf.hot or buf.highlight:
                 self.buffer_hotlist_clear(buf.data["full_name"])
+            self._update_read_buffer()
             buf.widget.input.setFocus()
 
+    def _update_read_buffer(self):
+        """Set the buffer read: current buffer if the window is active."""
+        item = self.switch_buffers.currentItem()
+        buf = item.active.buf if item and item.active else None
+        self.hotlist.set_read(
+            buf.pointer if buf and self.isActiveWindow() else None)
+
     def buffer_hotlist_clear(self, full_name):
         """Set a buffer as read for the hotlist."""
-        buf = self.buffers[self._buffer_index("full_name", full_name)[0]]
+        buf = self.buffers.get_by_full_name(full_name)
+        if not buf:
+            return
         self.notifier.clear_record(full_name)
-        if buf.pointer in self._hotlist:
-            buf.highlight = False
-            buf.hot = 0
-            self._hotlist.remove(buf.pointer)
-            self.switch_buffers.update_hot_buffers()
+        buf.highlight = False
+        self.hotlist.remove(buf.pointer)
         if self.network.server_version >= 1:
             self.buffer_input(full_name, '/buffer set hotlist -1')
             self.buffer_input(full_name, '/input set_unread_current_buffer')
@@ -377,7 +417,7 @@ class MainWindow(QtGui.QMainWindow):
                 self.requested_buffer_names.add(nick)
             message = 'input %s %s\n' % (full_name, text)
             self.network.send_to_weechat(message)
-            self.debug_display(0, '<==', message, forcecolor='#AA0000')
+            self.debug_display('<==', message, forcecolor='#AA0000')
 
     def open_preferences_dialog(self):
         """Open a dialog with preferences."""
@@ -390,12 +430,22 @@ class MainWindow(QtGui.QMainWindow):
             for option in options.keys():
                 self.config.set('relay', option, options[option])
 
-    def debug_display(self, *args, **kwargs):
+    def debug_display(self, prefix, text, forcecolor=None):
         """Display a debug message."""
-        self.debug_lines.append((args, kwargs))
-        self.debug_lines = self.debug_lines[-DEBUG_NUM_LINES:]
-        if self.debug_dialog:
-            self.debug_dialog.chat.display(*args, **kwargs)
+        self.debug_add(DebugCapture.format_text, prefix, text, forcecolor)
+
+    def debug_add(self, formatter, *args):
+        """Add a debug entry (formatted only if it is displayed)."""
+        entry = self.debug_capture.add(formatter, *args)
+        if entry and self.debug_dialog:
+            self.debug_dialog.display_entries([entry])
+
+    def debug_capture_update(self):
+        """Enable debug capture if debug is on or debug dialog is open."""
+        enabled = bool(self.debug_dialog or
+                       self.config.getboolean('look', 'debug'))
+        self.debug_capture.enabled = enabled
+        self.network.set_keep_data(enabled)
 
     def open_debug_dialog(self):
         """Open a dialog with debug messages."""
@@ -404,8 +454,9 @@ class MainWindow(QtGui.QMainWindow):
             self.debug_dialog.input.textSent.connect(
                 self.debug_input_text_sent)
             self.debug_dialog.finished.connect(self._debug_dialog_closed)
-            self.debug_dialog.display_lines(self.debug_lines)
+            self.debug_dialog.display_entries(self.debug_capture.entries)
             self.debug_dialog.chat.scroll_bottom()
+            self.debug_capture_update()
 
     def debug_input_text_sent(self, text):
         """Send debug buffer input to WeeChat."""
@@ -416,12 +467,13 @@ class MainWindow(QtGui.QMainWindow):
                 text = '(debug_%s)%s' % (text[1:pos], text[pos+1:])
             else:
                 text = '(debug) %s' % text
-            self.debug_display(0, '<==', text, forcecolor='#AA0000')
+            self.debug_display('<==', text, forcecolor='#AA0000')
             self.network.send_to_weechat(text + '\n')
 
     def _debug_dialog_closed(self, result):
         """Called when debug dialog is closed."""
         self.debug_dialog = None
+        self.debug_capture_update()
 
     def open_chat_source(self):
         """Open a dialog with chat buffer source."""
@@ -433,6 +485,16 @@ class MainWindow(QtGui.QMainWindow):
             source_dialog.chat.setFocusPolicy(QtCore.Qt.WheelFocus)
             source_dialog.setWindowTitle(buf.data['full_name'])
 
+    def open_replay_dialog(self, fast=False):
+        """Open a dialog to select a capture file to replay."""
+        filename = QtGui.QFileDialog.getOpenFileName(
+            self, 'Replay a capture file', '',
+            'Capture Files (*.qwcap);;All Files (*)')
+        if isinstance(filename, tuple):
+            filename = filename[0]
+        if filename:
+            self.network.replay(str(filename), fast=fast)
+
     def open_about_dialog(self):
         """Open a dialog with info about QWeeChat."""
         messages = ['<b>%s</b> %s' % (NAME, qweechat_version()),
@@ -487,8 +549,10 @@ class MainWindow(QtGui.QMainWindow):
     def _network_status_changed(self, status, extra):
         """Called when the network status has changed."""
         if self.config.getboolean('look', 'statusbar'):
-            self.statusBar().showMessage(status)
-        self.debug_display(0, '', status, forcecolor='#0000AA')
+            self.statusBar().showMessage(extra or status)
+        self.debug_display('', status, forcecolor='#0000AA')
+        if extra:
+            self.debug_display('', extra, forcecolor='#0000AA')
         self.network_status_set(status)
         self.notifier.set_icon(status)
 
@@ -515,29 +579,31 @@ class MainWindow(QtGui.QMainWindow):
             self.actions['connect'].setEnabled(False)
             self.actions['disconnect'].setEnabled(True)
 
-    def _network_weechat_msg(self, message):
-        """Called when a message is received from WeeChat."""
-        self.debug_display(0, '==>',
-                           'message (%d bytes):\n%s'
-                           % (len(message),
-                              protocol.hex_and_ascii(message, 20)),
-                           forcecolor='#008800')
+    def _network_weechat_msgs(self, messages):
+        """
+        Called when messages are received from WeeChat (all messages
+        decoded from one read on socket): lines are displayed after all
+        messages have been parsed, once by buffer.
+        """
         try:
-            proto = protocol.Protocol()
-            message = proto.decode(str(message))
-            if message.uncompressed:
-                self.debug_display(
-                    0, '==>',
-                    'message uncompressed (%d bytes):\n%s'
-                    % (message.size_uncompressed,
-                       protocol.hex_and_ascii(message.uncompressed, 20)),
-                    forcecolor='#008800')
-            self.debug_display(0, '', 'Message: %s' % message)
-            self.parse_message(message)
+            for message in messages:
+                self.debug_add(DebugCapture.format_message, message)
+                self.parse_message(message)
         except:
-            print('Error while decoding message from WeeChat:\n%s'
+            print('Error while parsing message from WeeChat:\n%s'
                   % traceback.format_exc())
             self.network.disconnect_weechat()
+        self._display_pending_lines()
+
+    def _display_pending_lines(self):
+        """Schedule display of lines received in the last batch."""
+        pending_lines, self._pending_lines = self._pending_lines, {}
+        # lines queued for a hidden buffer are kept until it is shown, up
+        # to an optional limit (no limit by default)
+        max_hidden = max_hidden_lines(
+            self.config.get('buffers', 'hidden_max_lines'))
+        for buf, lines in pending_lines.items():
+            self.render_scheduler.queue(buf, lines, max_hidden)
 
     def _parse_listbuffers(self, message):
         """Parse a WeeChat with list of buffers."""
@@ -550,7 +616,7 @@ class MainWindow(QtGui.QMainWindow):
             self.switch_buffers.clear()
             for buf in self.buffers:  # Attempt to preserve buffer input:
                 prior_bufs[buf.pointer] = buf
-            self.buffers = []
+            self.buffers.clear()
             for item in obj.value['items']:
                 buf = self.create_buffer(item)
                 if buf.pointer in prior_bufs:
@@ -558,6 +624,7 @@ class MainWindow(QtGui.QMainWindow):
                     buf.widget.input.copy_history(pinput)
                 self.insert_buffer(len(self.buffers), buf)
             for prior_ptr, prior_buf in prior_bufs.items():
+                self.render_scheduler.discard(prior_buf)
                 self.stacked_buffers.removeWidget(prior_buf.widget)
             self.switch_buffers.renumber(True)
             self.switch_buffers.set_current_buffer(ptr)
@@ -569,24 +636,23 @@ class MainWindow(QtGui.QMainWindow):
             lines = []
             if obj.objtype != 'hda' or obj.value['path'][-1] != 'line_data':
                 continue
+            if 'columns' in obj.value:
+                self._parse_line_columns(obj.value['columns'])
+                continue
             for item in obj.value['items']:
                 if message.msgid == 'listlines':
                     ptrbuf = item['__path'][0]
                 else:
                     ptrbuf = item['buffer']
-                index = self._buffer_index("pointer", ptrbuf)
-                if index:
-                    buf = self.buffers[index[0]]
-                    if 'tags_array' in item and item['tags_array']:
-                        if 'notify_private' in item['tags_array']:
-                            pass
-                        elif 'notify_message' in item['tags_array']:
-                            pass
-                        if 'no_notify' not in item['tags_array']:
-                            if "irc_privmsg" in item['tags_array']:
-                                buf.hot += 1
-                                self._hotlist.append(ptrbuf)
-                            # TODO: Colors for irc_join and irc_quit
+                buf = self.buffers.get(ptrbuf)
+                if buf:
+                    priority = None
+                    if message.msgid != 'listlines':
+                        # lines of listlines are in the hotlist received
+                        # after them
+                        priority = hotlist.line_priority(item)
+                        if priority is not None:
+                            self.hotlist.add(ptrbuf, priority)
                     if 'highlight' in item and item['highlight'] > 0:
                         buf.highlight = True
                         color = self.config.get('color', 'chat_highlight')
@@ -594,40 +660,66 @@ class MainWindow(QtGui.QMainWindow):
                         buf.highlight = False
                         color = None
                     lines.append(
-                        (index[0],
+                        (buf,
                          (item['date'], item['prefix'],
                           item['message'], color))
                     )
-                    send_notice = (buf.hot > 0 or buf.highlight or buf.flag())
+                    send_notice = (
+                        (priority is not None and
+                         priority >= hotlist.PRIORITY_MESSAGE) or
+                        buf.highlight or buf.flag())
                     if message.msgid != 'listlines' and send_notice:
                         self.notifier.parse_buffer(buf, lines)
             if message.msgid == 'listlines':
                 lines.reverse()
-            for line in lines:
-                self.buffers[line[0]].widget.chat.display(*line[1])
-            self.switch_buffers.update_hot_buffers()
+            for buf, line in lines:
+                self._pending_lines.setdefault(buf, []).append(line)
+
+    def _parse_line_columns(self, columns):
+        """Parse lines of buffers decoded in columns (listlines)."""
+        color_highlight = self.config.get('color', 'chat_highlight')
+        dates = columns['date']
+        prefixes = columns['prefix']
+        messages = columns['message']
+        highlights = columns.get('highlight')
+        rows = protocol.hdata_rows_by_pointer(columns)
+        for ptrbuf, indexes in rows.items():
+            buf = self.buffers.get(ptrbuf)
+            if not buf:
+                continue
+            # lines are received from the last one to the first one
+            pending_lines = self._pending_lines.setdefault(buf, [])
+            for i in reversed(indexes):
+                highlight = highlights is not None and highlights[i] > 0
+                pending_lines.append(
+                    (dates[i], prefixes[i], messages[i],
+                     color_highlight if highlight else None))
+            buf.highlight = (highlights is not None and
+                             highlights[indexes[-1]] > 0)
 
     def _parse_hotlist(self, message):
         """Parse a WeeChat message with a hotlist update."""
-        for buf in self.buffers:
-            buf.hot = 0
-        hotlist = []
+        counts = {}
         for obj in message.objects:
             if obj.objtype != 'hda' or obj.value['path'][-1] != 'hotlist':
                 continue
             for item in obj.value['items']:
-                index = self._buffer_index("pointer", item['buffer'])
-                if not index:
-                    continue
-                self.buffers[index[0]].hot += 1
-                hotlist.append(item['buffer'])
-        if hotlist != self._hotlist:
-            for ptr in set(self._hotlist) - set(hotlist):
-                index = self._buffer_index("pointer", ptr)
-                full_name = self.buffers[index[0]].data["full_name"]
-                self.notifier.clear_record(full_name)
-            self.switch_buffers.update_hot_buffers()
-            self._hotlist = hotlist
+                counts[item['buffer']] = item.get('count') or \
+                    (0, 1, 0, 0)
+        self.hotlist.apply_snapshot(counts)
+
+    def _hotlist_changed(self, pointers):
+        """Called when the hotlist of some buffers has changed."""
+        bufs = []
+        for pointer in pointers:
+            buf = self.buffers.get(pointer)
+            if not buf:
+                continue
+            buf.hotlist = self.hotlist.counts(pointer)
+            if pointer not in self.hotlist:
+                self.notifier.clear_record(buf.data["full_name"])
+            bufs.append(buf)
+        self.switch_buffers.update_hot_buffers(bufs)
 
     def _parse_nicklist(self, message):
         """Parse a WeeChat message with a buffer nicklist."""
@@ -636,20 +728,49 @@ class MainWindow(QtGui.QMainWindow):
             if obj.objtype != 'hda' or \
                obj.value['path'][-1] != 'nicklist_item':
                 continue
+            if 'columns' in obj.value:
+                buffer_refresh.update(
+                    self._parse_nicklist_columns(obj.value['columns']))
+                continue
             group = '__root'
             for item in obj.value['items']:
-                index = self._buffer_index("pointer", item['__path'][0])
-                if index:
-                    if not index[0] in buffer_refresh:
-                        self.buffers[index[0]].nicklist = {}
-                    buffer_refresh[index[0]] = True
+                buf = self.buffers.get(item['__path'][0])
+                if buf:
+                    if buf not in buffer_refresh:
+                        buf.nicklist = {}
+                    buffer_refresh[buf] = True
                     if item['group']:
                         group = item['name']
-                    self.buffers[index[0]].nicklist_add_item(
+                    buf.nicklist_add_item(
                         group, item['group'], item['prefix'], item['name'],
                         item['visible'])
-        for index in buffer_refresh:
-            self.buffers[index].nicklist_refresh()
+        for buf in buffer_refresh:
+            buf.nicklist_refresh()
+
+    def _parse_nicklist_columns(self, columns):
+        """
+        Parse nicklist items decoded in columns, return the buffers with a
+        new nicklist.
+        """
+        buffer_refresh = {}
+        groups = columns['group']
+        prefixes = columns['prefix']
+        names = columns['name']
+        visibles = columns['visible']
+        rows = protocol.hdata_rows_by_pointer(columns)
+        for ptrbuf, indexes in rows.items():
+            buf = self.buffers.get(ptrbuf)
+            if not buf:
+                continue
+            buf.nicklist = {}
+            buffer_refresh[buf] = True
+            group = '__root'
+            for i in indexes:
+                if groups[i]:
+                    group = names[i]
+                buf.nicklist_add_item(group, groups[i], prefixes[i],
+                                      names[i], visibles[i])
+        return buffer_refresh
 
     def _parse_nicklist_diff(self, message):
         """Parse a WeeChat message with a buffer nicklist diff."""
@@ -660,25 +781,25 @@ class MainWindow(QtGui.QMainWindow):
                 continue
             group = '__root'
             for item in obj.value['items']:
-                index = self._buffer_index("pointer", item['__path'][0])
-                if not index:
+                buf = self.buffers.get(item['__path'][0])
+                if not buf:
                     continue
-                buffer_refresh[index[0]] = True
+                buffer_refresh[buf] = True
                 if item['_diff'] == ord('^'):
                     group = item['name']
                 elif item['_diff'] == ord('+'):
-                    self.buffers[index[0]].nicklist_add_item(
+                    buf.nicklist_add_item(
                         group, item['group'], item['prefix'], item['name'],
                         item['visible'])
                 elif item['_diff'] == ord('-'):
-                    self.buffers[index[0]].nicklist_remove_item(
+                    buf.nicklist_remove_item(
                         group, item['group'], item['name'])
                 elif item['_diff'] == ord('*'):
-                    self.buffers[index[0]].nicklist_update_item(
+                    buf.nicklist_update_item(
                         group, item['group'], item['prefix'], item['name'],
                         item['visible'])
-        for index in buffer_refresh:
-            self.buffers[index].nicklist_refresh()
+        for buf in buffer_refresh:
+            buf.nicklist_refresh()
 
     def _parse_buffer_opened(self, message):
         """Parse a WeeChat message with a new buffer (opened)."""
@@ -688,7 +809,7 @@ class MainWindow(QtGui.QMainWindow):
                 continue
             for item in obj.value['items']:
                 buf = self.create_buffer(item)
-                index = self.find_buffer_index_for_insert(item['next_buffer'])
+                index = self.buffers.index_for_insert(item['next_buffer'])
                 self.insert_buffer(index, buf)
                 name = buf.data['full_name']
                 if name in self.requested_buffer_names:
@@ -698,44 +819,64 @@ class MainWindow(QtGui.QMainWindow):
                 if focus_new_tabs == "always":
                     self.switch_buffers.set_current_buffer(buf)
 
-    def _parse_buffer(self, message):
-        """Parse a WeeChat message with a buffer event
-        (anything except a new buffer).
+    def _buffer_items(self, message):
+        """
+        Yield (buffer, item) for the buffers in a WeeChat message with a
+        buffer event (anything except a new buffer).
         """
         for obj in message.objects:
             if obj.objtype != 'hda' or obj.value['path'][-1] != 'buffer':
                 continue
             for item in obj.value['items']:
-                index = self._buffer_index("pointer", item['__path'][0])
-                if not index:
-                    continue
-                index = index[0]
-                if message.msgid == '_buffer_type_changed':
-                    self.buffers[index].data['type'] = item['type']
-                elif message.msgid in ('_buffer_moved', '_buffer_merged',
-                                       '_buffer_unmerged'):
-                    buf = self.buffers[index]
-                    self._buffer_reorder_from_msg(buf, item, message.msgid)
-                    self.remove_buffer(index)
-                    index2 = self.find_buffer_index_for_insert(
-                        item['next_buffer'])
-                    self.insert_buffer(index2, buf)
-                elif message.msgid == '_buffer_renamed':
-                    self.buffers[index].data['full_name'] = item['full_name']
-                    self.buffers[index].data['short_name'] = item['short_name']
-                elif message.msgid == '_buffer_title_changed':
-                    self.buffers[index].data['title'] = item['title']
-                    self.buffers[index].update_title()
-                elif message.msgid == '_buffer_cleared':
-                    self.buffers[index].widget.chat.clear()
-                elif message.msgid.startswith('_buffer_localvar_'):
-                    self.buffers[index].data['local_variables'] = \
-                        item['local_variables']
-                    self.buffers[index].update_prompt()
-                elif message.msgid == '_buffer_closing':
-                    buf = self.buffers[index]
-                    self._buffer_reorder_from_msg(buf, item, message.msgid)
-                    self.remove_buffer(index)
+                buf = self.buffers.get(item['__path'][0])
+                if buf:
+                    yield buf, item
+
+    def _parse_buffer_type_changed(self, message):
+        """Parse a WeeChat message with a buffer type changed."""
+        for buf, item in self._buffer_items(message):
+            buf.data['type'] = item['type']
+
+    def _parse_buffer_moved(self, message):
+        """Parse a WeeChat message with a buffer moved/merged/unmerged."""
+        for buf, item in self._buffer_items(message):
+            self._buffer_reorder_from_msg(buf, item, message.msgid)
+            self.buffers.remove(buf)
+            self.buffers.insert(
+                self.buffers.index_for_insert(item['next_buffer']), buf)
+            self.switch_buffers.move(buf)
+
+    def _parse_buffer_renamed(self, message):
+        """Parse a WeeChat message with a buffer renamed."""
+        for buf, item in self._buffer_items(message):
+            self.buffers.rename(buf, item['full_name'], item['short_name'])
+            self.switch_buffers.update_buffer(buf)
+
+    def _parse_buffer_title_changed(self, message):
+        """Parse a WeeChat message with a buffer title changed."""
+        for buf, item in self._buffer_items(message):
+            buf.data['title'] = item['title']
+            buf.update_title()
+
+    def _parse_buffer_cleared(self, message):
+        """Parse a WeeChat message with a buffer cleared."""
+        for buf, item in self._buffer_items(message):
+            self._pending_lines.pop(buf, None)
+            self.render_scheduler.discard(buf)
+            buf.widget.chat.clear()
+
+    def _parse_buffer_localvar(self, message):
+        """Parse a WeeChat message with buffer local variables changed."""
+        for buf, item in self._buffer_items(message):
+            buf.data['local_variables'] = item['local_variables']
+            buf.update_prompt()
+            self.switch_buffers.update_buffer(buf)
+
+    def _parse_buffer_closing(self, message):
+        """Parse a WeeChat message with a buffer closing."""
+        for buf, item in self._buffer_items(message):
+            self._buffer_reorder_from_msg(buf, item, message.msgid)
+            self.remove_buffer(buf)
 
     def _buffer_reorder_from_msg(self, buf, item, msgid):
         """Reorder all the buffer numbers in response to an action."""
@@ -759,42 +900,76 @@ class MainWindow(QtGui.QMainWindow):
                 elif msgid == '_buffer_moved':
                     renumber_queue.append((b, None, item['number']))
         for b, mod, rep in renumber_queue:
-            b.data['number'] = rep if rep else (b.data['number'] + mod)
-        buf.data['number'] = item['number'] if 'number' in item else 0
+            self.buffers.set_number(
+                b, rep if rep else (b.data['number'] + mod))
+        self.buffers.set_number(buf,
+                                item['number'] if 'number' in item else 0)
+        for b in set([b for b, mod, rep in renumber_queue] + [buf]):
+            self.switch_buffers.update_buffer(b)
+
+    def _parse_debug(self, message):
+        """Parse a WeeChat message sent from debug console."""
+        self.debug_display('', '(debug message, ignored)')
+
+    def _parse_pong(self, message):
+        """Parse a WeeChat message with a pong."""
+        # Workaround for "hotlist" not being sent when empty before 1.6
+        if message.objects and message.objects[0].value == 'hotlist' and \
+           self._last_msgid != "hotlist":
+            self._parse_hotlist(message)
+
+    def _register_handlers(self):
+        """Register handlers of WeeChat messages."""
+        handlers = (
+            ('listbuffers', self._parse_listbuffers),
+            ('listlines', self._parse_line),
+            ('_buffer_line_added', self._parse_line),
+            ('nicklist', self._parse_nicklist),
+            ('_nicklist', self._parse_nicklist),
+            ('_nicklist_diff', self._parse_nicklist_diff),
+            ('_buffer_opened', self._parse_buffer_opened),
+            ('_buffer_type_changed', self._parse_buffer_type_changed),
+            ('_buffer_moved', self._parse_buffer_moved),
+            ('_buffer_merged', self._parse_buffer_moved),
+            ('_buffer_unmerged', self._parse_buffer_moved),
+            ('_buffer_renamed', self._parse_buffer_renamed),
+            ('_buffer_title_changed', self._parse_buffer_title_changed),
+            ('_buffer_cleared', self._parse_buffer_cleared),
+            ('_buffer_closing', self._parse_buffer_closing),
+            ('_upgrade', lambda message: self.network.desync_weechat()),
+            ('_upgrade_ended', lambda message: self.network.sync_weechat()),
+            ('hotlist', self._parse_hotlist),
+            ('_pong', self._parse_pong),
+            ('id', self.network.set_info),
+        )
+        for msgid, callback in handlers:
+            self.handlers.register(msgid, callback, name=msgid)
+        self.handlers.register('debug', self._parse_debug, prefix=True,
+                               name='debug*')
+        self.handlers.register('_buffer_localvar_',
+                               self._parse_buffer_localvar, prefix=True,
+                               name='_buffer_localvar_*')
 
     def parse_message(self, message):
         """Parse a WeeChat message."""
-        if message.msgid.startswith('debug'):
-            self.debug_display(0, '', '(debug message, ignored)')
-        elif message.msgid == 'listbuffers':
-            self._parse_listbuffers(message)
-        elif message.msgid in ('listlines', '_buffer_line_added'):
-            self._parse_line(message)
-        elif message.msgid in ('_nicklist', 'nicklist'):
-            self._parse_nicklist(message)
-        elif message.msgid == '_nicklist_diff':
-            self._parse_nicklist_diff(message)
-        elif message.msgid == '_buffer_opened':
-            self._parse_buffer_opened(message)
-        elif message.msgid.startswith('_buffer_'):
-            self._parse_buffer(message)
-        elif message.msgid == '_upgrade':
-            self.network.desync_weechat()
-        elif message.msgid == '_upgrade_ended':
-            self.network.sync_weechat()
-        elif message.msgid == 'hotlist':
-            self._parse_hotlist(message)
-        elif message.msgid == '_pong':
-            # Workaround for "hotlist" not being sent when empty before 1.6
-            if self._last_msgid != "hotlist":
-                self._parse_hotlist(message)
-        elif message.msgid == 'id':
-            self.network.set_info(message)
+        self.handlers.dispatch(message)
         self._last_msgid = message.msgid
 
+    def debug_handlers_stats(self):
+        """Display stats of message handlers in debug console."""
+        self.open_debug_dialog()
+        self.debug_display('', 'Message handlers: %s'
+                           % (', '.join('%s: %d calls, %.1f ms'
+                                        % (name, calls, elapsed * 1000)
+                                        for name, calls, elapsed
+                                        in self.handlers.stats()) or
+                              'no calls'),
+                           forcecolor='#0000AA')
+
     def create_buffer(self, item):
         """Create a new buffer."""
         buf = Buffer(item)
+        buf.hotlist = self.hotlist.counts(buf.pointer)
         buf.bufferInput.connect(self.buffer_input)
         buf.widget.input.bufferSwitchPrev.connect(
             self.switch_buffers.switch_prev_buffer)
@@ -812,37 +987,24 @@ class MainWindow(QtGui.QMainWindow):
         self.stacked_buffers.insertWidget(index, buf.widget)
         self.switch_buffers.insert(index, buf)
 
-    def remove_buffer(self, index):
+    def remove_buffer(self, buf):
         """Remove a buffer."""
-        self.switch_buffers.take(self.buffers[index])
-        self.stacked_buffers.removeWidget(self.stacked_buffers.widget(index))
-        self.buffers.pop(index)
-
-    def find_buffer_index_for_insert(self, next_buffer):
-        """Find position to insert a buffer in list."""
-        index = -1
-        if next_buffer == '0x0':
-            index = len(self.buffers)
-        else:
-            index = self._buffer_index("pointer", next_buffer)
-            if index:
-                index = index[0]
-        if index < 0:
-            print('Warning: unable to find position for buffer, using end of '
-                  'list by default')
-            index = len(self.buffers)
-        return index
-
-    def _buffer_index(self, key, value):
-        if key == "pointer":
-            l = [i for i, b in enumerate(self.buffers) if b.pointer == value]
-        else:
-            l = [i for i, b in enumerate(self.buffers) if b.data[key] == value]
-        return l
+        self.switch_buffers.take(buf)
+        self.render_scheduler.discard(buf)
+        self.stacked_buffers.removeWidget(buf.widget)
+        self.buffers.remove(buf)
 
     def changeEvent(self, event):
         """Called when QWeeChat window state is changed."""
         QtGui.QMainWindow.changeEvent(self, event)
+        if event.type() == QtCore.QEvent.ActivationChange:
+            # current buffer is read when the window is activated
+            item = self.switch_buffers.currentItem()
+            buf = item.active.buf if item and item.active else None
+            if (self.isActiveWindow() and buf and
+                    buf.pointer in self.hotlist):
+                self.buffer_hotlist_clear(buf.data["full_name"])
+            self._update_read_buffer()
         if (self.config.getboolean("notifications", "minimize_to_tray") and
                 event.type() == QtCore.QEvent.WindowStateChange and
                 self.isMinimized()):
@@ -852,6 +1014,7 @@ class MainWindow(QtGui.QMainWindow):
 
     def showEvent(self, event):
         self.notifier.update(event)
+        self.render_scheduler.schedule(0)
         QtGui.QMainWindow.showEvent(self, event)
 
     def closeEvent(self, event):
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# render.py - scheduler for display of lines in buffers
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+import qt_compat
+
+QtCore = qt_compat.import_module('QtCore')
+
+# delay between two displays (one display frame) and max time spent to
+# display lines in one frame (in milliseconds)
+FRAME_INTERVAL = 16
+FRAME_BUDGET = 10
+
+# number of lines displayed between two checks of time spent
+_LINES_CHUNK = 20
+
+
+def max_hidden_lines(value):
+    """
+    Return max number of lines kept for a buffer not visible, from option
+    buffers.hidden_max_lines: None (no limit) if it is 0, empty or invalid.
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def skipped_line(count, date):
+    """Return the line displayed in place of lines skipped."""
+    return (date, '--',
+            '%d line%s skipped' % (count, 's' if count > 1 else ''), None)
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    Scheduler for display of lines: lines are queued by buffer and
+    displayed at most once by display frame, for a limited time (lines
+    left are displayed in next frames).  Lines of buffers not visible are
+    kept until the buffer is visible (call schedule when it is shown); if
+    a max number of lines by buffer is set, older lines are skipped and a
+    line with the number of lines skipped is displayed instead.
+    """
+
+    def __init__(self, *args):
+        QtCore.QObject.__init__(*(self,) + args)
+        self._pending = collections.OrderedDict()
+        self._skipped = {}
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._elapsed = QtCore.QElapsedTimer()
+
+    def queue(self, buf, lines, max_hidden=None):
+        """
+        Queue lines for a buffer: list of (date, prefix, message, color).
+
+        If max_hidden is set and the buffer is not visible, only the last
+        max_hidden lines queued for the buffer are kept (older lines are
+        skipped).  Lines of a visible buffer are never skipped.
+        """
+        if not lines:
+            return
+        pending = self._pending.get(buf)
+        if pending is None:
+            pending = collections.deque()
+            self._pending[buf] = pending
+        pending.extend(lines)
+        if (max_hidden and len(pending) > max_hidden and
+                not buf.widget.isVisible()):
+            count = len(pending) - max_hidden
+            for _ in xrange(count):
+                pending.popleft()
+            self._skipped[buf] = self._skipped.get(buf, 0) + count
+        self.schedule()
+
+    def schedule(self, delay=FRAME_INTERVAL):
+        """Display lines of visible buffers after a delay (in ms)."""
+        if self._pending and not self._timer.isActive():
+            self._timer.start(delay)
+
+    def discard(self, buf):
+        """Discard lines queued for a buffer (buffer cleared or closed)."""
+        self._pending.pop(buf, None)
+        self._skipped.pop(buf, None)
+
+    def pending(self, buf):
+        """Return number of lines queued for a buffer."""
+        return len(self._pending.get(buf, ()))
+
+    def skipped(self, buf):
+        """Return number of lines skipped for a buffer (not displayed)."""
+        return self._skipped.get(buf, 0)
+
+    def flush(self):
+        """Slot: display lines of visible buffers (in the time budget)."""
+        self._elapsed.start()
+        for buf in [buf for buf in self._pending if buf.widget.isVisible()]:
+            lines = self._pending[buf]
+            skipped = self._skipped.pop(buf, 0)
+            if skipped:
+                buf.display_lines([skipped_line(skipped, lines[0][0])])
+            while lines and self._elapsed.elapsed() < FRAME_BUDGET:
+                buf.display_lines(
+                    [lines.popleft()
+                     for _ in range(min(_LINES_CHUNK, len(lines)))])
+            if not lines:
+                del self._pending[buf]
+            if self._elapsed.elapsed() >= FRAME_BUDGET:
+                break
+        if any(buf.widget.isVisible() for buf in self._pending):
+            self._timer.start(FRAME_INTERVAL)
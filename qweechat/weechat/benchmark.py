@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark.py - benchmark of WeeChat/relay protocol decoder
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Command-line program for benchmarking the WeeChat/relay protocol decoder
+with synthetic messages (as sent by relay).
+"""
+
+from __future__ import print_function
+
+import argparse
+import array
+import gc
+import json
+import os
+import random
+import sys
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import protocol  # WeeChat/relay protocol
+import encoder
+from .. version import qweechat_version
+
+NAME = 'qweechat-benchmark'
+
+HDATA_MODES = (protocol.HDATA_ITEMS, protocol.HDATA_LAZY,
+               protocol.HDATA_COLUMNS, protocol.HDATA_COMPACT)
+
+NICKS = ['alice', 'bob', 'carol', 'dave', 'eve', 'mallory', 'oscar',
+         'peggy', 'trent', 'victor', 'walter', 'FlashCode']
+
+WORDS = ['hello', 'world', 'weechat', 'relay', 'qt', 'python', 'the', 'a',
+         'is', 'to', 'of', 'and', 'buffer', 'nicklist', 'message', 'lol',
+         'https://weechat.org/', 'http://example.com/some/path?q=1']
+
+
+# ================================================================ corpora
+
+def _hda(path, keys, items):
+    """
+    Return a hdata object: keys is a list of (name, type), items a list of
+    (pointers, values).
+    """
+    names = [name for name, _ in keys]
+    return ('hda', {
+        'path': path,
+        'keys': keys,
+        'items': [dict(zip(names, values), __path=pointers)
+                  for pointers, values in items],
+    })
+
+
+def _text(rnd, count):
+    """Return random text, sometimes with colors."""
+    words = [rnd.choice(WORDS) for _ in range(count)]
+    if rnd.random() < 0.2:
+        pos = rnd.randrange(count)
+        words[pos] = '\x19F%02d%s\x1c' % (rnd.randrange(16), words[pos])
+    return ' '.join(words)
+
+
+def corpus_listbuffers(rnd, count):
+    """Return (messages, number of items) with a list of buffers."""
+    keys = [('number', 'int'), ('full_name', 'str'), ('short_name', 'str'),
+            ('type', 'int'), ('nicklist', 'int'), ('title', 'str'),
+            ('local_variables', 'htb'), ('notify', 'int'),
+            ('hidden', 'int'), ('highlight', 'int')]
+    items = []
+    for i in range(count):
+        name = '#chan%d' % i
+        items.append((
+            [0x1000 + i],
+            [i + 1, 'irc.server%d.%s' % (i % 4, name), name, 0, 1,
+             _text(rnd, 8),
+             ('str', 'str', [('plugin', 'irc'), ('type', 'channel'),
+                             ('server', 'server%d' % (i % 4)),
+                             ('channel', name), ('nick', 'me')]),
+             3, 0, 0]))
+    return [('listbuffers', [_hda('buffer', keys, items)])], count
+
+
+def corpus_buffer_line_added(rnd, count, buffers=100):
+    """
+    Return (messages, number of items) with lines added in buffers: one
+    message (with a hdata of one item) by line.
+    """
+    keys = [('buffer', 'ptr'), ('date', 'tim'), ('date_printed', 'tim'),
+            ('displayed', 'chr'), ('notify_level', 'chr'),
+            ('highlight', 'chr'), ('tags_array', 'arr'), ('prefix', 'str'),
+            ('message', 'str')]
+    messages = []
+    for i in range(count):
+        nick = rnd.choice(NICKS)
+        items = [([0x100000 + i],
+                  [0x1000 + i % buffers, 1500000000 + i, 1500000000 + i, 1,
+                   1, 1 if rnd.random() < 0.01 else 0,
+                   ('str', ['irc_privmsg', 'notify_message',
+                            'nick_%s' % nick, 'log1']),
+                   '\x19F%02d%s' % (rnd.randrange(16), nick),
+                   _text(rnd, rnd.randint(3, 30))])]
+        messages.append(('_buffer_line_added',
+                         [_hda('line_data', keys, items)]))
+    return messages, count
+
+
+def corpus_listlines(rnd, count, buffers=100):
+    """Return (messages, number of items) with a list of lines."""
+    keys = [('date', 'tim'), ('displayed', 'chr'), ('prefix', 'str'),
+            ('message', 'str'), ('notify', 'int'), ('hidden', 'chr'),
+            ('highlight', 'chr')]
+    items = []
+    for i in range(count):
+        items.append((
+            [0x1000 + i % buffers, 0x2000 + i % buffers, 0x100000 + i,
+             0x200000 + i],
+            [1500000000 + i, 1,
+             '\x19F%02d%s' % (rnd.randrange(16), rnd.choice(NICKS)),
+             _text(rnd, rnd.randint(3, 30)), 1, 0,
+             1 if rnd.random() < 0.01 else 0]))
+    return [('listlines', [_hda('buffer/lines/line/line_data', keys,
+                                items)])], count
+
+
+_NICKLIST_KEYS = [('group', 'chr'), ('visible', 'chr'), ('level', 'int'),
+                  ('name', 'str'), ('color', 'str'), ('prefix', 'str'),
+                  ('prefix_color', 'str')]
+
+
+def _nicklist_item(rnd, index):
+    """Return values of a nick."""
+    return [0, 1, 0, '%s%d' % (rnd.choice(NICKS), index), 'default',
+            rnd.choice(['@', '+', ' ']), 'lightgreen']
+
+
+def corpus_nicklist(rnd, count):
+    """Return (messages, number of items) with a nicklist."""
+    items = [([0x1000, 0x3000], [1, 0, 0, 'root', None, None, None]),
+             ([0x1000, 0x3001], [1, 1, 1, '000|o', 'weechat.color.nicklist_'
+                                 'group', None, None])]
+    items.extend(([0x1000, 0x400000 + i], _nicklist_item(rnd, i))
+                 for i in range(count))
+    return ([('nicklist', [_hda('buffer/nicklist_item', _NICKLIST_KEYS,
+                                items)])],
+            len(items))
+
+
+def corpus_nicklist_diff(rnd, count, size=5):
+    """Return (messages, number of items) with a storm of nicklist diffs."""
+    keys = [('_diff', 'chr')] + _NICKLIST_KEYS
+    messages = []
+    for i in range(count):
+        items = [([0x1000 + i % 50, 0x3001],
+                  [ord('^'), 1, 1, 1, '000|o', None, None, None])]
+        for j in range(size):
+            diff = rnd.choice('+-')
+            items.append(([0x1000 + i % 50, 0x400000 + i * size + j],
+                          [ord(diff)] + _nicklist_item(rnd, j)))
+        messages.append(('_nicklist_diff',
+                         [_hda('buffer/nicklist_item', keys, items)]))
+    return messages, count * (size + 1)
+
+
+CORPORA = [
+    # name, function, default count
+    ('listbuffers', corpus_listbuffers, 1000),
+    ('listlines', corpus_listlines, 100000),
+    ('_buffer_line_added', corpus_buffer_line_added, 10000),
+    ('nicklist', corpus_nicklist, 10000),
+    ('nicklist_diff', corpus_nicklist_diff, 10000),
+]
+
+
+# ================================================================ readers
+
+class UncachedProtocol(protocol.Protocol):
+    """Protocol without cache of hdata schemas: compiled for each hdata."""
+
+    def _hdata_schema(self, path, keys):
+        return protocol.HdataSchema(path, keys)
+
+
+class CallbacksHdataSchema(protocol.HdataSchema):
+    """
+    Schema reading each value with the callbacks of Protocol (without
+    compiled steps), like the decoder before schemas.
+    """
+
+    def __init__(self, path, keys):
+        protocol.HdataSchema.__init__(self, path, keys)
+        types = ['ptr'] * len(self.path) + self.types
+        self._steps = [('other', None, 0, [objtype]) for objtype in types]
+
+
+class CallbacksProtocol(protocol.Protocol):
+    """Protocol without cache of hdata schemas nor compiled readers."""
+
+    def _hdata_schema(self, path, keys):
+        return CallbacksHdataSchema(path, keys)
+
+
+# hdata readers: compiled schemas in cache (used by QWeeChat), schema
+# compiled for each hdata, values read with callbacks of Protocol
+HDATA_READERS = [
+    ('compiled', protocol.Protocol),
+    ('uncached', UncachedProtocol),
+    ('callbacks', CallbacksProtocol),
+]
+
+
+# ============================================================== benchmark
+
+def max_rss_kb():
+    """Return peak memory of process (in kB), None if unknown."""
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def object_size(obj):
+    """
+    Return memory used by an object and all objects it refers to (in
+    bytes), each object being counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, memoryview):
+            # data of lazy items
+            size += len(obj) * obj.itemsize
+            continue
+        if isinstance(obj, (basestring, int, long, float, type(None),
+                            array.array)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+        for cls in type(obj).__mro__:
+            stack.extend(getattr(obj, name)
+                         for name in getattr(cls, '__slots__', ())
+                         if name != '__weakref__' and hasattr(obj, name))
+        stack.extend(getattr(obj, '__dict__', {}).values())
+    return size
+
+
+def run_forked(function, *args):
+    """
+    Call function in a child process and return its result (which must be
+    serializable in JSON), so that memory used by the function is not
+    mixed with memory used before.  The function is called in this
+    process if fork is not available.
+    """
+    if not hasattr(os, 'fork'):
+        return function(*args)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            with os.fdopen(write_fd, 'w') as pipe:
+                pipe.write(json.dumps(function(*args)))
+            status = 0
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        data = pipe.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError('benchmark failed in child process')
+    return json.loads(data)
+
+
+def bench(name, messages, items, compression, hdata_mode, hdata_reader,
+          repeat):
+    """
+    Decode messages (encoded, see Encoder.encode) and return a dict with
+    results.  Memory is the increase of peak memory while decoding.
+    """
+    rss_start = max_rss_kb()
+    size = sum(len(msg) for msg in messages)
+    proto = dict(HDATA_READERS)[hdata_reader]()
+    rss_kb = None
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.time()
+        for msg in messages:
+            proto.decode(msg, hdata_mode=hdata_mode,
+                         keep_uncompressed=False)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    best = max(best, 1e-9)
+    if rss_start is not None:
+        rss_kb = max_rss_kb() - rss_start
+    # size of messages decoded, all kept (like data of buffers)
+    decoded = [proto.decode(msg, hdata_mode=hdata_mode,
+                            keep_uncompressed=False)
+               for msg in messages]
+    return {
+        'corpus': name,
+        'compression': 'zlib' if compression else 'off',
+        'hdata_mode': hdata_mode,
+        'hdata_reader': hdata_reader,
+        'messages': len(messages),
+        'items': items,
+        'bytes': size,
+        'seconds': best,
+        'mb_per_sec': size / best / 1000000,
+        'items_per_sec': items / best,
+        'rss_kb': rss_kb,
+        'decoded_kb': object_size(decoded) // 1024,
+    }
+
+
+def compare(result, first):
+    """Add to result its speedup and memory compared to first result."""
+    result['speedup'] = first['seconds'] / result['seconds']
+    if result['rss_kb'] is not None and first['rss_kb']:
+        result['rss_ratio'] = float(result['rss_kb']) / first['rss_kb']
+    if first['decoded_kb']:
+        result['decoded_ratio'] = (float(result['decoded_kb']) /
+                                   first['decoded_kb'])
+
+
+def print_result(result):
+    """Print a result of benchmark."""
+    line = ('{corpus:<18} {compression:<4} {hdata_mode:<7} '
+            '{hdata_reader:<9} {messages:>6} msgs {items:>7} items '
+            '{bytes:>10} bytes {seconds:8.3f}s {mb_per_sec:8.2f} MB/s '
+            '{items_per_sec:10.0f} items/s rss: +{rss_kb} kB '
+            'decoded: {decoded_kb} kB'.format(**result))
+    if 'speedup' in result:
+        line += ' (time: x{0:.2f}'.format(1 / result['speedup'])
+        if 'rss_ratio' in result:
+            line += ', rss: x{0:.2f}'.format(result['rss_ratio'])
+        if 'decoded_ratio' in result:
+            line += ', decoded: x{0:.2f}'.format(result['decoded_ratio'])
+        line += ')'
+    print(line)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Benchmark of WeeChat/relay protocol decoder.',
+        epilog='''
+The best time of the repeated runs is kept for each corpus.
+Messages are generated and encoded first, then decoded in a child process
+(if fork is available): memory (rss_kb) is the increase of peak memory
+while decoding, without memory used to build the messages (memory freed
+after building them can be reused, so this is a lower bound); decoded_kb
+is the size of all messages decoded (objects referenced by messages,
+each counted once).
+
+The hdata reader "compiled" is the one used by QWeeChat (schemas compiled
+once per path/keys, kept in cache); "uncached" compiles the schema for each
+hdata, "callbacks" reads each value with the callbacks of Protocol (like
+the decoder before compiled schemas).  Readers can be compared with:
+  %(prog)s -c _buffer_line_added -c listlines -z off -R compiled -R callbacks
+
+With several hdata modes (or readers), results are compared to the first
+one: speed and memory of each mode on the same corpus, for example memory
+of WeechatDict (items) and WeechatRecord (compact) items:
+  %(prog)s -c listlines -c nicklist -z off -m items -m compact
+''')
+    parser.add_argument('-c', '--corpus', action='append',
+                        choices=[corpus[0] for corpus in CORPORA],
+                        help='corpus to decode (can be given multiple '
+                        'times, default: all)')
+    parser.add_argument('-s', '--scale', type=float, default=1.0,
+                        help='scale of corpora (number of items)')
+    parser.add_argument('-m', '--hdata-mode', action='append',
+                        choices=HDATA_MODES,
+                        help='hdata decoding mode (can be given multiple '
+                        'times, default: items)')
+    parser.add_argument('-R', '--hdata-reader', action='append',
+                        choices=[reader[0] for reader in HDATA_READERS],
+                        help='hdata reader (can be given multiple times, '
+                        'default: compiled)')
+    parser.add_argument('-z', '--compression', choices=['off', 'zlib',
+                                                        'both'],
+                        default='both', help='compression of messages')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of runs for each corpus')
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='display results in JSON')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for random data')
+    parser.add_argument('-v', '--version', action='version',
+                        version=qweechat_version())
+    args = parser.parse_args()
+
+    compressions = {'off': [False], 'zlib': [True],
+                    'both': [False, True]}[args.compression]
+    modes = args.hdata_mode or [protocol.HDATA_ITEMS]
+    readers = args.hdata_reader or ['compiled']
+    results = []
+    for name, function, count in CORPORA:
+        if args.corpus and name not in args.corpus:
+            continue
+        objects, items = function(random.Random(args.seed),
+                                  max(1, int(count * args.scale)))
+        encoded = [[encoder.Encoder().encode(msgid, msg_objects, compression)
+                    for msgid, msg_objects in objects]
+                   for compression in compressions]
+        del objects
+        gc.collect()
+        for compression, messages in zip(compressions, encoded):
+            first = None
+            for hdata_mode in modes:
+                for reader in readers:
+                    result = run_forked(bench, name, messages, items,
+                                        compression, hdata_mode, reader,
+                                        args.repeat)
+                    if first is None:
+                        first = result
+                    else:
+                        compare(result, first)
+                    results.append(result)
+                    if not args.json:
+                        print_result(result)
+    if args.json:
+        print(json.dumps({'version': qweechat_version(),
+                          'python': sys.version.split()[0],
+                          'hdata_modes': modes,
+                          'hdata_readers': readers,
+                          'scale': args.scale,
+                          'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# capture.py - capture of data received from WeeChat/relay
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# A capture file starts with CAPTURE_MAGIC, followed by records:
+#   timestamp (8 bytes, double, in seconds) + length (4 bytes) + data
+#
+# Data is raw data received from WeeChat/relay (as read on socket), so it
+# can be replayed through the same decoder.  Timestamps are monotonic
+# inside a session; a capture file can contain many sessions (the file is
+# only appended), a new session starts when the timestamp goes backwards.
+#
+
+import mmap
+import os
+import struct
+
+CAPTURE_MAGIC = 'qweechat-capture 1\n'
+
+_STRUCT_RECORD = struct.Struct('>dI')
+
+
+class CaptureWriter(object):
+    """Append data received from WeeChat/relay to a capture file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+    def write(self, timestamp, data):
+        """Write data received at timestamp (in seconds)."""
+        self._file.write(_STRUCT_RECORD.pack(timestamp, len(data)))
+        self._file.write(data)
+
+    def close(self):
+        """Close the capture file."""
+        self._file.close()
+
+
+class CaptureReader(object):
+    """
+    Read a capture file (memory mapped: only the records read are loaded).
+
+    Iterating on the reader yields (delay, data), where delay is the time
+    in seconds between previous data and this one (0 for the first data
+    of a session).  An incomplete record at the end of file (capture
+    interrupted) is ignored.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._map = None
+        size = os.fstat(self._file.fileno()).st_size
+        if size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        if size < len(CAPTURE_MAGIC) or \
+           self._map[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError('%s is not a capture file' % filename)
+
+    def __iter__(self):
+        pos = len(CAPTURE_MAGIC)
+        end = len(self._map)
+        previous = None
+        while end - pos >= _STRUCT_RECORD.size:
+            timestamp, length = _STRUCT_RECORD.unpack_from(self._map, pos)
+            pos += _STRUCT_RECORD.size
+            if end - pos < length:
+                break
+            delay = 0
+            if previous is not None and timestamp > previous:
+                delay = timestamp - previous
+            previous = timestamp
+            yield delay, self._map[pos:pos + length]
+            pos += length
+
+    def close(self):
+        """Close the capture file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
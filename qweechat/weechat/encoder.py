@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# encoder.py - encode binary messages sent by WeeChat/relay
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Messages built here are the ones sent by WeeChat/relay: they can be
+# decoded by Protocol (see protocol.py), which is used for tests, benchmarks
+# and fake relay servers.
+#
+# For info about protocol and format of messages, please read document
+# "WeeChat Relay Protocol", available at:  https://weechat.org/doc/
+#
+
+import collections
+import struct
+import zlib
+
+import protocol  # WeeChat/relay protocol
+
+_STRUCT_CHAR = struct.Struct('b')
+_STRUCT_UCHAR = struct.Struct('B')
+_STRUCT_INT = struct.Struct('>i')
+
+_COMPRESSIONS = {
+    True: protocol.COMPRESSION_ZLIB,
+    'zlib': protocol.COMPRESSION_ZLIB,
+    'zstd': protocol.COMPRESSION_ZSTD,
+}
+
+_INT_MIN = -2 ** 31
+_INT_MAX = 2 ** 31 - 1
+
+
+def value_type(value):
+    """
+    Return the object type for a python value (used for values of arrays,
+    hashtables and infolists when the type is not given).
+    """
+    if isinstance(value, bool):
+        return 'chr'
+    if isinstance(value, (int, long)):
+        return 'int' if _INT_MIN <= value <= _INT_MAX else 'lon'
+    if isinstance(value, collections.Mapping):
+        return 'htb'
+    if isinstance(value, (list, tuple)):
+        return 'arr'
+    return 'str'
+
+
+class Encoder(object):
+    """
+    Encode binary message sent by WeeChat/relay (inverse of Protocol).
+
+    The values are the ones returned by Protocol:
+      chr: integer (or string with one char)
+      int, lon, tim: integer
+      str, buf: string or None
+      ptr: string '0x123abc' (or integer)
+      htb: mapping (types of keys/values are guessed with value_type),
+           or tuple (type_keys, type_values, mapping or list of pairs)
+      arr: list (type of values is guessed), or tuple (type, list)
+      inf: tuple (name, value)
+      inl: {'name': name, 'items': [mapping name -> value]}, a value can
+           be a tuple (type, value)
+      hda: {'path': path, 'keys': mapping name -> type (or list of pairs),
+            'items': [mapping with '__path' (list of pointers) and keys]}
+    """
+
+    def __init__(self):
+        self._obj_cb = {
+            'chr': self._obj_char,
+            'int': self._obj_int,
+            'lon': self._obj_long,
+            'str': self._obj_str,
+            'buf': self._obj_buffer,
+            'ptr': self._obj_ptr,
+            'tim': self._obj_time,
+            'htb': self._obj_hashtable,
+            'hda': self._obj_hdata,
+            'inf': self._obj_info,
+            'inl': self._obj_infolist,
+            'arr': self._obj_array,
+        }
+
+    def _obj_len_data(self, length_size, value):
+        """Return length (1 or 4 bytes), then value."""
+        if value is None:
+            return _STRUCT_INT.pack(-1)
+        if length_size == 1:
+            return '%s%s' % (_STRUCT_UCHAR.pack(len(value)), value)
+        return '%s%s' % (_STRUCT_INT.pack(len(value)), value)
+
+    def _obj_char(self, value):
+        """Return a char."""
+        if isinstance(value, str):
+            value = ord(value)
+        return _STRUCT_CHAR.pack(value)
+
+    def _obj_int(self, value):
+        """Return an integer (4 bytes)."""
+        return _STRUCT_INT.pack(value)
+
+    def _obj_long(self, value):
+        """Return a long integer (length on 1 byte + value as string)."""
+        return self._obj_len_data(1, '0' if value is None else str(value))
+
+    def _obj_str(self, value):
+        """Return a string (length on 4 bytes + content)."""
+        return self._obj_len_data(4, value)
+
+    def _obj_buffer(self, value):
+        """Return a buffer (length on 4 bytes + data)."""
+        return self._obj_len_data(4, value)
+
+    def _obj_ptr(self, value):
+        """Return a pointer (length on 1 byte + value as string)."""
+        if isinstance(value, (int, long)):
+            value = '%x' % value
+        elif value is None:
+            value = '0'
+        elif value.startswith('0x'):
+            value = value[2:]
+        return self._obj_len_data(1, value)
+
+    def _obj_time(self, value):
+        """Return a time (length on 1 byte + value as string)."""
+        return self._obj_len_data(1, '0' if value is None else str(value))
+
+    def _obj_hashtable(self, value):
+        """
+        Return a hashtable
+        (type for keys + type for values + count + items).
+        """
+        if isinstance(value, tuple):
+            type_keys, type_values, items = value
+            if isinstance(items, collections.Mapping):
+                items = items.items()
+        else:
+            items = value.items()
+            type_keys = value_type(items[0][0]) if items else 'str'
+            type_values = value_type(items[0][1]) if items else 'str'
+        obj_key = self._obj_cb[type_keys]
+        obj_value = self._obj_cb[type_values]
+        out = [type_keys, type_values, _STRUCT_INT.pack(len(items))]
+        for key, value in items:
+            out.append(obj_key(key))
+            out.append(obj_value(value))
+        return ''.join(out)
+
+    def _obj_hdata(self, value):
+        """Return a hdata."""
+        path = value['path']
+        if not isinstance(path, str):
+            path = '/'.join(path)
+        keys = value['keys']
+        if isinstance(keys, collections.Mapping):
+            keys = keys.items()
+        items = value['items']
+        obj_ptr = self._obj_ptr
+        objs = [(name, self._obj_cb[objtype]) for name, objtype in keys]
+        out = [self._obj_str(path),
+               self._obj_str(','.join(['%s:%s' % key for key in keys])),
+               _STRUCT_INT.pack(len(items))]
+        for item in items:
+            for pointer in item['__path']:
+                out.append(obj_ptr(pointer))
+            for name, obj in objs:
+                out.append(obj(item[name]))
+        return ''.join(out)
+
+    def _obj_info(self, value):
+        """Return an info."""
+        return '%s%s' % (self._obj_str(value[0]), self._obj_str(value[1]))
+
+    def _obj_infolist(self, value):
+        """Return an infolist."""
+        items = value['items']
+        out = [self._obj_str(value['name']), _STRUCT_INT.pack(len(items))]
+        for item in items:
+            out.append(_STRUCT_INT.pack(len(item)))
+            for var_name, var_value in item.items():
+                if isinstance(var_value, tuple):
+                    var_type, var_value = var_value
+                else:
+                    var_type = value_type(var_value)
+                out.append(self._obj_str(var_name))
+                out.append(var_type)
+                out.append(self._obj_cb[var_type](var_value))
+        return ''.join(out)
+
+    def _obj_array(self, value):
+        """Return an array of values."""
+        if isinstance(value, tuple):
+            type_values, value = value
+        else:
+            type_values = value_type(value[0]) if value else 'str'
+        obj = self._obj_cb[type_values]
+        return ''.join([type_values, _STRUCT_INT.pack(len(value))] +
+                       [obj(item) for item in value])
+
+    def encode_object(self, objtype, value):
+        """Return an object (type + value)."""
+        return '%s%s' % (objtype, self._obj_cb[objtype](value))
+
+    def encode(self, msgid, objects, compression=False):
+        """
+        Return a binary message with an id and objects: list of
+        WeechatObject or (objtype, value).
+        The message is compressed with zlib if compression is True or
+        'zlib', with zstd if compression is 'zstd'.
+        """
+        data = [self._obj_str(msgid)]
+        for obj in objects:
+            if isinstance(obj, protocol.WeechatObject):
+                obj = (obj.objtype, obj.value)
+            data.append(self.encode_object(*obj))
+        data = ''.join(data)
+        flag = _COMPRESSIONS.get(compression, protocol.COMPRESSION_OFF)
+        if flag == protocol.COMPRESSION_ZLIB:
+            data = zlib.compress(data)
+        elif flag == protocol.COMPRESSION_ZSTD:
+            data = protocol.zstandard.ZstdCompressor().compress(data)
+        return '%s%s%s' % (_STRUCT_INT.pack(len(data) + 5),
+                           _STRUCT_CHAR.pack(flag), data)
+
+    def encode_message(self, message, compression=None):
+        """
+        Return a binary message for a WeechatMessage (compressed as the
+        original message if compression is None).
+        """
+        if compression is None:
+            compression = {
+                protocol.COMPRESSION_ZLIB: 'zlib',
+                protocol.COMPRESSION_ZSTD: 'zstd',
+            }.get(message.compression, False)
+        return self.encode(message.msgid, message.objects,
+                           compression=compression)
@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+#
+# fakerelay.py - fake WeeChat/relay server, for load tests of clients
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Fake WeeChat/relay server: buffers, lines and nicks are kept in memory,
+and synthetic IRC traffic is sent to clients at a given rate.
+"""
+
+from __future__ import print_function
+
+import argparse
+import binascii
+import collections
+import os
+import random
+import re
+import select
+import shlex
+import socket
+import sys
+import time
+import traceback
+
+import encoder  # WeeChat/relay protocol (encoder)
+import handshake
+from .. version import qweechat_version
+
+NAME = 'qweechat-fakerelay'
+
+VERSION = '2.0'
+
+NICKS = ['alice', 'bob', 'carol', 'dave', 'eve', 'mallory', 'oscar',
+         'peggy', 'trent', 'victor', 'walter', 'FlashCode']
+
+WORDS = ['hello', 'world', 'weechat', 'relay', 'qt', 'python', 'the', 'a',
+         'is', 'to', 'of', 'and', 'buffer', 'nicklist', 'message', 'lol',
+         'build', 'crash', 'patch', 'release', 'test', 'slow', 'fast']
+
+BUFFER_KEYS = [
+    ('number', 'int'), ('full_name', 'str'), ('short_name', 'str'),
+    ('type', 'int'), ('nicklist', 'int'), ('title', 'str'),
+    ('local_variables', 'htb'), ('notify', 'int'), ('hidden', 'int'),
+    ('highlight', 'int'), ('prev_buffer', 'ptr'), ('next_buffer', 'ptr'),
+]
+
+LINE_KEYS = [
+    ('buffer', 'ptr'), ('date', 'tim'), ('date_printed', 'tim'),
+    ('displayed', 'chr'), ('notify', 'int'), ('notify_level', 'chr'),
+    ('hidden', 'chr'), ('highlight', 'chr'), ('tags_array', 'arr'),
+    ('prefix', 'str'), ('message', 'str'),
+]
+
+NICKLIST_KEYS = [
+    ('group', 'chr'), ('visible', 'chr'), ('level', 'int'), ('name', 'str'),
+    ('color', 'str'), ('prefix', 'str'), ('prefix_color', 'str'),
+]
+
+HOTLIST_KEYS = [('buffer', 'ptr'), ('count', 'arr')]
+
+
+def _select_keys(all_keys, keys):
+    """Return keys (name, type) asked by client (all if keys is empty)."""
+    if not keys:
+        return all_keys
+    names = [name.strip() for name in keys.split(',')]
+    return [key for key in all_keys if key[0] in names]
+
+
+def _hdata(path, keys, items):
+    """Return a hdata object."""
+    return ('hda', {'path': path, 'keys': keys, 'items': items})
+
+
+class FakeWeechat(object):
+    """In-memory WeeChat: buffers, with lines, nicks and hotlist."""
+
+    def __init__(self, rnd, buffers=20, nicks=100, lines=1000,
+                 colors=0.1, urls=0.05):
+        self.rnd = rnd
+        self.colors = colors
+        self.urls = urls
+        self._pointer = 0x100000
+        self.own_nick = 'me'
+        self.buffers = []
+        self.max_lines = lines
+        self._add_buffer('core.weechat', 'weechat', 0)
+        for i in range(buffers):
+            self._add_buffer('irc.fake.#chan%d' % i, '#chan%d' % i, nicks)
+        for buf in self.buffers:
+            for _ in range(lines):
+                self.add_message(buf)
+            buf['hotlist'] = [0, 0, 0, 0]
+
+    def _new_pointer(self):
+        self._pointer += 0x10
+        return self._pointer
+
+    def _add_buffer(self, full_name, short_name, nicks):
+        """Add a buffer with nicks."""
+        buf = {
+            'pointer': self._new_pointer(),
+            'number': len(self.buffers) + 1,
+            'full_name': full_name,
+            'short_name': short_name,
+            'type': 0,
+            'nicklist': 1 if nicks else 0,
+            'title': 'Welcome on %s' % short_name,
+            'local_variables': ('str', 'str', [
+                ('plugin', 'irc' if nicks else 'core'),
+                ('type', 'channel' if nicks else ''),
+                ('nick', self.own_nick),
+                ('name', short_name),
+            ]),
+            'notify': 3,
+            'hidden': 0,
+            'highlight': 0,
+            'prev_buffer': (self.buffers[-1]['pointer'] if self.buffers
+                            else 0),
+            'next_buffer': 0,
+            'lines_pointer': self._new_pointer(),
+            'lines': collections.deque(maxlen=self.max_lines),
+            'nicks': collections.OrderedDict(),
+            'hotlist': [0, 0, 0, 0],
+        }
+        if self.buffers:
+            self.buffers[-1]['next_buffer'] = buf['pointer']
+        self.buffers.append(buf)
+        for _ in range(nicks):
+            self.join(buf)
+        return buf
+
+    def find_buffer(self, name):
+        """Find a buffer by pointer or full name."""
+        for buf in self.buffers:
+            if name in (buf['full_name'], '0x%x' % buf['pointer']):
+                return buf
+        return None
+
+    def channels(self):
+        """Return buffers with a nicklist."""
+        return [buf for buf in self.buffers if buf['nicks']]
+
+    def text(self):
+        """Return a random message, with colors and URLs."""
+        words = [self.rnd.choice(WORDS)
+                 for _ in range(self.rnd.randint(2, 25))]
+        if self.rnd.random() < self.colors:
+            words = ['\x19F%02d%s' % (self.rnd.randrange(16), word)
+                     for word in words]
+            words[-1] += '\x1c'
+        if self.rnd.random() < self.urls:
+            words.insert(self.rnd.randrange(len(words)),
+                         'https://example.com/%d/%s'
+                         % (self.rnd.randrange(100000),
+                            self.rnd.choice(WORDS)))
+        return ' '.join(words)
+
+    def add_line(self, buf, prefix, message, tags, highlight=0):
+        """Add a line in a buffer and return it."""
+        now = int(time.time())
+        line = {
+            '__path': [buf['pointer'], buf['lines_pointer'],
+                       self._new_pointer(), self._new_pointer()],
+            'buffer': buf['pointer'],
+            'date': now,
+            'date_printed': now,
+            'displayed': 1,
+            'notify': 1,
+            'notify_level': 3 if highlight else 1,
+            'hidden': 0,
+            'highlight': highlight,
+            'tags_array': ('str', tags),
+            'prefix': prefix,
+            'message': message,
+        }
+        buf['lines'].append(line)
+        if 'self_msg' not in tags:
+            buf['hotlist'][3 if highlight else 1] += 1
+        return line
+
+    def add_message(self, buf, nick=None, message=None):
+        """Add a message from a nick (random if not given)."""
+        if nick is None:
+            nick = (self.rnd.choice(list(buf['nicks'])) if buf['nicks']
+                    else 'weechat')
+        if message is None:
+            message = self.text()
+        tags = ['irc_privmsg', 'notify_message', 'nick_%s' % nick, 'log1']
+        if nick == self.own_nick:
+            tags = ['irc_privmsg', 'self_msg', 'no_highlight',
+                    'notify_none', 'nick_%s' % nick, 'log1']
+        highlight = (1 if nick != self.own_nick and self.rnd.random() < 0.01
+                     else 0)
+        return self.add_line(buf, '\x19F%02d%s' % (hash(nick) % 16, nick),
+                             message, tags, highlight)
+
+    def join(self, buf):
+        """Add a random nick in a buffer, return (nick, line)."""
+        nick = '%s%d' % (self.rnd.choice(NICKS), self.rnd.randrange(100000))
+        prefix = self.rnd.choice(['@', '+', ' ', ' ', ' '])
+        buf['nicks'][nick] = (self._new_pointer(), prefix)
+        return nick, self.add_line(
+            buf, '\x19F09-->', '%s (~%s@example.com) has joined %s'
+            % (nick, nick, buf['short_name']),
+            ['irc_join', 'nick_%s' % nick, 'log4'])
+
+    def part(self, buf):
+        """Remove a random nick from a buffer, return (nick, line)."""
+        nick = self.rnd.choice(list(buf['nicks']))
+        del buf['nicks'][nick]
+        return nick, self.add_line(
+            buf, '\x19F10<--', '%s (~%s@example.com) has left %s'
+            % (nick, nick, buf['short_name']),
+            ['irc_part', 'nick_%s' % nick, 'log4'])
+
+    # ========================================================== objects
+
+    def hdata_buffers(self, buffers, keys):
+        """Return hdata with buffers."""
+        keys = _select_keys(BUFFER_KEYS, keys)
+        return _hdata('buffer', keys, [
+            dict(buf, __path=[buf['pointer']]) for buf in buffers])
+
+    def hdata_lines(self, buffers, count, keys):
+        """Return hdata with last lines of buffers (last line first)."""
+        keys = _select_keys(LINE_KEYS, keys)
+        items = []
+        for buf in buffers:
+            lines = list(buf['lines'])[-count:]
+            items.extend(reversed(lines))
+        return _hdata('buffer/lines/line/line_data', keys, items)
+
+    def hdata_line_added(self, line):
+        """Return hdata with a line added."""
+        return _hdata('line_data', LINE_KEYS,
+                      [dict(line, __path=[line['__path'][-1]])])
+
+    def hdata_hotlist(self, keys):
+        """Return hdata with hotlist."""
+        keys = _select_keys(HOTLIST_KEYS, keys)
+        items = []
+        for buf in self.buffers:
+            if any(buf['hotlist']):
+                items.append({'__path': [buf['pointer'] + 1],
+                              'buffer': buf['pointer'],
+                              'count': ('int', buf['hotlist'])})
+        return _hdata('hotlist', keys, items)
+
+    def _nicklist_items(self, buf, diff=None, nicks=None):
+        """Return nicklist items of a buffer (all nicks if nicks is None)."""
+        path = [buf['pointer']]
+        items = [
+            {'__path': path + [buf['pointer'] + 2], 'group': 1,
+             'visible': 0, 'level': 0, 'name': 'root', 'color': None,
+             'prefix': None, 'prefix_color': None},
+        ]
+        if nicks is None:
+            nicks = [(None, nick) for nick in buf['nicks']]
+        for nick_diff, nick in nicks:
+            pointer, prefix = buf['nicks'].get(nick, (0, ' '))
+            items.append({'__path': path + [pointer], '_diff': nick_diff,
+                          'group': 0, 'visible': 1, 'level': 0,
+                          'name': nick, 'color': 'default',
+                          'prefix': prefix, 'prefix_color': 'lightgreen'})
+        if diff:
+            items[0]['_diff'] = '^'
+        return items
+
+    def hdata_nicklist(self, buffers):
+        """Return hdata with nicklist of buffers."""
+        items = []
+        for buf in buffers:
+            if buf['nicks']:
+                items.extend(self._nicklist_items(buf))
+        return _hdata('buffer/nicklist_item', NICKLIST_KEYS, items)
+
+    def hdata_nicklist_diff(self, buf, nicks):
+        """Return hdata with a nicklist diff: nicks is [(diff, nick)]."""
+        return _hdata('buffer/nicklist_item',
+                      [('_diff', 'chr')] + NICKLIST_KEYS,
+                      self._nicklist_items(buf, diff=True, nicks=nicks))
+
+
+class RelayClient(object):
+    """Client connected to fake relay."""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.data = ''
+        self.authenticated = False
+        self.compression = False
+        self.synced = False
+        self.password_hash_algo = None
+        self.nonce = None
+
+
+class FakeRelay(object):
+    """Fake WeeChat/relay server."""
+
+    def __init__(self, args):
+        self.args = args
+        self.weechat = FakeWeechat(random.Random(args.seed),
+                                   buffers=args.buffers, nicks=args.nicks,
+                                   lines=args.lines, colors=args.colors,
+                                   urls=args.urls)
+        self.encoder = encoder.Encoder()
+        self.sock = None
+        self.clients = {}
+        self.stats = {'lines': 0, 'messages': 0, 'bytes': 0}
+        self.commands = {
+            'handshake': self.cmd_handshake,
+            'init': self.cmd_init,
+            'hdata': self.cmd_hdata,
+            'info': self.cmd_info,
+            'nicklist': self.cmd_nicklist,
+            'input': self.cmd_input,
+            'sync': self.cmd_sync,
+            'desync': self.cmd_desync,
+            'ping': self.cmd_ping,
+            'quit': self.cmd_quit,
+        }
+
+    def listen(self):
+        """
+        Listen on address/port.
+        Return True if OK, False if error.
+        """
+        inet = socket.AF_INET6 if self.args.ipv6 else socket.AF_INET
+        try:
+            self.sock = socket.socket(inet, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((self.args.bind, self.args.port))
+            self.sock.listen(5)
+        except socket.error:
+            traceback.print_exc()
+            print('Failed to listen on port', self.args.port)
+            return False
+        print('Listening on {0}/{1}'.format(self.args.bind, self.args.port))
+        return True
+
+    def send(self, client, msgid, objects):
+        """Send a message to a client."""
+        message = self.encoder.encode(msgid, objects,
+                                      compression=client.compression)
+        try:
+            client.sock.sendall(message)
+        except socket.error:
+            self.close(client)
+            return
+        self.stats['messages'] += 1
+        self.stats['bytes'] += len(message)
+
+    def broadcast(self, msgid, objects):
+        """Send a message to all synchronized clients."""
+        for client in list(self.clients.values()):
+            if client.synced:
+                self.send(client, msgid, objects)
+
+    def close(self, client):
+        """Close connection with a client."""
+        if client.sock in self.clients:
+            del self.clients[client.sock]
+            client.sock.close()
+            print('Client disconnected:', client.address)
+
+    def _buffers(self, name):
+        """Return buffers for a name (all buffers if name is empty)."""
+        if not name:
+            return self.weechat.buffers
+        buf = self.weechat.find_buffer(name)
+        return [buf] if buf else []
+
+    # ========================================================= commands
+
+    def _options(self, args):
+        """Return options of command handshake/init (escaped commas)."""
+        return dict(option.replace('\\,', ',').partition('=')[::2]
+                    for option in re.split(r'(?<!\\),', args.strip()))
+
+    def cmd_handshake(self, client, msgid, args):
+        """Command "handshake": negotiate password hash and compression."""
+        if self.args.no_handshake:
+            return
+        options = self._options(args)
+        algos = [algo for algo in options.get('password_hash_algo',
+                                              'plain').split(':')
+                 if algo in self.args.password_hash_algo.split(':')]
+        compressions = [
+            compression
+            for compression in options.get('compression', 'off').split(':')
+            if compression in handshake.compressions()]
+        client.password_hash_algo = algos[0] if algos else None
+        client.nonce = binascii.hexlify(os.urandom(16))
+        self.send(client, 'handshake', [('htb', ('str', 'str', [
+            ('password_hash_algo', client.password_hash_algo),
+            ('password_hash_iterations',
+             str(self.args.password_hash_iterations)),
+            ('totp', 'off'),
+            ('nonce', client.nonce),
+            ('compression', compressions[0] if compressions else 'off'),
+        ]))])
+        # compression is used for messages after the handshake
+        if compressions and compressions[0] != 'off':
+            client.compression = compressions[0]
+
+    def _check_password(self, client, options):
+        """Check password (or its hash) sent by client."""
+        if not self.args.password:
+            return True
+        if 'password_hash' not in options:
+            return (client.password_hash_algo in (None, 'plain') and
+                    options.get('password') == self.args.password)
+        fields = options['password_hash'].split(':')
+        algo, salt_hex, hash_hex = fields[0], fields[1], fields[-1]
+        iterations = int(fields[2]) if len(fields) == 4 else 0
+        if algo != client.password_hash_algo or \
+           not salt_hex.startswith(client.nonce):
+            return False
+        return hash_hex == handshake.password_hash(
+            algo, self.args.password, binascii.unhexlify(salt_hex),
+            iterations)
+
+    def cmd_init(self, client, msgid, args):
+        """Command "init": authenticate client."""
+        options = self._options(args)
+        if not self._check_password(client, options):
+            print('Invalid password from', client.address)
+            self.close(client)
+            return
+        client.authenticated = True
+        if options.get('compression') == 'zlib':
+            client.compression = 'zlib'
+
+    def cmd_hdata(self, client, msgid, args):
+        """Command "hdata": buffers, lines or hotlist."""
+        path, _, keys = args.partition(' ')
+        keys = keys.replace(' ', '')
+        elements = path.split('/')
+        name, _, start = elements[0].partition(':')
+        if name == 'buffer':
+            pointer, _, count = start.partition('(')
+            buffers = (self.weechat.buffers if count == '*)'
+                       else self._buffers(pointer))
+            if len(elements) == 1:
+                obj = self.weechat.hdata_buffers(buffers, keys)
+            else:
+                count = elements[-2].partition('(')[2].strip('()-')
+                count = int(count) if count.isdigit() else 1
+                obj = self.weechat.hdata_lines(buffers, count, keys)
+        elif name == 'hotlist':
+            obj = self.weechat.hdata_hotlist(keys)
+        else:
+            obj = _hdata(name, [], [])
+        self.send(client, msgid, [obj])
+
+    def cmd_info(self, client, msgid, args):
+        """Command "info": version."""
+        value = {'version': VERSION,
+                 'version_number': str(0x2000000)}.get(args.strip())
+        self.send(client, msgid, [('inf', (args.strip(), value))])
+
+    def cmd_nicklist(self, client, msgid, args):
+        """Command "nicklist": nicks of buffers."""
+        self.send(client, msgid,
+                  [self.weechat.hdata_nicklist(self._buffers(args.strip()))])
+
+    def cmd_input(self, client, msgid, args):
+        """Command "input": text sent to a buffer."""
+        name, _, text = args.partition(' ')
+        buf = self.weechat.find_buffer(name)
+        if not buf:
+            return
+        if text.startswith('/'):
+            if text.startswith('/buffer set hotlist -1'):
+                buf['hotlist'] = [0, 0, 0, 0]
+            return
+        line = self.weechat.add_message(buf, self.weechat.own_nick, text)
+        self.broadcast('_buffer_line_added',
+                       [self.weechat.hdata_line_added(line)])
+
+    def cmd_sync(self, client, msgid, args):
+        """Command "sync": send events to client."""
+        client.synced = True
+
+    def cmd_desync(self, client, msgid, args):
+        """Command "desync": stop sending events to client."""
+        client.synced = False
+
+    def cmd_ping(self, client, msgid, args):
+        """Command "ping": answer with a pong."""
+        self.send(client, '_pong', [('str', args)])
+
+    def cmd_quit(self, client, msgid, args):
+        """Command "quit": close connection."""
+        self.close(client)
+
+    def read(self, client):
+        """Read and run commands from a client."""
+        try:
+            data = client.sock.recv(4096)
+        except socket.error:
+            data = ''
+        if not data:
+            self.close(client)
+            return
+        client.data += data
+        while '\n' in client.data and client.sock in self.clients:
+            line, client.data = client.data.split('\n', 1)
+            line = line.rstrip('\r')
+            if self.args.debug:
+                print('<-- {0}: {1}'.format(client.address, line))
+            msgid = None
+            if line.startswith('('):
+                msgid, _, line = line[1:].partition(')')
+                line = line.lstrip(' ')
+            command, _, args = line.partition(' ')
+            callback = self.commands.get(command)
+            if not callback:
+                continue
+            if command not in ('handshake', 'init') and \
+               not client.authenticated:
+                continue
+            callback(client, msgid, args)
+
+    # ========================================================== traffic
+
+    def traffic_line(self):
+        """Add a message in a random buffer."""
+        buf = self.weechat.rnd.choice(self.weechat.channels())
+        line = self.weechat.add_message(buf)
+        self.broadcast('_buffer_line_added',
+                       [self.weechat.hdata_line_added(line)])
+        self.stats['lines'] += 1
+
+    def traffic_join_part(self):
+        """Add (join) or remove (part) a nick in a random buffer."""
+        buf = self.weechat.rnd.choice(self.weechat.channels())
+        if len(buf['nicks']) > 1 and self.weechat.rnd.random() < 0.5:
+            nick, line = self.weechat.part(buf)
+            diff = self.weechat.hdata_nicklist_diff(buf, [('-', nick)])
+        else:
+            nick, line = self.weechat.join(buf)
+            diff = self.weechat.hdata_nicklist_diff(buf, [('+', nick)])
+        self.broadcast('_buffer_line_added',
+                       [self.weechat.hdata_line_added(line)])
+        self.broadcast('_nicklist_diff', [diff])
+        self.stats['lines'] += 1
+
+    def mainloop(self):
+        """
+        Main loop: accept clients, run commands, send traffic.
+        Return 0 if OK.
+        """
+        start = time.time()
+        events = {'lines': 0, 'joins': 0}
+        stats_time = start
+        while True:
+            inr = select.select([self.sock] + list(self.clients), [], [],
+                                0.01)[0]
+            for sock in inr:
+                if sock == self.sock:
+                    client_sock, address = self.sock.accept()
+                    address = '{0}/{1}'.format(*address[:2])
+                    self.clients[client_sock] = RelayClient(client_sock,
+                                                            address)
+                    print('Client connected:', address)
+                elif sock in self.clients:
+                    self.read(self.clients[sock])
+            now = time.time()
+            if not any(client.synced for client in self.clients.values()):
+                # no traffic without synchronized client
+                start = now
+                events = {'lines': 0, 'joins': 0}
+                continue
+            # events late by more than one second are dropped
+            for name, rate, callback in (
+                    ('lines', self.args.rate, self.traffic_line),
+                    ('joins', self.args.joins, self.traffic_join_part)):
+                due = int((now - start) * rate) - events[name]
+                for _ in range(min(due, max(1, int(rate)))):
+                    callback()
+                events[name] += due
+            if self.args.stats and now - stats_time >= self.args.stats:
+                print('{0:.0f} lines/s, {1:.0f} messages/s, {2:.0f} kB/s'
+                      ''.format(self.stats['lines'] / (now - stats_time),
+                                self.stats['messages'] / (now - stats_time),
+                                self.stats['bytes'] / 1024.0 /
+                                (now - stats_time)))
+                self.stats = {'lines': 0, 'messages': 0, 'bytes': 0}
+                stats_time = now
+        return 0
+
+
+def main():
+    """Main function."""
+    # parse command line arguments
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        fromfile_prefix_chars='@',
+        description='Fake WeeChat/relay server, for load tests of clients.',
+        epilog='''
+Environment variable "QWEECHAT_FAKERELAY_OPTIONS" can be set with default
+options.
+Argument "@file.txt" can be used to read default options in a file.
+
+Example: 1000 lines/s and 50 joins/parts per second on port 9001:
+  {name} --rate 1000 --joins 50 9001
+'''.format(name=NAME))
+    parser.add_argument('-6', '--ipv6', action='store_true',
+                        help='listen using IPv6')
+    parser.add_argument('-b', '--bind', default='localhost',
+                        help='address to bind (default: localhost)')
+    parser.add_argument('-p', '--password', default='',
+                        help='password for clients (default: any)')
+    parser.add_argument('--password-hash-algo',
+                        default=':'.join(handshake.PASSWORD_HASH_ALGOS),
+                        help='password hash algorithms, separated by colons '
+                        '(default: all)')
+    parser.add_argument('--password-hash-iterations', type=int,
+                        default=100000,
+                        help='iterations for PBKDF2 (default: 100000)')
+    parser.add_argument('--no-handshake', action='store_true',
+                        help='ignore command handshake (like WeeChat < 2.9)')
+    parser.add_argument('-r', '--rate', type=float, default=10,
+                        help='lines per second (default: 10)')
+    parser.add_argument('-j', '--joins', type=float, default=0,
+                        help='joins/parts per second (default: 0)')
+    parser.add_argument('--colors', type=float, default=0.1,
+                        help='ratio of messages with colors (default: 0.1)')
+    parser.add_argument('--urls', type=float, default=0.05,
+                        help='ratio of messages with URL (default: 0.05)')
+    parser.add_argument('--buffers', type=int, default=20,
+                        help='number of channels (default: 20)')
+    parser.add_argument('--nicks', type=int, default=100,
+                        help='number of nicks per channel (default: 100)')
+    parser.add_argument('--lines', type=int, default=1000,
+                        help='lines kept per buffer (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for random data')
+    parser.add_argument('-s', '--stats', type=float, default=0,
+                        help='display stats every N seconds')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='debug mode: display commands received')
+    parser.add_argument('-v', '--version', action='version',
+                        version=qweechat_version())
+    parser.add_argument('port', type=int, help='port to listen')
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(0)
+    _args = parser.parse_args(
+        shlex.split(os.getenv('QWEECHAT_FAKERELAY_OPTIONS') or '') +
+        sys.argv[1:])
+
+    relay = FakeRelay(_args)
+    if not relay.listen():
+        sys.exit(3)
+    try:
+        returncode = relay.mainloop()
+    except KeyboardInterrupt:
+        returncode = 0
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    main()
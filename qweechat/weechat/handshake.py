@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# handshake.py - handshake and authentication with WeeChat/relay
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# The command "handshake" (WeeChat >= 2.9) negotiates the password hash
+# algorithm and the compression; the password (or its hash) is then sent
+# with the command "init".  Older versions of WeeChat do not answer the
+# handshake, the legacy "init" (with password and compression) is used.
+#
+
+import binascii
+import hashlib
+import os
+
+import protocol  # WeeChat/relay protocol
+
+# password hash algorithms, by order of preference
+PASSWORD_HASH_ALGOS = ('pbkdf2+sha512', 'pbkdf2+sha256', 'sha512', 'sha256',
+                       'plain')
+
+
+def compressions():
+    """Return compressions supported, by order of preference."""
+    if protocol.zstandard:
+        return ('zstd', 'zlib', 'off')
+    return ('zlib', 'off')
+
+
+def handshake_command():
+    """Return the command "handshake"."""
+    return ('(handshake) handshake password_hash_algo=%s,compression=%s'
+            % (':'.join(PASSWORD_HASH_ALGOS), ':'.join(compressions())))
+
+
+def _escape(value):
+    """Escape commas in a value of command "init"."""
+    return value.replace(',', '\\,')
+
+
+def password_hash(algo, password, salt, iterations):
+    """Return the hash of password (in hexadecimal) for an algorithm."""
+    if algo.startswith('pbkdf2+'):
+        return binascii.hexlify(hashlib.pbkdf2_hmac(
+            algo[len('pbkdf2+'):], password, salt, iterations))
+    return hashlib.new(algo, salt + password).hexdigest()
+
+
+def legacy_init_command(password):
+    """Return the command "init" for WeeChat < 2.9 (without handshake)."""
+    if isinstance(password, unicode):
+        password = password.encode('utf-8')
+    return 'init password=%s,compression=zlib' % _escape(password)
+
+
+def init_command(options, password, client_nonce=None):
+    """
+    Return the command "init" with the password (or its hash) for the
+    options received in answer to the handshake (hashtable).
+    """
+    if isinstance(password, unicode):
+        password = password.encode('utf-8')
+    algo = options.get('password_hash_algo') or 'plain'
+    if algo == 'plain':
+        return 'init password=%s' % _escape(password)
+    if client_nonce is None:
+        client_nonce = os.urandom(16)
+    salt_hex = options.get('nonce', '') + binascii.hexlify(client_nonce)
+    salt = binascii.unhexlify(salt_hex)
+    if algo.startswith('pbkdf2+'):
+        iterations = int(options.get('password_hash_iterations') or 0)
+        return 'init password_hash=%s:%s:%d:%s' % (
+            algo, salt_hex, iterations,
+            password_hash(algo, password, salt, iterations))
+    return 'init password_hash=%s:%s:%s' % (
+        algo, salt_hex, password_hash(algo, password, salt, 0))
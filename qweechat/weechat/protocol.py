@@ -30,10 +30,18 @@
 #     start dev
 #
 
+import array
 import collections
+import io
 import struct
+import traceback
 import zlib
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 if hasattr(collections, 'OrderedDict'):
     # python >= 2.7
     class WeechatDict(collections.OrderedDict):
@@ -45,7 +53,136 @@ else:
     WeechatDict = dict
 
 
-class WeechatObject:
+class WeechatRecordKeys(object):
+    """Keys shared by records (see WeechatRecord)."""
+
+    __slots__ = ('names', 'index')
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+
+
+class WeechatRecord(object):
+    """
+    Compact item of a hdata (see HDATA_COMPACT), used like a WeechatDict:
+    values are stored in a list, keys are shared by all items of the hdata.
+    Adding or removing a key gives its own keys to the record.
+    Records have all methods of a MutableMapping (and are registered as
+    such).
+    """
+
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._keys.index[key]]
+
+    def __setitem__(self, key, value):
+        index = self._keys.index.get(key)
+        if index is None:
+            self._keys = WeechatRecordKeys(self._keys.names + (key,))
+            self._values.append(value)
+        else:
+            self._values[index] = value
+
+    def __delitem__(self, key):
+        index = self._keys.index[key]
+        names = self._keys.names
+        self._keys = WeechatRecordKeys(names[:index] + names[index + 1:])
+        del self._values[index]
+
+    def __contains__(self, key):
+        return key in self._keys.index
+
+    def __iter__(self):
+        return iter(self._keys.names)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        index = self._keys.index.get(key)
+        return default if index is None else self._values[index]
+
+    def pop(self, key, *default):
+        index = self._keys.index.get(key)
+        if index is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self._values[index]
+        del self[key]
+        return value
+
+    def keys(self):
+        return list(self._keys.names)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._keys.names, self._values))
+
+    # other methods of MutableMapping: records can not inherit from it, the
+    # abstract classes have no __slots__ (records would have a __dict__)
+    iterkeys = collections.MutableMapping.iterkeys.__func__
+    itervalues = collections.MutableMapping.itervalues.__func__
+    iteritems = collections.MutableMapping.iteritems.__func__
+    popitem = collections.MutableMapping.popitem.__func__
+    clear = collections.MutableMapping.clear.__func__
+    update = collections.MutableMapping.update.__func__
+    setdefault = collections.MutableMapping.setdefault.__func__
+
+    def __str__(self):
+        return '{%s}' % ', '.join(
+            ['%s: %s' % (repr(key), repr(value))
+             for key, value in self.items()])
+
+    __repr__ = __str__
+
+
+collections.MutableMapping.register(WeechatRecord)
+
+_STRUCT_CHAR = struct.Struct('b')
+_STRUCT_UCHAR = struct.Struct('B')
+_STRUCT_INT = struct.Struct('>i')
+
+# max number of hdata schemas kept in cache
+HDATA_SCHEMAS_MAX = 64
+
+# hdata decoding modes (see Protocol.decode)
+HDATA_ITEMS = 'items'  # list of WeechatDict, decoded immediately
+HDATA_LAZY = 'lazy'  # sequence of LazyHdataItem, decoded on first access
+HDATA_COLUMNS = 'columns'  # columns of values (see HdataSchema.read_columns)
+HDATA_COMPACT = 'compact'  # list of WeechatRecord
+
+# compression flag of messages
+COMPRESSION_OFF = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+# compressed data is uncompressed in chunks, up to a max size
+DECOMPRESS_CHUNK = 65536
+UNCOMPRESSED_MAX = 256 * 1024 * 1024
+
+
+class WeechatObject(object):
+    __slots__ = ('objtype', 'value', 'separator', 'indent', 'separator1')
+
     def __init__(self, objtype, value, separator='\n'):
         self.objtype = objtype
         self.value = value
@@ -88,16 +225,18 @@ class WeechatObject:
         return self._str_value(self.value)
 
     def __str__(self):
-        self._obj_cb = {
+        obj_cb = {
             'hda': self._str_value_hdata,
             'inl': self._str_value_infolist,
         }
         return '%s: %s' % (self.objtype,
-                           self._obj_cb.get(self.objtype,
-                                            self._str_value_other)())
+                           obj_cb.get(self.objtype,
+                                      self._str_value_other)())
 
 
 class WeechatObjects(list):
+    __slots__ = ('separator',)
+
     def __init__(self, separator='\n'):
         self.separator = separator
 
@@ -105,7 +244,10 @@ class WeechatObjects(list):
         return self.separator.join([str(obj) for obj in self])
 
 
-class WeechatMessage:
+class WeechatMessage(object):
+    __slots__ = ('size', 'size_uncompressed', 'compression', 'uncompressed',
+                 'msgid', 'objects')
+
     def __init__(self, size, size_uncompressed, compression, uncompressed,
                  msgid, objects):
         self.size = size
@@ -127,8 +269,306 @@ class WeechatMessage:
                                                           self.objects)
 
 
+class HdataSchema(object):
+    """
+    Reader for the items of a hdata, compiled from its path and keys.
+
+    Each value is read by a step: consecutive fixed-size values (chr/int)
+    are read at once with a precompiled struct.Struct, strings and short
+    values (ptr/tim/lon) are read inline, other types (arr/htb) with the
+    Protocol callbacks.  If the data is truncated, the step falls back to
+    the Protocol callbacks, which handle this case.
+    """
+
+    _fixed_formats = {'chr': 'b', 'int': 'i'}
+    _array_codes = {'chr': 'b', 'int': 'i', 'tim': 'l', 'lon': 'l'}
+    _str_types = ('str', 'buf')
+    _short_types = {
+        'ptr': lambda value: '0x%s' % value,
+        'tim': int,
+        'lon': int,
+    }
+
+    def __init__(self, path, keys):
+        self.path = path.split('/') if path else []
+        self.keys = WeechatDict()
+        for key in keys.split(',') if keys else []:
+            items = key.split(':')
+            self.keys[items[0]] = items[1]
+        self.names = list(self.keys.keys())
+        self.types = list(self.keys.values())
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.record_keys = WeechatRecordKeys(['__path'] + self.names)
+        # steps: list of (kind, struct or conversion, size, types)
+        self._steps = []
+        fixed = []
+        types = ['ptr'] * len(self.path) + list(self.keys.values())
+        for objtype in types + [None]:
+            if objtype in self._fixed_formats:
+                fixed.append(objtype)
+                continue
+            if fixed:
+                fmt = struct.Struct('>%s' % ''.join(
+                    [self._fixed_formats[t] for t in fixed]))
+                self._steps.append(('fixed', fmt, fmt.size, fixed))
+                fixed = []
+            if objtype in self._str_types:
+                self._steps.append(('str', None, 4, [objtype]))
+            elif objtype in self._short_types:
+                self._steps.append(('short', self._short_types[objtype], 1,
+                                    [objtype]))
+            elif objtype:
+                self._steps.append(('other', None, 0, [objtype]))
+
+    def read_values(self, proto, count):
+        """
+        Read count items with the protocol proto (at its position),
+        yield for each item the list of values (path pointers, then keys).
+        """
+        if count <= 0:
+            return
+        view = proto._view
+        end = proto._end
+        pos = proto._pos
+        unpack_int = _STRUCT_INT.unpack_from
+        unpack_uchar = _STRUCT_UCHAR.unpack_from
+        callbacks = proto._obj_cb
+        steps = self._steps
+        for _ in xrange(count):
+            values = []
+            for kind, arg, size, types in steps:
+                if end - pos >= size:
+                    if kind == 'fixed':
+                        values.extend(arg.unpack_from(view, pos))
+                        pos += size
+                        continue
+                    elif kind == 'str':
+                        length = unpack_int(view, pos)[0]
+                        if length < 0:
+                            values.append(None)
+                            pos += 4
+                            continue
+                        if end - pos - 4 >= length:
+                            pos += 4 + length
+                            values.append(
+                                view[pos - length:pos].tobytes() if length
+                                else '')
+                            continue
+                    elif kind == 'short':
+                        length = unpack_uchar(view, pos)[0]
+                        if end - pos - 1 >= length:
+                            pos += 1 + length
+                            values.append(arg(
+                                view[pos - length:pos].tobytes() if length
+                                else ''))
+                            continue
+                proto._pos = pos
+                values.extend([callbacks[t]() for t in types])
+                pos = proto._pos
+            yield values
+        proto._pos = pos
+
+    def read_items(self, proto, count):
+        """Read count items, return a list of WeechatDict."""
+        num_path = len(self.path)
+        names = self.names
+        items = []
+        for values in self.read_values(proto, count):
+            item = WeechatDict()
+            item['__path'] = values[:num_path]
+            for name, value in zip(names, values[num_path:]):
+                item[name] = value
+            items.append(item)
+        return items
+
+    def read_records(self, proto, count):
+        """Read count items, return a list of WeechatRecord."""
+        num_path = len(self.path)
+        keys = self.record_keys
+        records = []
+        for values in self.read_values(proto, count):
+            values[0:num_path] = [values[0:num_path]]
+            records.append(WeechatRecord(keys, values))
+        return records
+
+    def read_columns(self, proto, count):
+        """
+        Read count items, return a WeechatDict with one column (list of
+        values) by key; values of fixed size are stored in an array.array.
+        The column "__path" is a list of columns: one by element of path.
+        """
+        num_path = len(self.path)
+        columns = [[] for _ in range(num_path + len(self.names))]
+        for values in self.read_values(proto, count):
+            for i, value in enumerate(values):
+                columns[i].append(value)
+        result = WeechatDict()
+        result['__path'] = columns[:num_path]
+        for name, objtype, column in zip(self.names, self.types,
+                                         columns[num_path:]):
+            if objtype in self._array_codes:
+                try:
+                    column = array.array(self._array_codes[objtype], column)
+                except (TypeError, OverflowError):
+                    # truncated data or value too big: keep the list
+                    pass
+            result[name] = column
+        return result
+
+
+class LazyHdataItem(collections.MutableMapping):
+    """
+    Item of a hdata decoded in lazy mode.
+
+    Only the offset of the item in the message is known when the message is
+    decoded: the offsets of its values are computed on first access, and
+    each value is decoded (then kept) when it is read.
+    """
+
+    def __init__(self, schema, proto, offset):
+        self._schema = schema
+        self._proto = proto
+        self._offset = offset
+        self._offsets = None
+        self._keys = ['__path'] + schema.names
+        self._values = {}
+
+    def _value_offsets(self):
+        """Return offsets of values in item (after the path pointers)."""
+        if self._offsets is None:
+            proto = self._proto
+            proto._pos = self._offset
+            for _ in self._schema.path:
+                proto._skip_short()
+            self._offsets = []
+            for objtype in self._schema.types:
+                self._offsets.append(proto._pos)
+                proto._skip_cb[objtype]()
+        return self._offsets
+
+    def _decode(self, key):
+        """Decode the value of a key of the schema."""
+        proto = self._proto
+        if key == '__path':
+            proto._pos = self._offset
+            return [proto._obj_ptr() for _ in self._schema.path]
+        index = self._schema.index[key]
+        proto._pos = self._value_offsets()[index]
+        return proto._obj_cb[self._schema.types[index]]()
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            if key not in self._keys:
+                raise
+        value = self._decode(key)
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            self._keys.append(key)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        self._keys.remove(key)
+        self._values.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __str__(self):
+        return '{%s}' % ', '.join(
+            ['%s: %s' % (repr(key), repr(self[key])) for key in self])
+
+
+class LazyHdataItems(collections.Sequence):
+    """Items of a hdata decoded in lazy mode (see LazyHdataItem)."""
+
+    def __init__(self, schema, proto, offsets):
+        self._schema = schema
+        self._proto = proto
+        self._offsets = offsets
+        self._items = [None] * len(offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self._items[index]
+        if item is None:
+            item = LazyHdataItem(self._schema, self._proto,
+                                 self._offsets[index])
+            self._items[index] = item
+        return item
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+class HdataColumnItems(collections.Sequence):
+    """
+    Items of a hdata decoded in columns mode: each item is built (as a
+    WeechatDict) from the columns when it is read.
+    """
+
+    def __init__(self, columns):
+        self._paths = columns['__path']
+        self._columns = [(name, column) for name, column in columns.items()
+                         if name != '__path']
+        self._count = len(self._paths[0]) if self._paths else (
+            len(self._columns[0][1]) if self._columns else 0)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('hdata item index out of range')
+        item = WeechatDict()
+        item['__path'] = [pointers[index] for pointers in self._paths]
+        for name, column in self._columns:
+            item[name] = column[index]
+        return item
+
+    def __len__(self):
+        return self._count
+
+
+def hdata_rows_by_pointer(columns, path_index=0):
+    """
+    Group rows of hdata columns by pointer (for example the buffer in
+    "__path"), return a WeechatDict {pointer: [row indexes]}.
+    """
+    rows = WeechatDict()
+    for row, pointer in enumerate(columns['__path'][path_index]):
+        indexes = rows.get(pointer)
+        if indexes is None:
+            rows[pointer] = [row]
+        else:
+            indexes.append(row)
+    return rows
+
+
 class Protocol:
-    """Decode binary message received from WeeChat/relay."""
+    """
+    Decode binary message received from WeeChat/relay.
+
+    The message is read in place: a memoryview on the data is walked with a
+    read offset, so decoding a field never copies the rest of the message.
+
+    Hdata readers are compiled once per path/keys and shared by all
+    instances (see HdataSchema).
+    """
+
+    _hdata_schemas = {}
 
     def __init__(self):
         self._obj_cb = {
@@ -145,50 +585,66 @@ class Protocol:
             'inl': self._obj_infolist,
             'arr': self._obj_array,
         }
+        self._skip_cb = {
+            'chr': self._skip_char,
+            'int': self._skip_int,
+            'lon': self._skip_short,
+            'str': self._skip_str,
+            'buf': self._skip_str,
+            'ptr': self._skip_short,
+            'tim': self._skip_short,
+            'htb': self._skip_hashtable,
+            'arr': self._skip_array,
+        }
+        self._hdata_mode = HDATA_ITEMS
+        self._view = None
+        self._pos = 0
+        self._end = 0
 
     def _obj_type(self):
         """Read type in data (3 chars)."""
-        if len(self.data) < 3:
-            self.data = ''
+        pos = self._pos
+        if self._end - pos < 3:
+            self._pos = self._end
             return ''
-        objtype = str(self.data[0:3])
-        self.data = self.data[3:]
-        return objtype
+        self._pos = pos + 3
+        return self._view[pos:pos + 3].tobytes()
 
     def _obj_len_data(self, length_size):
         """Read length (1 or 4 bytes), then value with this length."""
-        if len(self.data) < length_size:
-            self.data = ''
+        if self._end - self._pos < length_size:
+            self._pos = self._end
             return None
         if length_size == 1:
-            length = struct.unpack('B', self.data[0:1])[0]
-            self.data = self.data[1:]
+            length = _STRUCT_UCHAR.unpack_from(self._view, self._pos)[0]
+            self._pos += 1
         else:
             length = self._obj_int()
         if length < 0:
             return None
         if length > 0:
-            value = self.data[0:length]
-            self.data = self.data[length:]
+            pos = self._pos
+            self._pos = min(pos + length, self._end)
+            value = self._view[pos:self._pos].tobytes()
         else:
             value = ''
         return value
 
     def _obj_char(self):
         """Read a char in data."""
-        if len(self.data) < 1:
+        if self._end - self._pos < 1:
             return 0
-        value = struct.unpack('b', self.data[0:1])[0]
-        self.data = self.data[1:]
+        value = _STRUCT_CHAR.unpack_from(self._view, self._pos)[0]
+        self._pos += 1
         return value
 
     def _obj_int(self):
         """Read an integer in data (4 bytes)."""
-        if len(self.data) < 4:
-            self.data = ''
+        if self._end - self._pos < 4:
+            self._pos = self._end
             return 0
-        value = struct.unpack('>i', self.data[0:4])[0]
-        self.data = self.data[4:]
+        value = _STRUCT_INT.unpack_from(self._view, self._pos)[0]
+        self._pos += 4
         return value
 
     def _obj_long(self):
@@ -196,14 +652,11 @@ class Protocol:
         value = self._obj_len_data(1)
         if value is None:
             return None
-        return int(str(value))
+        return int(value)
 
     def _obj_str(self):
         """Read a string in data (length on 4 bytes + content)."""
-        value = self._obj_len_data(4)
-        if value is None:
-            return None
-        return str(value)
+        return self._obj_len_data(4)
 
     def _obj_buffer(self):
         """Read a buffer in data (length on 4 bytes + data)."""
@@ -214,14 +667,76 @@ class Protocol:
         value = self._obj_len_data(1)
         if value is None:
             return None
-        return '0x%s' % str(value)
+        return '0x%s' % value
 
     def _obj_time(self):
         """Read a time in data (length on 1 byte + value as string)."""
         value = self._obj_len_data(1)
         if value is None:
             return None
-        return int(str(value))
+        return int(value)
+
+    def _skip_len_data(self, length_size):
+        """Skip length (1 or 4 bytes), then value with this length."""
+        if self._end - self._pos < length_size:
+            self._pos = self._end
+            return
+        if length_size == 1:
+            length = _STRUCT_UCHAR.unpack_from(self._view, self._pos)[0]
+            self._pos += 1
+        else:
+            length = self._obj_int()
+        if length > 0:
+            self._pos = min(self._pos + length, self._end)
+
+    def _skip_char(self):
+        """Skip a char in data."""
+        if self._end - self._pos >= 1:
+            self._pos += 1
+
+    def _skip_int(self):
+        """Skip an integer in data."""
+        self._pos = min(self._pos + 4, self._end)
+
+    def _skip_short(self):
+        """Skip a value with length on 1 byte (long, pointer, time)."""
+        self._skip_len_data(1)
+
+    def _skip_str(self):
+        """Skip a value with length on 4 bytes (string, buffer)."""
+        self._skip_len_data(4)
+
+    def _skip_hashtable(self):
+        """Skip a hashtable in data."""
+        type_keys = self._obj_type()
+        type_values = self._obj_type()
+        count = self._obj_count()
+        for _ in xrange(count):
+            if self._pos >= self._end:
+                break
+            self._skip_cb[type_keys]()
+            self._skip_cb[type_values]()
+
+    def _skip_array(self):
+        """Skip an array of values in data."""
+        type_values = self._obj_type()
+        count_values = self._obj_count()
+        for _ in xrange(count_values):
+            if self._pos >= self._end:
+                break
+            self._skip_cb[type_values]()
+
+    def _obj_count(self):
+        """
+        Read a count of items (hdata, hashtable, array) in data.
+        Raise ValueError if it is bigger than the number of bytes left:
+        each item has at least one byte, so data is corrupt.
+        """
+        count = self._obj_int()
+        if count > self._end - self._pos:
+            raise ValueError('invalid count of items: %d (%d bytes left)'
+                             % (count, self._end - self._pos))
+        return count
 
     def _obj_hashtable(self):
         """
@@ -230,9 +745,9 @@ class Protocol:
         """
         type_keys = self._obj_type()
         type_values = self._obj_type()
-        count = self._obj_int()
+        count = self._obj_count()
         hashtable = WeechatDict()
-        for _ in range(count):
+        for _ in xrange(count):
             key = self._obj_cb[type_keys]()
             value = self._obj_cb[type_values]()
             hashtable[key] = value
@@ -242,32 +757,54 @@ class Protocol:
         """Read a hdata in data."""
         path = self._obj_str()
         keys = self._obj_str()
-        count = self._obj_int()
-        list_path = path.split('/') if path else []
-        list_keys = keys.split(',') if keys else []
-        keys_types = []
-        dict_keys = WeechatDict()
-        for key in list_keys:
-            items = key.split(':')
-            keys_types.append(items)
-            dict_keys[items[0]] = items[1]
-        items = []
-        for _ in range(count):
-            item = WeechatDict()
-            item['__path'] = []
-            pointers = []
-            for _ in enumerate(list_path):
-                pointers.append(self._obj_ptr())
-            for key, objtype in keys_types:
-                item[key] = self._obj_cb[objtype]()
-            item['__path'] = pointers
-            items.append(item)
-        return {
-            'path': list_path,
-            'keys': dict_keys,
+        count = self._obj_count()
+        schema = self._hdata_schema(path, keys)
+        hdata = {
+            'path': list(schema.path),
+            'keys': WeechatDict(schema.keys),
             'count': count,
-            'items': items,
         }
+        if self._hdata_mode == HDATA_LAZY:
+            hdata['items'] = self._lazy_hdata_items(schema, count)
+        elif self._hdata_mode == HDATA_COLUMNS:
+            hdata['columns'] = schema.read_columns(self, count)
+            hdata['items'] = HdataColumnItems(hdata['columns'])
+        elif self._hdata_mode == HDATA_COMPACT:
+            hdata['items'] = schema.read_records(self, count)
+        else:
+            hdata['items'] = schema.read_items(self, count)
+        return hdata
+
+    def _lazy_hdata_items(self, schema, count):
+        """Skip items of a hdata and return them as lazy items."""
+        offsets = []
+        for _ in xrange(count):
+            if self._pos >= self._end:
+                # truncated data: the items left are read at the end of
+                # data, so their values are empty (like in other modes)
+                offsets.extend([self._end] * (count - len(offsets)))
+                break
+            offsets.append(self._pos)
+            for _ in schema.path:
+                self._skip_short()
+            for objtype in schema.types:
+                self._skip_cb[objtype]()
+        # the items are decoded later by a protocol of their own
+        proto = Protocol()
+        proto._view = self._view
+        proto._end = self._end
+        return LazyHdataItems(schema, proto, offsets)
+
+    def _hdata_schema(self, path, keys):
+        """Return the compiled schema for a hdata (cached by path/keys)."""
+        signature = (path, keys)
+        schema = Protocol._hdata_schemas.get(signature)
+        if schema is None:
+            if len(Protocol._hdata_schemas) >= HDATA_SCHEMAS_MAX:
+                Protocol._hdata_schemas.clear()
+            schema = HdataSchema(path, keys)
+            Protocol._hdata_schemas[signature] = schema
+        return schema
 
     def _obj_info(self):
         """Read an info in data."""
@@ -297,44 +834,218 @@ class Protocol:
     def _obj_array(self):
         """Read an array of values in data."""
         type_values = self._obj_type()
-        count_values = self._obj_int()
+        count_values = self._obj_count()
         values = []
-        for _ in range(count_values):
+        for _ in xrange(count_values):
             values.append(self._obj_cb[type_values]())
         return values
 
-    def decode(self, data, separator='\n'):
-        """Decode binary data and return list of objects."""
-        self.data = data
-        size = len(self.data)
+    def _decompress(self, view, compression, max_size):
+        """
+        Uncompress data of a message (after its header), in chunks.
+        Raise ValueError if uncompressed data is bigger than max_size.
+        """
+        if compression == COMPRESSION_ZSTD:
+            return self._decompress_zstd(view, max_size)
+        if compression != COMPRESSION_ZLIB:
+            raise ValueError('unknown compression: %d' % compression)
+        decompressor = zlib.decompressobj()
+        data = bytearray()
+        for pos in range(5, len(view), DECOMPRESS_CHUNK):
+            chunk = view[pos:pos + DECOMPRESS_CHUNK].tobytes()
+            while chunk:
+                # never uncompress more than max_size (+1 to detect it)
+                data += decompressor.decompress(chunk,
+                                                max_size - len(data) + 1)
+                if len(data) > max_size:
+                    raise ValueError('uncompressed message is too big '
+                                     '(more than %d bytes)' % max_size)
+                chunk = decompressor.unconsumed_tail
+        data += decompressor.flush()
+        if len(data) > max_size:
+            raise ValueError('uncompressed message is too big '
+                             '(more than %d bytes)' % max_size)
+        return data
+
+    def _decompress_zstd(self, view, max_size):
+        """Uncompress data of a message compressed with zstd."""
+        if not zstandard:
+            raise ValueError('zstd compression is not supported '
+                             '(python module "zstandard" is missing)')
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(view[5:].tobytes()))
+        data = bytearray()
+        while True:
+            chunk = reader.read(DECOMPRESS_CHUNK)
+            if not chunk:
+                break
+            data += chunk
+            if len(data) > max_size:
+                raise ValueError('uncompressed message is too big '
+                                 '(more than %d bytes)' % max_size)
+        return data
+
+    def decode(self, data, separator='\n', hdata_mode=HDATA_ITEMS,
+               keep_uncompressed=True, max_uncompressed=UNCOMPRESSED_MAX):
+        """
+        Decode binary data and return list of objects.
+
+        Data can be a string, a bytearray or a memoryview: it is not copied
+        (except to uncompress it), and no reference to it is kept once the
+        message is decoded.  If keep_uncompressed is False, the message has
+        no copy of data (uncompressed is None).
+
+        Compressed data is uncompressed in chunks, and decoded directly;
+        ValueError is raised if uncompressed data is bigger than
+        max_uncompressed bytes.
+
+        With hdata_mode HDATA_LAZY, the items of hdata are decoded on first
+        access; the (immutable) data is then kept by the items.
+        With hdata_mode HDATA_COLUMNS, the hdata has also a "columns" entry,
+        and its items are built from the columns when they are read.
+        With hdata_mode HDATA_COMPACT, the items of hdata are WeechatRecord.
+        The mode can be a dict {msgid: mode}; the mode for other messages is
+        the one with key None (HDATA_ITEMS if not set).
+        """
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        size = len(view)
         size_uncompressed = size
         uncompressed = None
+        # skip length and compression flag
+        start = 5
         # uncompress data (if it is compressed)
-        compression = struct.unpack('b', self.data[4:5])[0]
+        compression = _STRUCT_CHAR.unpack_from(view, 4)[0]
         if compression:
-            uncompressed = zlib.decompress(self.data[5:])
-            size_uncompressed = len(uncompressed) + 5
-            uncompressed = '%s%s%s' % (struct.pack('>i', size_uncompressed),
-                                       struct.pack('b', 0), uncompressed)
-            self.data = uncompressed
+            payload = self._decompress(view, compression, max_uncompressed)
+            size_uncompressed = len(payload) + 5
+            if keep_uncompressed:
+                # message as if it was not compressed (for debug)
+                uncompressed = '%s%s%s' % (
+                    struct.pack('>i', size_uncompressed),
+                    struct.pack('b', 0), payload)
+            view = memoryview(payload)
+            start = 0
         else:
-            uncompressed = self.data[:]
-        # skip length and compression flag
-        self.data = self.data[5:]
-        # read id
-        msgid = self._obj_str()
-        if msgid is None:
-            msgid = ''
-        # read objects
-        objects = WeechatObjects(separator=separator)
-        while len(self.data) > 0:
-            objtype = self._obj_type()
-            value = self._obj_cb[objtype]()
-            objects.append(WeechatObject(objtype, value, separator=separator))
+            modes = (hdata_mode.values() if isinstance(hdata_mode, dict)
+                     else [hdata_mode])
+            lazy = HDATA_LAZY in modes
+            if isinstance(data, str):
+                uncompressed = data
+            elif keep_uncompressed or lazy:
+                uncompressed = view.tobytes()
+                if lazy:
+                    view = memoryview(uncompressed)
+            if not keep_uncompressed:
+                uncompressed = None
+        self._hdata_mode = hdata_mode
+        self._view = view
+        self._end = len(view)
+        self._pos = start
+        try:
+            # read id
+            msgid = self._obj_str()
+            if msgid is None:
+                msgid = ''
+            if isinstance(hdata_mode, dict):
+                self._hdata_mode = hdata_mode.get(
+                    msgid, hdata_mode.get(None, HDATA_ITEMS))
+            # read objects
+            objects = WeechatObjects(separator=separator)
+            while self._pos < self._end:
+                objtype = self._obj_type()
+                value = self._obj_cb[objtype]()
+                objects.append(WeechatObject(objtype, value,
+                                             separator=separator))
+        finally:
+            self._view = None
         return WeechatMessage(size, size_uncompressed, compression,
                               uncompressed, msgid, objects)
 
 
+class MessageDecodeError(ValueError):
+    """
+    Error while decoding a message: details has the traceback of the
+    original error (which is not kept, see MessageDecoder).
+    """
+
+    def __init__(self, message, details):
+        ValueError.__init__(self, message)
+        self.details = details
+
+
+class MessageDecoder(object):
+    """
+    Incremental decoder of the stream of binary messages received from
+    WeeChat/relay: data is fed as it is received, and complete messages
+    are decoded in place in a read buffer reused for all messages.
+    """
+
+    def __init__(self, separator='\n', hdata_mode=HDATA_ITEMS,
+                 keep_uncompressed=False, max_uncompressed=UNCOMPRESSED_MAX):
+        self.separator = separator
+        self.hdata_mode = hdata_mode
+        self.keep_uncompressed = keep_uncompressed
+        self.max_uncompressed = max_uncompressed
+        self._protocol = Protocol()
+        self._buffer = bytearray()
+        self._pos = 0
+
+    def reset(self):
+        """Drop data received (for example on a new connection)."""
+        del self._buffer[:]
+        self._pos = 0
+
+    def pending(self):
+        """Return the number of bytes received, not yet decoded."""
+        return len(self._buffer) - self._pos
+
+    def feed(self, data):
+        """
+        Add data received (string or bytearray), return an iterator on
+        messages (WeechatMessage) that are now complete.
+        """
+        if self._pos > 0:
+            # drop the messages already decoded
+            del self._buffer[:self._pos]
+            self._pos = 0
+        self._buffer.extend(data)
+        return self._messages()
+
+    def _messages(self):
+        """Decode and yield complete messages in buffer."""
+        while len(self._buffer) - self._pos >= 4:
+            length = _STRUCT_INT.unpack_from(self._buffer, self._pos)[0]
+            if length < 5:
+                raise ValueError('invalid message length: %d' % length)
+            if len(self._buffer) - self._pos < length:
+                # partial message, just wait for end of message
+                break
+            view = memoryview(self._buffer)[self._pos:self._pos + length]
+            # the message is dropped, even if it can not be decoded
+            self._pos += length
+            error = None
+            try:
+                message = self._protocol.decode(
+                    view, separator=self.separator,
+                    hdata_mode=self.hdata_mode,
+                    keep_uncompressed=self.keep_uncompressed,
+                    max_uncompressed=self.max_uncompressed)
+            except Exception as exc:
+                # the traceback keeps the frames of decode, with views on
+                # the buffer: another error is raised without them, so
+                # that the buffer can be resized (or reset)
+                error = MessageDecodeError(
+                    '%s: %s' % (exc.__class__.__name__, exc),
+                    traceback.format_exc())
+                del exc
+            finally:
+                # release the buffer, so that it can be resized
+                del view
+            if error:
+                raise error
+            yield message
+
+
 def hex_and_ascii(data, bytes_per_line=10):
     """Convert a QByteArray to hex + ascii output."""
     num_lines = ((len(data) - 1) // bytes_per_line) + 1
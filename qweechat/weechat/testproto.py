@@ -31,7 +31,6 @@ import os
 import select
 import shlex
 import socket
-import struct
 import sys
 import time
 import traceback
@@ -49,6 +48,9 @@ class TestProto(object):
         self.args = args
         self.sock = None
         self.has_quit = False
+        self.decoder = protocol.MessageDecoder(
+            separator='\n' if self.args.debug > 0 else ', ',
+            keep_uncompressed=self.args.debug >= 2)
         self.address = '{self.args.hostname}/{self.args.port} ' \
             '(IPv{0})'.format(6 if self.args.ipv6 else 4, self=self)
 
@@ -86,25 +88,24 @@ class TestProto(object):
             return False
         return True
 
-    def decode(self, message):
+    def decode(self, data):
         """
-        Decode a binary message received from WeeChat/relay.
+        Decode binary messages received from WeeChat/relay (data can
+        contain partial messages, completed by next data received).
         Return True if OK, False if error.
         """
         try:
-            proto = protocol.Protocol()
-            msgd = proto.decode(message,
-                                separator='\n' if self.args.debug > 0
-                                else ', ')
-            print('')
-            if self.args.debug >= 2 and msgd.uncompressed:
-                # display raw message
-                print('\x1b[32m--> message uncompressed ({0} bytes):\n'
-                      '{1}\x1b[0m'
-                      ''.format(msgd.size_uncompressed,
-                                protocol.hex_and_ascii(msgd.uncompressed, 20)))
-            # display decoded message
-            print('\x1b[32m--> {0}\x1b[0m'.format(msgd))
+            for msgd in self.decoder.feed(data):
+                print('')
+                if self.args.debug >= 2 and msgd.uncompressed:
+                    # display raw message
+                    print('\x1b[32m--> message uncompressed ({0} bytes):\n'
+                          '{1}\x1b[0m'
+                          ''.format(msgd.size_uncompressed,
+                                    protocol.hex_and_ascii(msgd.uncompressed,
+                                                           20)))
+                # display decoded message
+                print('\x1b[32m--> {0}\x1b[0m'.format(msgd))
         except:
             traceback.print_exc()
             print('Error while decoding message from WeeChat')
@@ -137,7 +138,6 @@ class TestProto(object):
         if self.has_quit:
             return 0
         message = ''
-        recvbuf = ''
         prompt = '\x1b[36mrelay> \x1b[0m'
         sys.stdout.write(prompt)
         sys.stdout.flush()
@@ -160,25 +160,8 @@ class TestProto(object):
                     else:
                         buf = _file.recv(4096)
                         if buf:
-                            recvbuf += buf
-                            while len(recvbuf) >= 4:
-                                remainder = None
-                                length = struct.unpack('>i', recvbuf[0:4])[0]
-                                if len(recvbuf) < length:
-                                    # partial message, just wait for the
-                                    # end of message
-                                    break
-                                # more than one message?
-                                if length < len(recvbuf):
-                                    # save beginning of another message
-                                    remainder = recvbuf[length:]
-                                    recvbuf = recvbuf[0:length]
-                                if not self.decode(recvbuf):
-                                    return 5
-                                if remainder:
-                                    recvbuf = remainder
-                                else:
-                                    recvbuf = ''
+                            if not self.decode(buf):
+                                return 5
                             sys.stdout.write(prompt + message)
                             sys.stdout.flush()
         except:
@@ -53,6 +53,9 @@ setup(
         ],
         'console_scripts': [
             'qweechat-testproto = qweechat.weechat.testproto:main',
+            'qweechat-benchmark = qweechat.weechat.benchmark:main',
+            'qweechat-benchmark-chat = qweechat.benchmark_chat:main',
+            'qweechat-fakerelay = qweechat.weechat.fakerelay:main',
         ]
     }
 )
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of QWeeChat, run with:  python -m unittest discover -s tests -t .
+
+Modules of QWeeChat are imported like in the application (directory
+"qweechat" in path).  Tests using Qt are skipped if PyQt4/PySide is not
+installed.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'qweechat'))
+
+try:
+    import qt_compat
+except ImportError:
+    qt_compat = None
+
+_app = None
+
+
+def qt_app():
+    """Return the Qt application (created on first call)."""
+    global _app
+    if _app is None:
+        QtGui = qt_compat.import_module('QtGui')
+        _app = QtGui.QApplication.instance() or QtGui.QApplication([])
+    return _app
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of chat area (chat.py)."""
+
+import unittest
+
+from tests import qt_compat, qt_app
+
+
+def lines(start, count, prefix='nick'):
+    """Return lines (time, prefix, text, forcecolor) numbered from start."""
+    return [(1500000000 + i, prefix, 'message %d' % i, None)
+            for i in range(start, start + count)]
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class ChatTextEditIndentTestCase(unittest.TestCase):
+    """Tests of columns of indent mode in ChatTextEdit."""
+
+    def setUp(self):
+        qt_app()
+        import chat
+        self.chat = chat.ChatTextEdit(debug=False)
+        self.chat.indent = True
+
+    def _columns(self):
+        """Return (tab positions, left margin) of lines displayed."""
+        columns = []
+        block = self.chat.document().begin()
+        while block.isValid():
+            if block.text():
+                block_format = block.blockFormat()
+                columns.append(
+                    (tuple([tab.position
+                            for tab in block_format.tabPositions()]),
+                     block_format.leftMargin()))
+            block = block.next()
+        return columns
+
+    def _realign(self):
+        """Align all lines (like timer does when application is idle)."""
+        while self.chat._realign_timer.isActive():
+            self.chat._realign_timer.stop()
+            self.chat._realign_lines()
+
+    def test_columns_grow(self):
+        # lines displayed before and after a wider prefix are aligned on
+        # the same columns
+        self.chat.display_many(lines(0, 500, 'a'))
+        self.chat.display_many(lines(500, 10, 'a_very_long_nick'))
+        self.chat.display_many(lines(510, 10, 'b'))
+        columns = self._columns()
+        self.assertEqual(len(columns), 520)
+        # lines inserted after the new columns are aligned at once
+        self.assertEqual(set(columns[500:]), set([columns[-1]]))
+        self._realign()
+        columns = self._columns()
+        self.assertEqual(set(columns), set([columns[-1]]))
+        self.assertEqual(len(columns[-1][0]), 2)
+        self.assertGreater(columns[-1][1], 0)
+
+    def test_indent_disabled(self):
+        # lines displayed without indent mode are not aligned
+        self.chat.indent = False
+        self.chat.display_many(lines(0, 5))
+        self.chat.indent = True
+        self.chat.display_many(lines(5, 5, 'a'))
+        self.chat.display_many(lines(10, 5, 'a_very_long_nick'))
+        self._realign()
+        columns = self._columns()
+        self.assertEqual(set(columns[:5]), set([((), 0)]))
+        self.assertEqual(set(columns[5:]), set([columns[-1]]))
+
+    def test_clear(self):
+        self.chat.display_many(lines(0, 5, 'a'))
+        self.chat.display_many(lines(5, 5, 'a_very_long_nick'))
+        self.chat.clear()
+        self.assertFalse(self.chat._realign_timer.isActive())
+        self.chat.display_many(lines(0, 5, 'b'))
+        self._realign()
+        columns = self._columns()
+        self.assertEqual(set(columns), set([columns[-1]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
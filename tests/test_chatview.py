@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of chat area for long buffers (chatview.py)."""
+
+import datetime
+import unittest
+
+from tests import qt_compat, qt_app
+
+
+def lines(start, count):
+    """Return lines (time, prefix, text, forcecolor) numbered from start."""
+    return [(1500000000 + i, 'nick', 'message %d' % i, None)
+            for i in range(start, start + count)]
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class ChatLineModelTestCase(unittest.TestCase):
+    """Tests of ChatLineModel."""
+
+    def setUp(self):
+        qt_app()
+        import chatview
+        self.model = chatview.ChatLineModel()
+        self.inserted = []
+        self.removed = []
+        self.model.rowsInserted.connect(
+            lambda parent, first, last: self.inserted.append((first, last)))
+        self.model.rowsRemoved.connect(
+            lambda parent, first, last: self.removed.append((first, last)))
+
+    def test_append_lines(self):
+        self.model.append_lines(lines(0, 3))
+        self.model.append_lines(lines(3, 2))
+        self.model.append_lines([])
+        self.assertEqual(self.model.rowCount(), 5)
+        self.assertEqual(self.model.line(4), lines(4, 1)[0])
+        self.assertEqual(self.inserted, [(0, 2), (3, 4)])
+
+    def test_max_lines(self):
+        self.model.max_lines = 5
+        self.model.append_lines(lines(0, 4))
+        self.model.append_lines(lines(4, 4))
+        self.assertEqual(self.model.rowCount(), 5)
+        self.assertEqual([self.model.line(row) for row in range(5)],
+                         lines(3, 5))
+        self.assertEqual(self.removed, [(0, 2)])
+
+    def test_remove_first(self):
+        self.model.append_lines(lines(0, 4))
+        self.model.remove_first(10)
+        self.model.remove_first(1)
+        self.assertEqual(self.model.rowCount(), 0)
+        self.assertEqual(self.removed, [(0, 3)])
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class ChatListViewTestCase(unittest.TestCase):
+    """Tests of ChatListView (text of lines, without painting)."""
+
+    def setUp(self):
+        self.app = qt_app()
+        import chatview
+        self.view = chatview.ChatListView(debug=False)
+        self.view.display_many(lines(0, 3) +
+                               [(1500000003, 'nick', '<b>&', None)])
+
+    def _time(self, row):
+        return datetime.datetime.fromtimestamp(
+            1500000000 + row).strftime(self.view.time_format)
+
+    def test_to_html(self):
+        html = self.view.toHtml()
+        self.assertTrue(html.startswith('<pre>'))
+        self.assertIn('%s nick message 1\n' % self._time(1), html)
+        self.assertIn('%s nick &lt;b&gt;&amp;</pre>' % self._time(3), html)
+
+    def test_max_lines(self):
+        model = self.view.model()
+        self.view.set_max_lines(2)
+        self.assertEqual(model.rowCount(), 2)
+        self.view.display_many(lines(4, 3))
+        self.assertEqual(model.rowCount(), 2)
+        self.assertEqual(model.line(1), lines(6, 1)[0])
+        self.view.set_max_lines(0)
+        self.view.display_many(lines(7, 3))
+        self.assertEqual(model.rowCount(), 5)
+
+    def test_copy_selected_lines(self):
+        QtGui = qt_compat.import_module('QtGui')
+        model = self.view.model()
+        self.view.selectionModel().select(
+            QtGui.QItemSelection(model.index(1), model.index(2)),
+            QtGui.QItemSelectionModel.Select)
+        self.assertTrue(self.view.has_selection())
+        self.view.copy()
+        self.assertEqual(self.app.clipboard().text(),
+                         '%s nick message 1\n%s nick message 2'
+                         % (self._time(1), self._time(2)))
+        self.view.indent = True
+        self.view.copy()
+        self.assertEqual(self.app.clipboard().text(),
+                         '%s <nick> message 1\n%s <nick> message 2'
+                         % (self._time(1), self._time(2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
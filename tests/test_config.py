@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of configuration (config.py)."""
+
+import ConfigParser
+import unittest
+
+import config
+
+
+class ConfigTestCase(unittest.TestCase):
+    """Tests of options of configuration."""
+
+    def _config(self, options=()):
+        """Return a configuration with default options (and options)."""
+        cfg = ConfigParser.RawConfigParser()
+        for section in config.CONFIG_DEFAULT_SECTIONS:
+            cfg.add_section(section)
+        for option, value in config.CONFIG_DEFAULT_OPTIONS + tuple(options):
+            section, name = option.split('.', 1)
+            cfg.set(section, name, value)
+        return cfg
+
+    def test_chat_view_max_lines(self):
+        self.assertEqual(config.chat_view_max_lines(self._config()),
+                         config.CONFIG_DEFAULT_CHAT_VIEW_MAX_LINES)
+        self.assertEqual(config.CONFIG_DEFAULT_CHAT_VIEW_MAX_LINES, 10000)
+        for value, max_lines in (('500', 500), ('0', 0), ('-1', 0),
+                                 ('', 10000), ('abc', 10000)):
+            cfg = self._config([('look.chat_view_max_lines', value)])
+            self.assertEqual(config.chat_view_max_lines(cfg), max_lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of encoding of messages (weechat/encoder.py)."""
+
+import unittest
+
+import weechat.protocol as protocol
+import weechat.encoder as encoder
+
+
+class EncoderTestCase(unittest.TestCase):
+    """Tests of Encoder (messages are decoded with Protocol)."""
+
+    def _round_trip(self, objtype, value):
+        """Encode an object in a message, return value decoded."""
+        message = encoder.Encoder().encode('test', [(objtype, value)])
+        objects = protocol.Protocol().decode(message).objects
+        self.assertEqual([obj.objtype for obj in objects], [objtype])
+        return objects[0].value
+
+    def test_pointer(self):
+        self.assertEqual(self._round_trip('ptr', '0x1a2b'), '0x1a2b')
+        self.assertEqual(self._round_trip('ptr', 0x1a2b), '0x1a2b')
+
+    def test_null_pointer(self):
+        self.assertEqual(self._round_trip('ptr', None), '0x0')
+        self.assertEqual(self._round_trip('ptr', '0x0'), '0x0')
+
+    def test_long(self):
+        self.assertEqual(self._round_trip('lon', 2 ** 40), 2 ** 40)
+        self.assertEqual(self._round_trip('lon', -5), -5)
+        self.assertEqual(self._round_trip('lon', None), 0)
+
+    def test_time(self):
+        self.assertEqual(self._round_trip('tim', 1321993456), 1321993456)
+        self.assertEqual(self._round_trip('tim', None), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
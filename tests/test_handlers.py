@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of registry of handlers of messages (handlers.py)."""
+
+import unittest
+
+from tests import qt_compat, qt_app
+
+
+class FakeMessage(object):
+    """Message with an id."""
+
+    def __init__(self, msgid):
+        self.msgid = msgid
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class HandlerRegistryTestCase(unittest.TestCase):
+    """Tests of HandlerRegistry (handlers not threaded)."""
+
+    def setUp(self):
+        qt_app()
+        import handlers
+        self.registry = handlers.HandlerRegistry()
+        self.calls = []
+
+    def _handler(self, name):
+        """Return a callback recording its calls."""
+        return lambda message: self.calls.append((name, message.msgid))
+
+    def test_dispatch(self):
+        self.registry.register('_buffer_opened', self._handler('opened'),
+                               name='opened')
+        self.registry.register('_buffer_', self._handler('buffer'),
+                               prefix=True, name='buffer')
+        self.registry.register('_buffer_line', self._handler('line'),
+                               prefix=True, name='line')
+        for msgid in ('_buffer_opened', '_buffer_closing',
+                      '_buffer_line_added', 'unknown'):
+            self.registry.dispatch(FakeMessage(msgid))
+        self.assertEqual(self.calls, [('opened', '_buffer_opened'),
+                                      ('buffer', '_buffer_closing'),
+                                      ('line', '_buffer_line_added')])
+        stats = dict((name, calls)
+                     for name, calls, _ in self.registry.stats())
+        self.assertEqual(stats, {'opened': 1, 'buffer': 1, 'line': 1})
+
+    def test_unregister_self(self):
+        # a handler unregistered while the message is dispatched: next
+        # handlers are called, the handler is not called for next messages
+        handlers = []
+
+        def once(message):
+            self.calls.append(('once', message.msgid))
+            self.registry.unregister(handlers[0])
+
+        handlers.append(self.registry.register('test', once))
+        self.registry.register('test', self._handler('second'))
+        self.registry.register('test', self._handler('third'))
+        self.registry.dispatch(FakeMessage('test'))
+        self.registry.dispatch(FakeMessage('test'))
+        self.assertEqual(self.calls, [('once', 'test'), ('second', 'test'),
+                                      ('third', 'test'), ('second', 'test'),
+                                      ('third', 'test')])
+
+    def test_register_in_dispatch(self):
+        # a handler registered while the message is dispatched is called
+        # for next messages only
+        def register(message):
+            self.calls.append(('register', message.msgid))
+            self.registry.register('test', self._handler('new'))
+
+        handler = self.registry.register('test', register)
+        self.registry.dispatch(FakeMessage('test'))
+        self.assertEqual(self.calls, [('register', 'test')])
+        self.registry.unregister(handler)
+        self.registry.dispatch(FakeMessage('test'))
+        self.assertEqual(self.calls, [('register', 'test'), ('new', 'test')])
+
+    def test_handlers(self):
+        handler = self.registry.register('test', self._handler('test'))
+        self.assertEqual(self.registry.handlers('test'), (handler,))
+        self.assertEqual(self.registry.handlers('other'), ())
+        self.registry.unregister(handler)
+        self.assertEqual(self.registry.handlers('test'), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of hotlist (hotlist.py)."""
+
+import unittest
+
+from tests import qt_compat, qt_app
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class HotlistTestCase(unittest.TestCase):
+    """Tests of Hotlist."""
+
+    def setUp(self):
+        qt_app()
+        import hotlist
+        self.hotlist_module = hotlist
+        self.hotlist = hotlist.Hotlist()
+        self.changed = []
+        self.hotlist.hotlistChanged.connect(self.changed.append)
+
+    def test_add(self):
+        self.hotlist.add('0x1', self.hotlist_module.PRIORITY_MESSAGE)
+        self.hotlist.add('0x1', self.hotlist_module.PRIORITY_HIGHLIGHT)
+        self.assertEqual(self.hotlist.counts('0x1'), (0, 1, 0, 1))
+        self.assertEqual(self.changed, [['0x1'], ['0x1']])
+
+    def test_snapshot_diff(self):
+        self.hotlist.apply_snapshot({'0x1': (1, 0, 0, 0),
+                                     '0x2': (0, 2, 0, 0)})
+        self.hotlist.apply_snapshot({'0x1': (1, 0, 0, 0)})
+        self.assertEqual(self.changed[-1], ['0x2'])
+        self.assertNotIn('0x2', self.hotlist)
+
+    def test_read_buffer(self):
+        # lines of the buffer read (displayed in the active window) do not
+        # make it hot
+        self.hotlist.set_read('0x1')
+        self.hotlist.add('0x1', self.hotlist_module.PRIORITY_MESSAGE)
+        self.hotlist.apply_snapshot({'0x1': (0, 1, 0, 0)})
+        self.assertNotIn('0x1', self.hotlist)
+        self.assertEqual(self.changed, [])
+        # window inactive: no buffer read
+        self.hotlist.set_read(None)
+        self.hotlist.add('0x1', self.hotlist_module.PRIORITY_MESSAGE)
+        self.assertEqual(self.hotlist.counts('0x1'), (0, 1, 0, 0))
+
+    def test_line_priority(self):
+        line_priority = self.hotlist_module.line_priority
+        self.assertEqual(line_priority({'notify_level': 2}),
+                         self.hotlist_module.PRIORITY_PRIVATE)
+        self.assertIsNone(line_priority(
+            {'notify_level': 3, 'tags_array': ['no_notify']}))
+        self.assertEqual(line_priority({'highlight': 1}),
+                         self.hotlist_module.PRIORITY_HIGHLIGHT)
+
+
+if __name__ == '__main__':
+    unittest.main()
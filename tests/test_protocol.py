@@ -0,0 +1,706 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of decoding of messages (weechat/protocol.py)."""
+
+import array
+import collections
+import struct
+import unittest
+import zlib
+
+from tests import qt_compat, qt_app
+import weechat.protocol as protocol
+import weechat.encoder as encoder
+
+
+def compressed_frame(size, compression=protocol.COMPRESSION_ZLIB):
+    """Return a compressed message, of size bytes uncompressed."""
+    if compression == protocol.COMPRESSION_ZSTD:
+        payload = protocol.zstandard.ZstdCompressor().compress('x' * size)
+    else:
+        payload = zlib.compress('x' * size)
+    return '%s%s%s' % (struct.pack('>i', len(payload) + 5),
+                       struct.pack('b', compression), payload)
+
+
+def corrupt_frame():
+    """Return a message with an unknown object type."""
+    payload = struct.pack('>i', 2) + 'id' + 'zzz'
+    return struct.pack('>i', len(payload) + 5) + '\x00' + payload
+
+
+def valid_frame():
+    """Return a valid message."""
+    return encoder.Encoder().encode('test', [('str', 'hello')])
+
+
+HDATA_PATH = 'buffer/line_data'
+HDATA_KEYS = [('number', 'int'), ('local_variables', 'htb'),
+              ('tags', 'arr'), ('message', 'str'), ('highlight', 'chr'),
+              ('date', 'tim'), ('size', 'lon'), ('data', 'buf'),
+              ('next', 'ptr')]
+
+
+def hdata_items(count):
+    """Return items of a hdata (as decoded in mode HDATA_ITEMS)."""
+    return [{'__path': ['0x%x' % (0x1000 + i), '0x%x' % (0x2000 + i)],
+             'number': i,
+             'local_variables': {'type': 'channel', 'nick': 'nick%d' % i},
+             'tags': ['irc_privmsg', 'nick_%d' % i],
+             'message': None if i == 1 else 'message %d' % i,
+             'highlight': i % 2,
+             'date': 1500000000 + i,
+             'size': 2 ** 40 + i,
+             'data': '\x00\x01',
+             'next': '0x%x' % i}
+            for i in range(count)]
+
+
+def hdata_frame(items):
+    """Return a message with a hdata (items can be hdata_items())."""
+    return encoder.Encoder().encode(
+        'test', [('hda', {'path': HDATA_PATH, 'keys': HDATA_KEYS,
+                          'items': items})])
+
+
+def decode_hdata(data, hdata_mode):
+    """
+    Decode a message with a hdata, return its items as dict (lazy items
+    are decoded, so that an error in data is raised here).
+    """
+    message = protocol.Protocol().decode(data, hdata_mode=hdata_mode)
+    return [[dict(item) for item in obj.value['items']]
+            for obj in message.objects]
+
+
+OBJECTS = [
+    ('chr', 65),
+    ('int', -123456),
+    ('lon', 2 ** 40),
+    ('str', 'hello'),
+    ('str', ''),
+    ('str', None),
+    ('buf', '\x00\xff'),
+    ('buf', None),
+    ('ptr', '0x1a2b'),
+    ('tim', 1321993456),
+    ('htb', {'away': 'gone', 'nick': 'alice'}),
+    ('inf', ('version', '2.9')),
+    ('inl', {'name': 'buffer',
+             'items': [{'name': 'core.weechat', 'number': 1}]}),
+    ('arr', ['a', 'b', 'c']),
+]
+
+HDATA_MODES = (protocol.HDATA_ITEMS, protocol.HDATA_LAZY,
+               protocol.HDATA_COLUMNS, protocol.HDATA_COMPACT)
+
+
+def input_types(data):
+    """Return data as all types accepted by Protocol.decode."""
+    return [data, bytearray(data), memoryview(data),
+            memoryview(bytearray(data))]
+
+
+class ProtocolTestCase(unittest.TestCase):
+    """Tests of Protocol, with messages built by the encoder."""
+
+    def _objects(self, data, **kwargs):
+        """Return (type, value) of objects decoded in a message."""
+        message = protocol.Protocol().decode(data, **kwargs)
+        self.assertEqual(message.msgid, 'test')
+        return [(obj.objtype, obj.value) for obj in message.objects]
+
+    def test_objects(self):
+        data = encoder.Encoder().encode('test', OBJECTS)
+        for value in input_types(data):
+            self.assertEqual(self._objects(value), OBJECTS)
+
+    def test_objects_compressed(self):
+        data = encoder.Encoder().encode('test', OBJECTS, compression=True)
+        for value in input_types(data):
+            message = protocol.Protocol().decode(value)
+            self.assertEqual(message.compression,
+                             protocol.COMPRESSION_ZLIB)
+            self.assertEqual(
+                [(obj.objtype, obj.value) for obj in message.objects],
+                OBJECTS)
+            self.assertEqual(message.uncompressed,
+                             encoder.Encoder().encode('test', OBJECTS))
+
+    def test_uncompressed(self):
+        data = encoder.Encoder().encode('test', OBJECTS)
+        for value in input_types(data):
+            message = protocol.Protocol().decode(value)
+            self.assertEqual(message.size, len(data))
+            self.assertEqual(message.uncompressed, data)
+            message = protocol.Protocol().decode(value,
+                                                 keep_uncompressed=False)
+            self.assertIsNone(message.uncompressed)
+
+    def test_hdata(self):
+        items = hdata_items(5)
+        data = hdata_frame(items)
+        for hdata_mode in HDATA_MODES:
+            for value in input_types(data):
+                self.assertEqual(decode_hdata(value, hdata_mode), [items])
+
+    def test_hdata_compressed(self):
+        items = hdata_items(5)
+        data = encoder.Encoder().encode(
+            'test', [('hda', {'path': HDATA_PATH, 'keys': HDATA_KEYS,
+                              'items': items})], compression=True)
+        for hdata_mode in HDATA_MODES:
+            for value in input_types(data):
+                self.assertEqual(decode_hdata(value, hdata_mode), [items])
+
+    def test_hdata_mode_by_msgid(self):
+        data = hdata_frame(hdata_items(2))
+        hdata_mode = {'test': protocol.HDATA_COMPACT,
+                      None: protocol.HDATA_LAZY}
+        items = protocol.Protocol().decode(
+            data, hdata_mode=hdata_mode).objects[0].value['items']
+        self.assertIsInstance(items[0], protocol.WeechatRecord)
+        hdata_mode = {'other': protocol.HDATA_COMPACT,
+                      None: protocol.HDATA_LAZY}
+        items = protocol.Protocol().decode(
+            data, hdata_mode=hdata_mode).objects[0].value['items']
+        self.assertIsInstance(items[0], protocol.LazyHdataItem)
+
+    def test_truncated(self):
+        # values after the end of data are empty, the string cut is
+        # partial; all input types and hdata modes give same result
+        data = encoder.Encoder().encode(
+            'test', [('int', 1), ('str', 'hello world')])
+        data = data[:-6]
+        for hdata_mode in HDATA_MODES:
+            for value in input_types(data):
+                self.assertEqual(
+                    self._objects(value, hdata_mode=hdata_mode),
+                    [('int', 1), ('str', 'hello')])
+
+    def test_truncated_hdata(self):
+        # cut in the last item of hdata: the readers of hdata fall back to
+        # the callbacks of Protocol, which return empty values
+        items = hdata_items(3)
+        data = hdata_frame(items)
+        data = data[:data.rindex('message 2') + 3]
+        items[2].update({'message': 'mes', 'highlight': 0, 'date': None,
+                         'size': None, 'data': None, 'next': None})
+        for hdata_mode in HDATA_MODES:
+            for value in input_types(data):
+                self.assertEqual(decode_hdata(value, hdata_mode), [items])
+
+    def test_decode_twice(self):
+        # a protocol can decode several messages (no state is kept)
+        proto = protocol.Protocol()
+        data = encoder.Encoder().encode('test', OBJECTS)
+        first = proto.decode(data)
+        second = proto.decode(bytearray(data))
+        self.assertEqual([obj.value for obj in first.objects],
+                         [obj.value for obj in second.objects])
+
+
+class WeechatRecordTestCase(unittest.TestCase):
+    """Tests of WeechatRecord (items of hdata in compact mode)."""
+
+    def setUp(self):
+        data = hdata_frame(hdata_items(2))
+        message = protocol.Protocol().decode(
+            data, hdata_mode=protocol.HDATA_COMPACT)
+        self.records = message.objects[0].value['items']
+        message = protocol.Protocol().decode(data)
+        self.dicts = message.objects[0].value['items']
+
+    def test_access(self):
+        record = self.records[0]
+        self.assertEqual(record['number'], 0)
+        self.assertEqual(record['__path'], ['0x1000', '0x2000'])
+        self.assertEqual(record.get('message'), 'message 0')
+        self.assertIsNone(record.get('unknown'))
+        self.assertEqual(record.get('unknown', 1), 1)
+        self.assertIn('tags', record)
+        self.assertNotIn('unknown', record)
+        with self.assertRaises(KeyError):
+            record['unknown']
+        self.assertEqual(len(record), len(HDATA_KEYS) + 1)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_items(self):
+        record = self.records[1]
+        names = ['__path'] + [name for name, _ in HDATA_KEYS]
+        self.assertEqual(record.keys(), names)
+        self.assertEqual(list(record), names)
+        self.assertEqual(record.items(), list(self.dicts[1].items()))
+        self.assertEqual(record.values(), list(self.dicts[1].values()))
+        self.assertEqual(list(record.iteritems()), record.items())
+        self.assertEqual(str(record), str(self.dicts[1]))
+
+    def test_equal(self):
+        self.assertEqual(self.records[0], self.dicts[0])
+        self.assertEqual(self.dicts[0], self.records[0])
+        self.assertEqual(self.records[1], hdata_items(2)[1])
+        self.assertNotEqual(self.records[0], self.records[1])
+        self.assertNotEqual(self.records[0], self.dicts[1])
+        self.assertNotEqual(self.records[0], [])
+
+    def test_mutable_mapping(self):
+        self.assertIsInstance(self.records[0], collections.MutableMapping)
+        record = self.records[0]
+        record['number'] = 10
+        record['new'] = 'value'
+        del record['data']
+        self.assertEqual(record['number'], 10)
+        self.assertEqual(record.keys()[-1], 'new')
+        self.assertNotIn('data', record)
+        self.assertEqual(record.pop('new'), 'value')
+        self.assertEqual(record.pop('new', None), None)
+        self.assertEqual(record.setdefault('number', 0), 10)
+        self.assertEqual(record.setdefault('other', 5), 5)
+        record.update({'size': 1}, next='0x9')
+        self.assertEqual((record['size'], record['next']), (1, '0x9'))
+        self.assertEqual(record.popitem()[0], '__path')
+        # keys are shared: other records are not changed
+        self.assertEqual(self.records[1], self.dicts[1])
+        record.clear()
+        self.assertEqual(len(record), 0)
+        self.assertEqual(record, {})
+        self.assertEqual(self.records[1], self.dicts[1])
+
+
+class HdataSchemaTestCase(unittest.TestCase):
+    """Tests of HdataSchema and of its cache in Protocol."""
+
+    def setUp(self):
+        protocol.Protocol._hdata_schemas.clear()
+
+    def test_schema(self):
+        schema = protocol.HdataSchema('buffer/lines', 'number:int,name:str')
+        self.assertEqual(schema.path, ['buffer', 'lines'])
+        self.assertEqual(schema.names, ['number', 'name'])
+        self.assertEqual(schema.types, ['int', 'str'])
+        self.assertEqual(schema.index, {'number': 0, 'name': 1})
+        empty = protocol.HdataSchema('', '')
+        self.assertEqual((empty.path, empty.names), ([], []))
+
+    def test_cache(self):
+        # one schema by path/keys, shared by all protocols
+        data = hdata_frame(hdata_items(2))
+        protocol.Protocol().decode(data)
+        protocol.Protocol().decode(bytearray(data),
+                                   hdata_mode=protocol.HDATA_COMPACT)
+        self.assertEqual(len(protocol.Protocol._hdata_schemas), 1)
+        # other keys: another schema
+        other = encoder.Encoder().encode(
+            'test', [('hda', {'path': HDATA_PATH,
+                              'keys': [('number', 'int')],
+                              'items': [{'__path': ['0x1', '0x2'],
+                                         'number': 7}]})])
+        items = protocol.Protocol().decode(other).objects[0].value['items']
+        self.assertEqual(items, [{'__path': ['0x1', '0x2'], 'number': 7}])
+        self.assertEqual(len(protocol.Protocol._hdata_schemas), 2)
+
+    def test_cache_max(self):
+        proto = protocol.Protocol()
+        for i in range(protocol.HDATA_SCHEMAS_MAX + 10):
+            proto._hdata_schema('buffer', 'key%d:int' % i)
+            self.assertLessEqual(len(protocol.Protocol._hdata_schemas),
+                                 protocol.HDATA_SCHEMAS_MAX)
+
+    def test_hdata_keys(self):
+        # all kinds of steps of readers: consecutive fixed-size values
+        # (read at once), strings, short values and other types
+        keys = [('a', 'chr'), ('b', 'int'), ('c', 'chr'), ('d', 'str'),
+                ('e', 'int'), ('f', 'htb'), ('g', 'int'), ('h', 'lon')]
+        items = [{'__path': ['0x%x' % i], 'a': i, 'b': -i, 'c': 1,
+                  'd': 'd%d' % i, 'e': 2 ** 31 - 1,
+                  'f': {'k': 'v%d' % i}, 'g': 0, 'h': -2 ** 40}
+                 for i in range(3)]
+        data = encoder.Encoder().encode(
+            'test', [('hda', {'path': 'buffer', 'keys': keys,
+                              'items': items}),
+                     ('hda', {'path': 'buffer', 'keys': keys,
+                              'items': []})])
+        for hdata_mode in HDATA_MODES:
+            self.assertEqual(decode_hdata(data, hdata_mode), [items, []])
+
+
+class HdataColumnsTestCase(unittest.TestCase):
+    """Tests of hdata in columns mode."""
+
+    def _hdata(self, data):
+        """Return the hdata decoded in columns mode."""
+        message = protocol.Protocol().decode(
+            data, hdata_mode=protocol.HDATA_COLUMNS)
+        return message.objects[0].value
+
+    def test_columns(self):
+        items = hdata_items(4)
+        hdata = self._hdata(hdata_frame(items))
+        columns = hdata['columns']
+        self.assertEqual(list(columns),
+                         ['__path'] + [name for name, _ in HDATA_KEYS])
+        self.assertEqual(columns['__path'],
+                         [[item['__path'][0] for item in items],
+                          [item['__path'][1] for item in items]])
+        for name, _ in HDATA_KEYS:
+            self.assertEqual(list(columns[name]),
+                             [item[name] for item in items])
+        # values of fixed size are stored in arrays
+        for name, code in (('number', 'i'), ('highlight', 'b'),
+                           ('date', 'l'), ('size', 'l')):
+            self.assertIsInstance(columns[name], array.array)
+            self.assertEqual(columns[name].typecode, code)
+        self.assertIsInstance(columns['message'], list)
+
+    def test_items(self):
+        items = hdata_items(4)
+        hdata = self._hdata(hdata_frame(items))
+        self.assertEqual(hdata['count'], 4)
+        self.assertEqual(len(hdata['items']), 4)
+        self.assertEqual(hdata['items'][-1], items[-1])
+        self.assertEqual(hdata['items'][1:3], items[1:3])
+        self.assertIsInstance(hdata['items'][0], protocol.WeechatDict)
+        with self.assertRaises(IndexError):
+            hdata['items'][4]
+
+    def test_empty(self):
+        hdata = self._hdata(hdata_frame([]))
+        self.assertEqual(len(hdata['items']), 0)
+        self.assertEqual(hdata['columns']['__path'], [[], []])
+        self.assertEqual(list(hdata['columns']['number']), [])
+
+    def test_truncated(self):
+        # value missing in an array column: the column is kept as a list
+        items = hdata_items(3)
+        data = hdata_frame(items)
+        data = data[:data.rindex('message 2') + 3]
+        columns = self._hdata(data)['columns']
+        self.assertIsInstance(columns['number'], array.array)
+        self.assertEqual(columns['date'],
+                         [1500000000, 1500000001, None])
+
+    def test_rows_by_pointer(self):
+        items = hdata_items(5)
+        for i, item in enumerate(items):
+            item['__path'][0] = '0x%d' % (i % 2)
+        columns = self._hdata(hdata_frame(items))['columns']
+        rows = protocol.hdata_rows_by_pointer(columns)
+        self.assertEqual(list(rows.items()),
+                         [('0x0', [0, 2, 4]), ('0x1', [1, 3])])
+        rows = protocol.hdata_rows_by_pointer(columns, 1)
+        self.assertEqual(len(rows), 5)
+
+
+class LazyHdataTestCase(unittest.TestCase):
+    """Tests of hdata in lazy mode, compared to items mode."""
+
+    def _check_same(self, data):
+        """Check that lazy and items modes give same items, or error."""
+        try:
+            expected = decode_hdata(data, protocol.HDATA_ITEMS)
+        except Exception as exc:
+            with self.assertRaises(exc.__class__):
+                decode_hdata(data, protocol.HDATA_LAZY)
+        else:
+            self.assertEqual(decode_hdata(data, protocol.HDATA_LAZY),
+                             expected)
+
+    def _decode(self, data, hdata_mode):
+        """Return the hdata decoded in a message."""
+        message = protocol.Protocol().decode(data, hdata_mode=hdata_mode)
+        self.assertEqual(len(message.objects), 1)
+        return message.objects[0].value
+
+    def test_items(self):
+        data = hdata_frame(hdata_items(5))
+        expected = self._decode(data, protocol.HDATA_ITEMS)
+        hdata = self._decode(data, protocol.HDATA_LAZY)
+        self.assertEqual(hdata['path'], ['buffer', 'line_data'])
+        self.assertEqual(hdata['keys'], expected['keys'])
+        self.assertEqual(hdata['count'], 5)
+        items = hdata['items']
+        self.assertEqual(len(items), 5)
+        self.assertEqual(list(items[-1]), list(expected['items'][-1]))
+        self.assertEqual(dict(items[-1]), hdata_items(5)[4])
+        self.assertEqual([dict(item) for item in items[1:3]],
+                         hdata_items(5)[1:3])
+        with self.assertRaises(IndexError):
+            items[5]
+
+    def test_fields(self):
+        # each field is decoded alone, in reverse order: values before it
+        # (hashtable, array) are skipped
+        data = hdata_frame(hdata_items(4))
+        expected = self._decode(data, protocol.HDATA_ITEMS)['items']
+        items = self._decode(data, protocol.HDATA_LAZY)['items']
+        names = ['__path'] + [name for name, _ in HDATA_KEYS]
+        for index in (3, 0, 2, 1):
+            for name in reversed(names):
+                self.assertEqual(items[index][name], expected[index][name])
+        self.assertEqual(items[2]['local_variables'],
+                         {'type': 'channel', 'nick': 'nick2'})
+        self.assertEqual(items[2]['tags'], ['irc_privmsg', 'nick_2'])
+        self.assertIsNone(items[1]['message'])
+        with self.assertRaises(KeyError):
+            items[0]['unknown']
+
+    def test_update_item(self):
+        data = hdata_frame(hdata_items(2))
+        item = self._decode(data, protocol.HDATA_LAZY)['items'][0]
+        item['message'] = 'changed'
+        item['extra'] = 1
+        del item['data']
+        self.assertEqual(item['message'], 'changed')
+        self.assertEqual(list(item)[-1], 'extra')
+        self.assertNotIn('data', item)
+        self.assertEqual(item['next'], '0x0')
+
+    def test_data_released(self):
+        # items are decoded from a copy of data: data received can be
+        # reused after decode (like the buffer of MessageDecoder)
+        data = bytearray(hdata_frame(hdata_items(2)))
+        items = self._decode(data, protocol.HDATA_LAZY)['items']
+        data[:] = '\x00' * len(data)
+        self.assertEqual(dict(items[1]), hdata_items(2)[1])
+
+    def test_truncated(self):
+        data = hdata_frame(hdata_items(3))
+        for size in range(5, len(data)):
+            self._check_same(data[:size])
+
+    def test_truncated_item(self):
+        # message cut in the string of the last item: values left are empty
+        items = hdata_items(3)
+        data = hdata_frame(items)
+        data = data[:data.rindex('message 2') + 3]
+        items[2].update({'message': 'mes', 'highlight': 0, 'date': None,
+                         'size': None, 'data': None, 'next': None})
+        self.assertEqual(decode_hdata(data, protocol.HDATA_ITEMS), [items])
+        self.assertEqual(decode_hdata(data, protocol.HDATA_LAZY), [items])
+
+    def test_empty_time(self):
+        items = hdata_items(3)
+        items[1]['date'] = ''
+        data = hdata_frame(items)
+        for hdata_mode in (protocol.HDATA_ITEMS, protocol.HDATA_LAZY):
+            with self.assertRaises(ValueError):
+                decode_hdata(data, hdata_mode)
+
+    def test_invalid_count(self):
+        # count of items/values bigger than data: error, without trying
+        # to read (or allocate) so many items
+        items = hdata_items(3)
+        data = hdata_frame(items)
+        big = struct.pack('>i', 0x7fffffff)
+        pos_count = data.index('next:ptr') + len('next:ptr')
+        pos_htb = data.index('strstr') + len('strstr')
+        pos_arr = data.index('str', data.index('nick0')) + 3
+        for pos in (pos_count, pos_htb, pos_arr):
+            corrupt = data[:pos] + big + data[pos + 4:]
+            for hdata_mode in (protocol.HDATA_ITEMS, protocol.HDATA_LAZY,
+                               protocol.HDATA_COLUMNS,
+                               protocol.HDATA_COMPACT):
+                with self.assertRaises(ValueError):
+                    decode_hdata(corrupt, hdata_mode)
+
+
+class MessageDecoderTestCase(unittest.TestCase):
+    """Tests of MessageDecoder."""
+
+    def _frames(self):
+        """Return messages with ids 'msg0', 'msg1', 'msg2'."""
+        return [encoder.Encoder().encode('msg%d' % i, objects)
+                for i, objects in enumerate(
+                    ([('str', 'hello')],
+                     [('hda', {'path': HDATA_PATH, 'keys': HDATA_KEYS,
+                               'items': hdata_items(3)})],
+                     [('int', 42)]))]
+
+    def _msgids(self, messages):
+        return [message.msgid for message in messages]
+
+    def test_split_frames(self):
+        # data split at every offset: in the length of message (4 bytes)
+        # or in the message, then the rest of data in one chunk
+        data = ''.join(self._frames())
+        for pos in range(len(data) + 1):
+            decoder = protocol.MessageDecoder()
+            messages = list(decoder.feed(data[:pos]))
+            messages.extend(decoder.feed(data[pos:]))
+            self.assertEqual(self._msgids(messages), ['msg0', 'msg1', 'msg2'])
+            self.assertEqual(messages[1].objects[0].value['items'],
+                             hdata_items(3))
+            self.assertEqual(decoder.pending(), 0)
+
+    def test_byte_by_byte(self):
+        decoder = protocol.MessageDecoder()
+        data = ''.join(self._frames())
+        messages = []
+        for i in range(len(data)):
+            messages.extend(decoder.feed(data[i]))
+        self.assertEqual(self._msgids(messages), ['msg0', 'msg1', 'msg2'])
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_frames_in_one_chunk(self):
+        frames = self._frames()
+        decoder = protocol.MessageDecoder()
+        messages = list(decoder.feed(bytearray(''.join(frames) +
+                                               frames[0][:6])))
+        self.assertEqual(self._msgids(messages), ['msg0', 'msg1', 'msg2'])
+        self.assertEqual(decoder.pending(), 6)
+        messages = list(decoder.feed(frames[0][6:]))
+        self.assertEqual(self._msgids(messages), ['msg0'])
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_pending(self):
+        frame = self._frames()[1]
+        decoder = protocol.MessageDecoder()
+        self.assertEqual(decoder.pending(), 0)
+        self.assertEqual(list(decoder.feed(frame[:3])), [])
+        self.assertEqual(decoder.pending(), 3)
+        self.assertEqual(list(decoder.feed(frame[3:-1])), [])
+        self.assertEqual(decoder.pending(), len(frame) - 1)
+        self.assertEqual(len(list(decoder.feed(frame[-1:]))), 1)
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_reset(self):
+        # data of a previous connection is dropped
+        frames = self._frames()
+        decoder = protocol.MessageDecoder()
+        self.assertEqual(list(decoder.feed(frames[1][:10])), [])
+        decoder.reset()
+        self.assertEqual(decoder.pending(), 0)
+        messages = list(decoder.feed(frames[2]))
+        self.assertEqual(self._msgids(messages), ['msg2'])
+        # reset after messages decoded
+        list(decoder.feed(frames[0] + frames[1][:7]))
+        decoder.reset()
+        messages = list(decoder.feed(frames[2]))
+        self.assertEqual(self._msgids(messages), ['msg2'])
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_compressed(self):
+        data = ''.join(encoder.Encoder().encode('msg%d' % i,
+                                                [('str', 'x' * 1000)],
+                                                compression=True)
+                       for i in range(3))
+        decoder = protocol.MessageDecoder()
+        messages = []
+        for pos in range(0, len(data), 7):
+            messages.extend(decoder.feed(data[pos:pos + 7]))
+        self.assertEqual(self._msgids(messages), ['msg0', 'msg1', 'msg2'])
+        self.assertEqual(messages[2].objects[0].value, 'x' * 1000)
+
+    def test_invalid_length(self):
+        decoder = protocol.MessageDecoder()
+        with self.assertRaises(ValueError):
+            list(decoder.feed(struct.pack('>i', 4) + '\x00'))
+
+    def _check_error(self, decoder, data):
+        with self.assertRaises(protocol.MessageDecodeError) as context:
+            list(decoder.feed(data))
+        self.assertTrue(context.exception.details)
+        # the buffer can be reset right after the error
+        decoder.reset()
+        self.assertEqual(decoder.pending(), 0)
+        # and next messages are decoded
+        messages = list(decoder.feed(valid_frame()))
+        self.assertEqual([message.msgid for message in messages], ['test'])
+
+    def test_corrupt_message(self):
+        self._check_error(protocol.MessageDecoder(), corrupt_frame())
+
+    def test_oversized_message(self):
+        self._check_error(protocol.MessageDecoder(max_uncompressed=1000),
+                          compressed_frame(100000))
+
+    @unittest.skipUnless(protocol.zstandard, 'zstandard is not installed')
+    def test_oversized_message_zstd(self):
+        self._check_error(protocol.MessageDecoder(max_uncompressed=1000),
+                          compressed_frame(100000,
+                                           protocol.COMPRESSION_ZSTD))
+
+    def test_error_drops_message(self):
+        decoder = protocol.MessageDecoder()
+        with self.assertRaises(protocol.MessageDecodeError):
+            list(decoder.feed(corrupt_frame() + valid_frame()))
+        # without reset: the corrupt message is not decoded again
+        messages = list(decoder.feed(''))
+        self.assertEqual([message.msgid for message in messages], ['test'])
+        self.assertEqual(decoder.pending(), 0)
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class DecoderWorkerTestCase(unittest.TestCase):
+    """Tests of DecoderWorker (network.py), called in the test thread."""
+
+    def setUp(self):
+        qt_app()
+        import network
+        self.worker = network.DecoderWorker()
+        self.errors = []
+        self.messages = []
+        self.worker.decodeError.connect(
+            lambda error, connection: self.errors.append(error))
+        self.worker.messagesDecoded.connect(
+            lambda messages, connection: self.messages.extend(messages))
+
+    def test_corrupt_message(self):
+        self.worker.feed(valid_frame() + corrupt_frame() + valid_frame(), 1)
+        self.assertEqual(len(self.messages), 1)
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(self.worker._decoder.pending(), 0)
+        # next data is decoded
+        self.worker.feed(valid_frame(), 1)
+        self.assertEqual(len(self.messages), 2)
+        self.assertEqual(len(self.errors), 1)
+
+    def _check_oversized(self, compression):
+        import network
+        self.worker.set_max_uncompressed(1000)
+        self.worker.feed(compressed_frame(100000, compression), 1)
+        self.assertEqual(self.messages, [])
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn('too big', self.errors[0])
+        self.assertEqual(self.worker._decoder.pending(), 0)
+
+        # the error disconnects from WeeChat
+        class FakeNetwork(object):
+            _connection = 1
+            disconnected = 0
+
+            def disconnect_weechat(self):
+                self.disconnected += 1
+
+        fake = FakeNetwork()
+        network.Network._decode_error.__func__(fake, self.errors[0], 1)
+        self.assertEqual(fake.disconnected, 1)
+
+    def test_oversized_message_zlib(self):
+        self._check_oversized(protocol.COMPRESSION_ZLIB)
+
+    @unittest.skipUnless(protocol.zstandard, 'zstandard is not installed')
+    def test_oversized_message_zstd(self):
+        self._check_oversized(protocol.COMPRESSION_ZSTD)
+
+
+if __name__ == '__main__':
+    unittest.main()
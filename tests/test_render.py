@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2011-2016 Sébastien Helleu <flashcode@flashtux.org>
+#
+# This file is part of QWeeChat, a Qt remote GUI for WeeChat.
+#
+# QWeeChat is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# QWeeChat is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QWeeChat.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Tests of scheduler for display of lines (render.py)."""
+
+import unittest
+
+from tests import qt_compat, qt_app
+
+
+class FakeWidget(object):
+    """Widget of a buffer, visible or not."""
+
+    def __init__(self, visible):
+        self.visible = visible
+
+    def isVisible(self):
+        return self.visible
+
+
+class FakeBuffer(object):
+    """Buffer recording lines displayed."""
+
+    def __init__(self, visible=True):
+        self.widget = FakeWidget(visible)
+        self.lines = []
+
+    def display_lines(self, lines):
+        self.lines.extend(lines)
+
+
+def lines(start, count):
+    """Return lines (date, prefix, message, color) numbered from start."""
+    return [(0, 'nick', 'message %d' % i, None)
+            for i in range(start, start + count)]
+
+
+@unittest.skipUnless(qt_compat, 'Qt is not installed')
+class RenderSchedulerTestCase(unittest.TestCase):
+    """Tests of RenderScheduler."""
+
+    def setUp(self):
+        qt_app()
+        import render
+        self.render = render
+        self.scheduler = render.RenderScheduler()
+
+    def test_hidden_buffer(self):
+        buf = FakeBuffer(visible=False)
+        self.scheduler.queue(buf, lines(0, 10))
+        self.scheduler.flush()
+        self.assertEqual(buf.lines, [])
+        self.assertEqual(self.scheduler.pending(buf), 10)
+        buf.widget.visible = True
+        self.scheduler.flush()
+        self.assertEqual(buf.lines, lines(0, 10))
+        self.assertEqual(self.scheduler.pending(buf), 0)
+
+    def test_max_hidden(self):
+        # lines of a hidden buffer do not grow without limit: oldest lines
+        # are skipped, and the number of lines skipped is displayed
+        buf = FakeBuffer(visible=False)
+        for start in range(0, 100, 10):
+            self.scheduler.queue(buf, lines(start, 10), 25)
+        self.assertEqual(self.scheduler.pending(buf), 25)
+        self.assertEqual(self.scheduler.skipped(buf), 75)
+        buf.widget.visible = True
+        self.scheduler.flush()
+        self.assertEqual(buf.lines,
+                         [self.render.skipped_line(75, 0)] + lines(75, 25))
+        self.assertEqual(buf.lines[0][2], '75 lines skipped')
+        self.assertEqual(self.scheduler.skipped(buf), 0)
+
+    def test_max_hidden_visible(self):
+        # lines of a visible buffer are never skipped, even if more lines
+        # than max_hidden are queued before a display
+        buf = FakeBuffer(visible=True)
+        for start in range(0, 100, 10):
+            self.scheduler.queue(buf, lines(start, 10), 25)
+        self.assertEqual(self.scheduler.pending(buf), 100)
+        while self.scheduler.pending(buf):
+            self.scheduler.flush()
+        self.assertEqual(buf.lines, lines(0, 100))
+        self.assertEqual(self.scheduler.skipped(buf), 0)
+
+    def test_no_max_hidden(self):
+        # by default, all lines of a hidden buffer are kept
+        buf = FakeBuffer(visible=False)
+        max_hidden = self.render.max_hidden_lines('0')
+        for start in range(0, 5000, 100):
+            self.scheduler.queue(buf, lines(start, 100), max_hidden)
+        self.assertEqual(self.scheduler.pending(buf), 5000)
+        self.assertEqual(self.scheduler.skipped(buf), 0)
+        buf.widget.visible = True
+        while self.scheduler.pending(buf):
+            self.scheduler.flush()
+        self.assertEqual(buf.lines, lines(0, 5000))
+
+    def test_max_hidden_lines(self):
+        self.assertIsNone(self.render.max_hidden_lines('0'))
+        self.assertIsNone(self.render.max_hidden_lines(''))
+        self.assertIsNone(self.render.max_hidden_lines(None))
+        self.assertIsNone(self.render.max_hidden_lines('-5'))
+        self.assertEqual(self.render.max_hidden_lines('2000'), 2000)
+
+    def test_discard(self):
+        buf = FakeBuffer(visible=False)
+        self.scheduler.queue(buf, lines(0, 10))
+        self.scheduler.discard(buf)
+        self.assertEqual(self.scheduler.pending(buf), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()